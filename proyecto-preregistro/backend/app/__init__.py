@@ -8,16 +8,20 @@ from flask_mail import Mail
 from flask_migrate import Migrate
 from datetime import timedelta
 
-db = SQLAlchemy()
+from app.replica import SesionEnrutada
+
+db = SQLAlchemy(session_options={'class_': SesionEnrutada})
 jwt = JWTManager()
 limiter = Limiter(key_func=get_remote_address, storage_uri="memory://")
 mail = Mail()
 migrate = Migrate()
 
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
     app.config.from_object('config.Config')
+    if config:
+        app.config.update(config)
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(
         seconds=app.config.get('JWT_ACCESS_TOKEN_EXPIRES', 86400)
     )
@@ -45,6 +49,32 @@ def create_app():
     def server_error(e):
         return _jsonify({'error': 'Error interno del servidor'}), 500
 
+    # Carriles de prioridad: va primero para rechazar con 503 antes de cualquier otro trabajo
+    from app.carriles import init_carriles
+    init_carriles(app)
+
+    # Serialización JSON con orjson (si está instalado)
+    from app.json_provider import init_json_provider
+    init_json_provider(app)
+
+    # Versiones de datos (ETags / invalidación de caché) y compresión de respuestas
+    from app.versiones import init_versiones
+    from app.http_cache import init_http_cache
+    init_versiones(app)
+    init_http_cache(app)
+
+    # Feed de cambios: lápidas de filas borradas
+    from app.cambios import init_cambios
+    init_cambios(app)
+
+    # Caché en proceso de catálogos (carreras, socios, periodos)
+    from app.cache import init_cache
+    init_cache(app)
+
+    # Perfilado bajo demanda (header X-Profile: 1, solo Admin)
+    from app.profiling import init_profiler
+    init_profiler(app)
+
     from app.routes.auth import auth_bp
     from app.routes.estudiantes import estudiantes_bp
     from app.routes.servicios import servicios_bp
@@ -53,6 +83,7 @@ def create_app():
     from app.routes.admin import admin_bp
     from app.routes.socios_formadores import socios_bp
     from app.routes.checkin import checkin_bp
+    from app.routes.lote import lote_bp
 
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(estudiantes_bp, url_prefix='/api/estudiantes')
@@ -62,5 +93,18 @@ def create_app():
     app.register_blueprint(admin_bp, url_prefix='/api')
     app.register_blueprint(socios_bp, url_prefix='/api/socios-formadores')
     app.register_blueprint(checkin_bp, url_prefix='/api/checkin')
+    app.register_blueprint(lote_bp, url_prefix='/api/batch')
+
+    # Auditoría de escrituras administrativas (buffer en memoria + hilo escritor)
+    from app.auditoria import init_auditoria
+    init_auditoria(app)
+
+    # Tareas periódicas de mantenimiento (purgas, ANALYZE, contadores, caché)
+    from app.mantenimiento import init_mantenimiento
+    init_mantenimiento(app)
+
+    # Comandos CLI: seed-data, benchmark
+    from app.cli import register_cli
+    register_cli(app)
 
     return app
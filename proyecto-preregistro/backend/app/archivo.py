@@ -0,0 +1,294 @@
+"""Archivo de periodos cerrados en archivos comprimidos fuera de la base.
+
+``archivar(periodo)`` exporta los servicios, pre-registros y asistencias del
+periodo a ``ARCHIVO_DIR/<periodo>.json.gz`` en formato columnar (una lista de
+valores por columna), verifica el archivo y después borra las filas en lotes
+pequeños, cada uno en su propia transacción, para no sostener locks largos.
+Los pre-registros se guardan además con los datos del estudiante y la carrera
+para poder generar reportes históricos aunque el estudiante se dé de baja.
+
+``restaurar(periodo)`` reinserta las filas con sus ids originales y elimina el
+archivo. ``cargar(periodo)`` da acceso de solo lectura para reportes.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+from datetime import datetime, date, time
+
+from flask import current_app
+
+from app import db, particiones
+from app.models import Estudiante, Carrera, Servicio, PreRegistro, AsistenciaFeria, PreferenciaServicio, SIN_PERIODO
+
+FORMATO = 1
+LOTE_BORRADO = 1000
+LOTE_INSERCION = 5000
+ESTATUS_ABIERTOS = ('pendiente', 'dentro')
+
+# Orden de inserción; el borrado va en orden inverso por las llaves foráneas.
+TABLAS = (
+    ('servicios', Servicio),
+    ('preregistros', PreRegistro),
+    ('asistencias_feria', AsistenciaFeria),
+)
+
+_cache_lectura = {}
+_lock = threading.Lock()
+
+
+def archivo_dir(app=None):
+    app = app or current_app
+    path = app.config.get('ARCHIVO_DIR') or os.path.join(app.instance_path, 'archivo')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def nombre_archivo(periodo):
+    slug = re.sub(r'[^a-z0-9]+', '_', periodo.lower()).strip('_')
+    return f"{slug}_{hashlib.md5(periodo.encode()).hexdigest()[:6]}.json.gz"
+
+
+def ruta_archivo(periodo):
+    return os.path.join(archivo_dir(), nombre_archivo(periodo))
+
+
+def _ruta_meta(ruta):
+    return ruta[:-len('.json.gz')] + '.meta.json'
+
+
+def _a_json(valor):
+    if isinstance(valor, (datetime, date, time)):
+        return valor.isoformat()
+    return valor
+
+
+def _desde_json(columna, valor):
+    if valor is None:
+        return None
+    tipo = columna.type.python_type
+    if tipo in (datetime, date, time):
+        return tipo.fromisoformat(valor)
+    return valor
+
+
+def _columnar(modelo, condicion):
+    """Lee las filas de ``modelo`` como ``{'columnas': [...], 'datos': {col: [...]}}``."""
+    columnas = [c.name for c in modelo.__table__.columns]
+    datos = {c: [] for c in columnas}
+    consulta = db.select(*modelo.__table__.columns).where(condicion).order_by(modelo.__table__.c.id)
+    for fila in db.session.execute(consulta):
+        for c, v in zip(columnas, fila):
+            datos[c].append(_a_json(v))
+    return {'columnas': columnas, 'datos': datos}
+
+
+def _filas(tabla):
+    """Convierte una tabla columnar de vuelta a una lista de dicts."""
+    columnas = tabla['columnas']
+    return [dict(zip(columnas, valores)) for valores in zip(*(tabla['datos'][c] for c in columnas))]
+
+
+def _total(tabla):
+    return len(tabla['datos'][tabla['columnas'][0]]) if tabla['columnas'] else 0
+
+
+def _condiciones(periodo, servicio_ids):
+    return {
+        'servicios': Servicio.periodo == periodo,
+        'preregistros': PreRegistro.periodo == periodo,
+        # También las asistencias de otros periodos ligadas a estos servicios (llave foránea)
+        'asistencias_feria': db.or_(AsistenciaFeria.periodo == periodo,
+                                    AsistenciaFeria.servicio_id.in_(servicio_ids)),
+    }
+
+
+def validar_cerrado(periodo):
+    """Un periodo se puede archivar si tiene datos y ninguna asistencia abierta."""
+    if not db.session.query(Servicio.id).filter_by(periodo=periodo).first():
+        raise RuntimeError(f'No hay servicios del periodo {periodo}')
+    abiertas = AsistenciaFeria.query.filter(
+        AsistenciaFeria.periodo == periodo,
+        AsistenciaFeria.estatus_asistencia.in_(ESTATUS_ABIERTOS),
+    ).count()
+    if abiertas:
+        raise RuntimeError(f'El periodo {periodo} tiene {abiertas} asistencias pendientes o en curso')
+
+
+def exportar(periodo):
+    servicio_ids = list(db.session.scalars(db.select(Servicio.id).where(Servicio.periodo == periodo)))
+    condiciones = _condiciones(periodo, servicio_ids)
+    tablas = {nombre: _columnar(modelo, condiciones[nombre]) for nombre, modelo in TABLAS}
+
+    # Vista desnormalizada para reportes: no depende de que el estudiante siga existiendo.
+    reporte = {c: [] for c in ('nombre', 'matricula', 'carrera', 'crn', 'servicio', 'fecha_registro')}
+    consulta = db.select(
+        Estudiante.nombre_completo, Estudiante.matricula, Carrera.nombre,
+        Servicio.crn, Servicio.descripcion, PreRegistro.fecha_registro,
+    ).select_from(PreRegistro).join(Estudiante, Estudiante.id == PreRegistro.estudiante_id)\
+        .join(Servicio, Servicio.id == PreRegistro.servicio_id)\
+        .outerjoin(Carrera, Carrera.id == Estudiante.carrera_id)\
+        .where(PreRegistro.periodo == periodo).order_by(PreRegistro.fecha_registro.desc())
+    for fila in db.session.execute(consulta):
+        for c, v in zip(reporte, fila):
+            reporte[c].append(_a_json(v))
+
+    return {
+        'formato': FORMATO,
+        'periodo': periodo,
+        'creado': datetime.utcnow().isoformat(),
+        'tablas': tablas,
+        'reporte_preregistros': {'columnas': list(reporte), 'datos': reporte},
+    }
+
+
+def _escribir(ruta, contenido):
+    temporal = ruta + '.tmp'
+    with gzip.open(temporal, 'wt', encoding='utf-8', compresslevel=6) as f:
+        json.dump(contenido, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(temporal, ruta)
+
+
+def _leer(ruta):
+    with gzip.open(ruta, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _borrar_en_lotes(modelo, condicion, lote, log):
+    """Borra con DELETE ... WHERE id IN (<lote>) y un commit por lote."""
+    total = 0
+    while True:
+        ids = list(db.session.scalars(db.select(modelo.id).where(condicion).limit(lote)))
+        if not ids:
+            break
+        db.session.execute(db.delete(modelo).where(modelo.id.in_(ids)))
+        db.session.commit()
+        total += len(ids)
+        log(f'  {modelo.__tablename__}: {total} filas borradas')
+    return total
+
+
+def archivar(periodo, lote=LOTE_BORRADO, log=lambda *_: None):
+    """Exporta el periodo a disco y borra sus filas. Devuelve los metadatos del archivo."""
+    ruta = ruta_archivo(periodo)
+    if os.path.exists(ruta):
+        raise RuntimeError(f'El periodo {periodo} ya está archivado')
+    validar_cerrado(periodo)
+
+    contenido = exportar(periodo)
+    _escribir(ruta, contenido)
+
+    # Verificar antes de borrar nada: el archivo se lee completo y los conteos coinciden.
+    leido = _leer(ruta)
+    conteos = {nombre: _total(leido['tablas'][nombre]) for nombre, _ in TABLAS}
+    if conteos != {nombre: _total(contenido['tablas'][nombre]) for nombre, _ in TABLAS}:
+        os.remove(ruta)
+        raise RuntimeError('La verificación del archivo falló; no se borró ningún dato')
+
+    meta = {
+        'periodo': periodo,
+        'archivo': os.path.basename(ruta),
+        'creado': contenido['creado'],
+        'tamano': os.path.getsize(ruta),
+        'conteos': conteos,
+    }
+    with open(_ruta_meta(ruta), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    log(f"Archivo {meta['archivo']} ({meta['tamano']} bytes): {conteos}")
+
+    servicio_ids = leido['tablas']['servicios']['datos']['id']
+    condiciones = _condiciones(periodo, servicio_ids)
+    # Las preferencias de asignación no se archivan: solo sirven antes de asignar
+    PreferenciaServicio.query.filter(PreferenciaServicio.servicio_id.in_(servicio_ids)).delete(synchronize_session=False)
+    db.session.commit()
+    for nombre, modelo in reversed(TABLAS):
+        _borrar_en_lotes(modelo, condiciones[nombre], lote, log)
+    return meta
+
+
+def restaurar(periodo, log=lambda *_: None):
+    """Reinserta las filas archivadas del periodo y elimina el archivo.
+
+    Los pre-registros y asistencias de estudiantes que ya no existen se omiten.
+    """
+    ruta = ruta_archivo(periodo)
+    if not os.path.exists(ruta):
+        raise RuntimeError(f'No hay archivo del periodo {periodo}')
+    contenido = _leer(ruta)
+    tablas = contenido['tablas']
+
+    crns = tablas['servicios']['datos']['crn']
+    if crns and db.session.query(Servicio.id).filter(Servicio.crn.in_(crns)).first():
+        raise RuntimeError('Ya existen servicios con los mismos CRN; no se puede restaurar')
+
+    estudiantes = set(db.session.scalars(db.select(Estudiante.id)))
+    particiones.asegurar_particion(periodo)
+    restaurados, omitidos = {}, {}
+    ahora = datetime.utcnow()
+    for nombre, modelo in TABLAS:
+        columnas = modelo.__table__.columns
+        filas = [{c: _desde_json(columnas[c], v) for c, v in fila.items()} for fila in _filas(tablas[nombre])]
+        if 'actualizado' in columnas:
+            # Para el feed de cambios las filas restauradas son nuevas: vuelven a publicarse
+            # con la marca de esta transacción, no con la que tenían al archivarse
+            for f in filas:
+                f['actualizado'] = ahora
+                f.pop('transaccion', None)
+        if modelo is AsistenciaFeria:
+            # Archivos anteriores a la PK (id, periodo) pueden traer asistencias sin periodo
+            for f in filas:
+                f['periodo'] = f.get('periodo') or SIN_PERIODO
+        if 'estudiante_id' in columnas:
+            validas = [f for f in filas if f['estudiante_id'] in estudiantes]
+            omitidos[nombre] = len(filas) - len(validas)
+            filas = validas
+        for i in range(0, len(filas), LOTE_INSERCION):
+            db.session.execute(db.insert(modelo), filas[i:i + LOTE_INSERCION])
+        restaurados[nombre] = len(filas)
+        log(f'  {nombre}: {len(filas)} filas restauradas')
+    db.session.commit()
+
+    os.remove(ruta)
+    if os.path.exists(_ruta_meta(ruta)):
+        os.remove(_ruta_meta(ruta))
+    with _lock:
+        _cache_lectura.pop(ruta, None)
+    return {'periodo': periodo, 'restaurados': restaurados, 'omitidos': omitidos}
+
+
+def listar_archivos():
+    path = archivo_dir()
+    archivos = []
+    for nombre in sorted(os.listdir(path)):
+        if nombre.endswith('.meta.json'):
+            with open(os.path.join(path, nombre), encoding='utf-8') as f:
+                archivos.append(json.load(f))
+    return sorted(archivos, key=lambda a: a['periodo'], reverse=True)
+
+
+def cargar(periodo):
+    """Contenido del archivo (solo lectura), cacheado mientras no cambie en disco."""
+    ruta = ruta_archivo(periodo)
+    if not os.path.exists(ruta):
+        return None
+    mtime = os.path.getmtime(ruta)
+    entrada = _cache_lectura.get(ruta)
+    if entrada is None or entrada[0] != mtime:
+        entrada = (mtime, _leer(ruta))
+        with _lock:
+            _cache_lectura[ruta] = entrada
+    return entrada[1]
+
+
+def filas_reporte(periodo):
+    """Filas del reporte de pre-registros archivado, en el orden del reporte en vivo."""
+    contenido = cargar(periodo)
+    if contenido is None:
+        return None
+    return [
+        [f['nombre'], f['matricula'], f['carrera'] or '', f['crn'], f['servicio'], periodo,
+         datetime.fromisoformat(f['fecha_registro']).strftime('%Y-%m-%d %H:%M') if f['fecha_registro'] else '']
+        for f in _filas(contenido['reporte_preregistros'])
+    ]
@@ -0,0 +1,175 @@
+"""Asignación de servicios por preferencias (alternativa al primero-en-llegar).
+
+Durante una ``VentanaAsignacion`` los estudiantes registran una lista ordenada
+de servicios del periodo. Al ejecutar la asignación, ``resolver`` aplica
+*dictadura serial aleatoria*: se sortea un orden de estudiantes con una semilla
+y cada uno recibe su opción mejor rankeada que aún tenga lugar. Es justo (el
+orden es un sorteo, no la velocidad de la conexión), no premia mentir en las
+preferencias y corre en O(total de preferencias).
+
+``ejecutar`` arma la entrada desde la base (cupos libres, elegibilidad por
+asistencia a la feria, estudiantes ya inscritos en el periodo) e inserta todos
+los pre-registros en una sola transacción.
+"""
+import json
+import random
+import time
+from datetime import datetime
+
+from app import db, consultas
+from app.models import Servicio, PreRegistro, AsistenciaFeria, PreferenciaServicio, VentanaAsignacion
+
+CHUNK = 5000
+
+
+def resolver(preferencias, cupos, semilla=0):
+    """Asigna estudiantes a servicios.
+
+    ``preferencias``: ``{estudiante_id: [servicio_id, ...]}`` en orden de preferencia.
+    ``cupos``: ``{servicio_id: lugares libres}``.
+    Devuelve ``{estudiante_id: (servicio_id, rango)}`` con rango 1 = primera opción.
+    No modifica sus argumentos.
+    """
+    libres = dict(cupos)
+    orden = sorted(preferencias)
+    random.Random(semilla).shuffle(orden)
+
+    asignados = {}
+    for estudiante_id in orden:
+        for rango, servicio_id in enumerate(preferencias[estudiante_id], start=1):
+            if libres.get(servicio_id, 0) > 0:
+                libres[servicio_id] -= 1
+                asignados[estudiante_id] = (servicio_id, rango)
+                break
+    return asignados
+
+
+def resumir(preferencias, asignados):
+    total = len(preferencias)
+    por_rango = {}
+    for _, rango in asignados.values():
+        por_rango[rango] = por_rango.get(rango, 0) + 1
+    return {
+        'participantes': total,
+        'asignados': len(asignados),
+        'sin_asignar': total - len(asignados),
+        'primera_opcion': por_rango.get(1, 0),
+        'por_rango': {str(r): n for r, n in sorted(por_rango.items())},
+    }
+
+
+def ventana_abierta(periodo, ahora=None):
+    """La ventana del periodo si está recibiendo preferencias en este momento."""
+    ahora = ahora or datetime.utcnow()
+    ventana = VentanaAsignacion.query.filter_by(periodo=periodo, estado='abierta').first()
+    if ventana and ventana.abre <= ahora <= ventana.cierra:
+        return ventana
+    return None
+
+
+def periodo_por_preferencias(periodo):
+    """True si el periodo tiene una ventana aún sin asignar (no hay inscripción directa)."""
+    return consultas.VENTANA_ABIERTA.ejecutar(periodo=periodo).scalar() is not None
+
+
+def cargar_entrada(periodo):
+    """``(preferencias, cupos)`` desde la base, ya filtradas por elegibilidad."""
+    servicios = db.session.execute(
+        db.select(Servicio.id, Servicio.cupo_maximo).where(Servicio.periodo == periodo)
+    ).all()
+    inscritos = dict(db.session.execute(
+        db.select(PreRegistro.servicio_id, db.func.count(PreRegistro.id))
+        .where(PreRegistro.periodo == periodo).group_by(PreRegistro.servicio_id)
+    ).all())
+    cupos = {sid: max(0, cupo - inscritos.get(sid, 0)) for sid, cupo in servicios}
+
+    ya_inscritos = set(db.session.scalars(
+        db.select(PreRegistro.estudiante_id).where(PreRegistro.periodo == periodo)
+    ))
+    elegibles = set(db.session.scalars(db.select(AsistenciaFeria.estudiante_id).distinct()))
+
+    preferencias = {}
+    filas = db.session.execute(
+        db.select(PreferenciaServicio.estudiante_id, PreferenciaServicio.servicio_id)
+        .where(PreferenciaServicio.periodo == periodo)
+        .order_by(PreferenciaServicio.estudiante_id, PreferenciaServicio.rango)
+    )
+    for estudiante_id, servicio_id in filas:
+        if estudiante_id in elegibles and estudiante_id not in ya_inscritos and servicio_id in cupos:
+            preferencias.setdefault(estudiante_id, []).append(servicio_id)
+    return preferencias, cupos
+
+
+def ejecutar(periodo, semilla=None, simular=False):
+    """Corre la asignación del periodo. Con ``simular`` no escribe nada."""
+    consulta = VentanaAsignacion.query.filter_by(periodo=periodo)
+    if not simular:
+        consulta = consulta.with_for_update()  # evita dos ejecuciones simultáneas
+    ventana = consulta.first()
+    if ventana is None:
+        raise RuntimeError(f'No hay ventana de asignación para el periodo {periodo}')
+    if ventana.estado == 'asignada':
+        raise RuntimeError(f'La asignación del periodo {periodo} ya se ejecutó')
+    if semilla is None:
+        semilla = random.SystemRandom().randrange(2 ** 31)
+
+    t0 = time.perf_counter()
+    preferencias, cupos = cargar_entrada(periodo)
+    t1 = time.perf_counter()
+    asignados = resolver(preferencias, cupos, semilla)
+    t2 = time.perf_counter()
+
+    resumen = resumir(preferencias, asignados)
+    resumen.update({'periodo': periodo, 'semilla': semilla, 'simulacion': simular})
+    if simular:
+        db.session.rollback()
+    else:
+        ahora = datetime.utcnow()
+        filas = [{'estudiante_id': e, 'servicio_id': s, 'periodo': periodo, 'fecha_registro': ahora}
+                 for e, (s, _) in asignados.items()]
+        for i in range(0, len(filas), CHUNK):
+            db.session.execute(db.insert(PreRegistro), filas[i:i + CHUNK])
+        ventana.estado = 'asignada'
+        ventana.semilla = semilla
+        ventana.ejecutada_en = ahora
+        ventana.resumen = json.dumps(resumen)
+        db.session.commit()
+    resumen['tiempos_ms'] = {
+        'carga': round((t1 - t0) * 1000, 1),
+        'resolver': round((t2 - t1) * 1000, 1),
+        'insercion': round((time.perf_counter() - t2) * 1000, 1),
+    }
+    return resumen
+
+
+def entrada_sintetica(estudiantes=30000, servicios=1000, por_estudiante=5, cupo=40, semilla=1):
+    """Entrada reproducible para el benchmark: popularidad sesgada (algunos
+    servicios concentran muchas preferencias, como en la apertura real)."""
+    rng = random.Random(semilla)
+    ids = list(range(1, servicios + 1))
+    pesos = [1 / (i ** 0.8) for i in ids]
+    preferencias = {}
+    for e in range(1, estudiantes + 1):
+        elegidos = []
+        while len(elegidos) < min(por_estudiante, servicios):
+            s = rng.choices(ids, pesos)[0]
+            if s not in elegidos:
+                elegidos.append(s)
+        preferencias[e] = elegidos
+    return preferencias, {s: cupo for s in ids}
+
+
+def benchmark(estudiantes=30000, servicios=1000, por_estudiante=5, cupo=40, semilla=1, repeticiones=5):
+    preferencias, cupos = entrada_sintetica(estudiantes, servicios, por_estudiante, cupo, semilla)
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        asignados = resolver(preferencias, cupos, semilla)
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    resumen = resumir(preferencias, asignados)
+    resumen.update({
+        'cupo_total': sum(cupos.values()),
+        'mejor_ms': round(min(tiempos), 1),
+        'peor_ms': round(max(tiempos), 1),
+    })
+    return resumen
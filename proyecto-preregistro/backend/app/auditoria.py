@@ -0,0 +1,191 @@
+"""Bitácora de auditoría con escritura diferida (write-behind).
+
+Cada petición POST/PUT/PATCH/DELETE a los blueprints de ``BLUEPRINTS`` deja
+un evento (usuario, endpoint, id del recurso, status, IP y body sin
+contraseñas). El ``after_request`` solo agrega el evento a un buffer en
+memoria; un hilo por proceso lo vacía cada ``AUDITORIA_INTERVALO`` segundos,
+o antes si se juntan ``AUDITORIA_LOTE`` eventos, con un INSERT multi-fila en
+una transacción corta. Así la auditoría no agrega un INSERT síncrono a cada
+escritura.
+
+El buffer está acotado a ``AUDITORIA_BUFFER_MAX`` eventos: si la base no
+responde y se llena, se descartan los más antiguos y se cuenta en
+``estadisticas()``. Al terminar el proceso (``atexit``) se vacía lo pendiente.
+"""
+import atexit
+import json
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+
+from flask import request
+from flask_jwt_extended import get_jwt_identity
+
+from app import db
+from app.models import EventoAuditoria
+
+logger = logging.getLogger(__name__)
+
+BLUEPRINTS = frozenset({'admin', 'servicios', 'socios_formadores'})
+METODOS = frozenset({'POST', 'PUT', 'PATCH', 'DELETE'})
+CAMPOS_OCULTOS = ('password', 'token', 'secret')
+MAX_DETALLE = 2000
+
+_tabla = EventoAuditoria.__table__
+_lock = threading.Lock()
+_buffer = deque()
+_aviso = threading.Event()
+_estado = {'hilo': None, 'app': None, 'descartados': 0, 'escritos': 0, 'max': 10000, 'lote': 500}
+_disponible = {}
+
+
+def tabla_disponible():
+    engine = db.engine
+    if engine not in _disponible:
+        _disponible[engine] = db.inspect(engine).has_table(_tabla.name)
+        if not _disponible[engine]:
+            logger.warning('Tabla eventos_auditoria no encontrada: ejecuta migracion_eventos_auditoria.sql')
+    return _disponible[engine]
+
+
+def _limpiar(valor):
+    if isinstance(valor, dict):
+        return {k: ('***' if any(o in k.lower() for o in CAMPOS_OCULTOS) else _limpiar(v))
+                for k, v in valor.items()}
+    if isinstance(valor, list):
+        return [_limpiar(v) for v in valor]
+    return valor
+
+
+def _detalle():
+    body = request.get_json(silent=True)
+    if body is None:
+        return None
+    texto = json.dumps(_limpiar(body), ensure_ascii=False, default=str)
+    if len(texto) <= MAX_DETALLE:
+        return texto
+    # Recortado se guarda envuelto, para que la columna siga siendo JSON válido
+    corte = MAX_DETALLE
+    while True:
+        envuelto = json.dumps({'truncado': True, 'texto': texto[:corte]}, ensure_ascii=False)
+        if len(envuelto) <= MAX_DETALLE:
+            return envuelto
+        corte -= len(envuelto) - MAX_DETALLE
+
+
+def leer_detalle(detalle):
+    """El ``detalle`` guardado como objeto; el texto tal cual si no es JSON
+    (eventos recortados antes de guardarse envueltos)."""
+    if not detalle:
+        return None
+    try:
+        return json.loads(detalle)
+    except ValueError:
+        return detalle
+
+
+def registrar(evento):
+    """Agrega un evento (dict con las columnas de ``eventos_auditoria``) al buffer."""
+    with _lock:
+        if len(_buffer) >= _estado['max']:
+            _buffer.popleft()
+            _estado['descartados'] += 1
+        _buffer.append(evento)
+        lleno = len(_buffer) >= _estado['lote']
+    if lleno:
+        _aviso.set()
+
+
+def vaciar():
+    """Escribe todo lo pendiente en lotes. Devuelve cuántos eventos se escribieron."""
+    escritos = 0
+    while True:
+        with _lock:
+            lote = [_buffer.popleft() for _ in range(min(len(_buffer), _estado['lote']))]
+        if not lote:
+            return escritos
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(_tabla.insert(), lote)
+        except Exception:
+            logger.exception('No se pudo escribir la auditoría; %s eventos regresan al buffer', len(lote))
+            with _lock:
+                # El lote es más antiguo que lo que está en el buffer: si no cabe, se pierde su inicio
+                espacio = max(0, _estado['max'] - len(_buffer))
+                devueltos = lote[len(lote) - espacio:] if espacio else []
+                _buffer.extendleft(reversed(devueltos))
+                _estado['descartados'] += len(lote) - len(devueltos)
+            return escritos
+        escritos += len(lote)
+        with _lock:
+            _estado['escritos'] += len(lote)
+
+
+def _hilo(app, intervalo):
+    with app.app_context():
+        while True:
+            _aviso.wait(intervalo)
+            _aviso.clear()
+            vaciar()
+
+
+def _vaciar_al_salir():
+    app = _estado['app']
+    if app is None or not _buffer:
+        return
+    with app.app_context():
+        vaciar()
+
+
+def estadisticas():
+    with _lock:
+        return {
+            'pendientes': len(_buffer),
+            'escritos': _estado['escritos'],
+            'descartados': _estado['descartados'],
+        }
+
+
+def _iniciar_hilo(app):
+    with _lock:
+        if _estado['hilo'] is not None and _estado['hilo'].is_alive():
+            return
+        hilo = threading.Thread(target=_hilo, args=(app, app.config.get('AUDITORIA_INTERVALO', 1.0)),
+                                name='auditoria', daemon=True)
+        _estado['hilo'] = hilo
+    hilo.start()
+
+
+def init_auditoria(app):
+    if not app.config.get('AUDITORIA_HABILITADA', True):
+        return
+    _estado['app'] = app
+    _estado['max'] = app.config.get('AUDITORIA_BUFFER_MAX', 10000)
+    _estado['lote'] = app.config.get('AUDITORIA_LOTE', 500)
+    atexit.register(_vaciar_al_salir)
+
+    @app.after_request
+    def auditar(response):
+        if request.method not in METODOS or request.blueprint not in BLUEPRINTS:
+            return response
+        if not tabla_disponible():
+            return response
+        try:
+            usuario_id = int(get_jwt_identity())
+        except (RuntimeError, TypeError, ValueError):  # la petición no pasó la verificación del JWT
+            usuario_id = None
+        vista = request.view_args or {}
+        recurso_id = next(iter(vista.values()), None)
+        registrar({
+            'creado': datetime.utcnow(),
+            'usuario_id': usuario_id,
+            'metodo': request.method,
+            'accion': (request.endpoint or request.path)[:80],
+            'recurso_id': str(recurso_id)[:40] if recurso_id is not None else None,
+            'status_code': response.status_code,
+            'ip': (request.remote_addr or '')[:45] or None,
+            'detalle': _detalle(),
+        })
+        _iniciar_hilo(app)
+        return response
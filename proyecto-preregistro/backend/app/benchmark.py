@@ -0,0 +1,412 @@
+"""Benchmark reproducible de los endpoints más usados.
+
+Ejecuta cada escenario con el test client de Flask sobre la base configurada
+(normalmente poblada con ``flask seed-data``) y registra latencia p50/p95/p99
+y número de queries SQL por petición. Los resultados se pueden guardar como
+baseline y comparar contra corridas posteriores con un umbral de regresión.
+"""
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Optional
+
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+from flask_jwt_extended import create_access_token
+
+from app import db, limiter, json_provider, serializers, consultas
+from app.models import Usuario, Estudiante, Servicio, AsistenciaFeria, PreRegistro, Carrera
+from app.seeder import PREFIJO, PASSWORD
+
+
+class ContadorQueries:
+    """Cuenta (y opcionalmente guarda) las sentencias SQL ejecutadas en el engine."""
+
+    def __init__(self, guardar=False):
+        self.total = 0
+        self.guardar = guardar
+        self.sentencias = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.total += 1
+        if self.guardar:
+            self.sentencias.append((statement, parameters))
+
+
+@contextmanager
+def capturar_queries(guardar=False):
+    contador = ContadorQueries(guardar)
+    engine = db.engine
+    db.event.listen(engine, 'before_cursor_execute', contador)
+    try:
+        yield contador
+    finally:
+        db.event.remove(engine, 'before_cursor_execute', contador)
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    k = max(0, min(len(ordenados) - 1, int(round(p / 100 * len(ordenados) + 0.5)) - 1))
+    return ordenados[k]
+
+
+def preparar_contexto():
+    """Reúne tokens y datos de muestra para construir las peticiones."""
+    from app.routes.checkin import _generar_token
+
+    admin = Usuario.query.filter_by(username=f'{PREFIJO}_admin').first()
+    if not admin:
+        raise RuntimeError('No hay datos de benchmark; ejecuta primero `flask seed-data`')
+
+    periodo = db.session.query(db.func.max(Servicio.periodo))\
+        .filter(Servicio.crn.startswith(f'{PREFIJO}-')).scalar()
+    # El check-in toma la primera asistencia del estudiante: solo sirven los que
+    # tienen como primer registro uno pendiente.
+    primera = db.session.query(db.func.min(AsistenciaFeria.id))\
+        .group_by(AsistenciaFeria.estudiante_id)
+    pendientes = db.session.query(AsistenciaFeria.id, Estudiante.matricula)\
+        .join(Estudiante, Estudiante.id == AsistenciaFeria.estudiante_id)\
+        .filter(AsistenciaFeria.id.in_(primera), AsistenciaFeria.estatus_asistencia == 'pendiente',
+                Estudiante.matricula.startswith('b'))\
+        .order_by(AsistenciaFeria.id).limit(500).all()
+
+    token_qr, _ = _generar_token(8, current_app.config['SECRET_KEY'])
+    return {
+        'admin': {'Authorization': f'Bearer {create_access_token(identity=admin.id)}'},
+        'periodo': periodo,
+        'checkin': [m for _, m in pendientes],
+        'checkin_ids': [i for i, _ in pendientes],
+        'token_qr': token_qr,
+    }
+
+
+def escenarios(ctx):
+    """Cada escenario: (nombre, iteraciones sugeridas, fn(i) -> (método, url, kwargs))."""
+    admin = ctx['admin']
+    periodo = ctx['periodo']
+    return [
+        ('login', 20, lambda i: ('POST', '/api/auth/login', {
+            'json': {'username': f'{PREFIJO}_{i:07d}', 'password': PASSWORD}})),
+        ('checkin', min(200, len(ctx['checkin'])), lambda i: ('POST', '/api/checkin/entrada', {
+            'json': {'matricula': ctx['checkin'][i], 'token': ctx['token_qr']}})),
+        ('get_servicios', 100, lambda i: ('GET', f'/api/servicios?page={i % 20 + 1}', {'headers': admin})),
+        ('get_preregistros', 100, lambda i: (
+            'GET', f'/api/preregistros?periodo={periodo}&page={i % 20 + 1}', {'headers': admin})),
+        ('dashboard_stats', 30, lambda i: ('GET', '/api/dashboard/stats', {'headers': admin})),
+        ('dashboard_stats_periodo', 30, lambda i: (
+            'GET', f'/api/dashboard/stats?periodo={periodo}', {'headers': admin})),
+        ('reporte_preregistros', 10, lambda i: (
+            'GET', f'/api/reportes/preregistros?periodo={periodo}', {'headers': admin})),
+        ('reporte_estudiantes', 5, lambda i: ('GET', '/api/reportes/estudiantes', {'headers': admin})),
+    ]
+
+
+def _restaurar(ctx):
+    """Regresa a 'pendiente' las asistencias que el escenario de check-in modificó."""
+    if ctx['checkin_ids']:
+        AsistenciaFeria.query.filter(AsistenciaFeria.id.in_(ctx['checkin_ids']))\
+            .update({'estatus_asistencia': 'pendiente', 'hora_real_asistencia': None},
+                    synchronize_session=False)
+        db.session.commit()
+
+
+def ejecutar(app, solo=None, factor=1.0, log=print):
+    """Corre los escenarios y devuelve ``{escenario: métricas}``."""
+    resultados = {}
+    limiter.enabled = False
+    client = app.test_client()
+    ctx = preparar_contexto()
+    try:
+        for nombre, iteraciones, peticion in escenarios(ctx):
+            if solo and nombre not in solo:
+                continue
+            n = max(1, int(iteraciones * factor))
+            if nombre == 'checkin':
+                n = min(n, len(ctx['checkin']))
+            tiempos, queries, errores = [], [], 0
+            for i in range(n):
+                metodo, url, kwargs = peticion(i)
+                with capturar_queries() as contador:
+                    inicio = time.perf_counter()
+                    resp = client.open(url, method=metodo, **kwargs)
+                    tiempos.append((time.perf_counter() - inicio) * 1000)
+                queries.append(contador.total)
+                if resp.status_code >= 400:
+                    errores += 1
+            resultados[nombre] = {
+                'n': n,
+                'p50_ms': round(percentil(tiempos, 50), 2),
+                'p95_ms': round(percentil(tiempos, 95), 2),
+                'p99_ms': round(percentil(tiempos, 99), 2),
+                'queries': round(sum(queries) / len(queries), 1),
+                'errores': errores,
+            }
+            r = resultados[nombre]
+            log(f"{nombre:<26} n={n:<4} p50={r['p50_ms']:>8} p95={r['p95_ms']:>8} "
+                f"p99={r['p99_ms']:>8} ms  queries={r['queries']:<6} errores={errores}")
+    finally:
+        db.session.rollback()
+        _restaurar(ctx)
+        limiter.enabled = True
+    return resultados
+
+
+def comparar(resultados, baseline, umbral=0.20, margen_ms=2.0):
+    """Devuelve la lista de regresiones contra el baseline.
+
+    Una regresión es un p95 más de ``umbral`` por encima del baseline (ignorando
+    diferencias menores a ``margen_ms``) o cualquier aumento de queries por petición.
+    """
+    regresiones = []
+    for nombre, actual in resultados.items():
+        base = baseline.get(nombre)
+        if not base:
+            continue
+        limite = base['p95_ms'] * (1 + umbral)
+        if actual['p95_ms'] > limite and actual['p95_ms'] - base['p95_ms'] > margen_ms:
+            regresiones.append(f"{nombre}: p95 {actual['p95_ms']} ms > {round(limite, 2)} ms "
+                               f"(baseline {base['p95_ms']} ms)")
+        if actual['queries'] > base['queries']:
+            regresiones.append(f"{nombre}: {actual['queries']} queries/petición "
+                               f"(baseline {base['queries']})")
+    return regresiones
+
+
+def _filas_sinteticas(n):
+    """Filas con las columnas del listado de pre-registros, sin base de datos."""
+    inicio = datetime(2025, 1, 1)
+    return [SimpleNamespace(
+        id=i, estudiante_nombre=f'Estudiante {i}', matricula=f'A{i:08d}',
+        carrera='Ingeniería en Tecnologías Computacionales', crn=f'{i % 1000:05d}',
+        servicio_descripcion=f'Servicio social {i % 1000}', periodo='2025-1',
+        fecha_registro=inicio + timedelta(minutes=i),
+    ) for i in range(n)]
+
+
+@dataclass(slots=True)
+class _PreRegistroSlots:
+    """Alternativa medida como referencia: una dataclass con __slots__ por fila."""
+    id: int
+    estudiante_nombre: str
+    matricula: str
+    carrera: Optional[str]
+    crn: str
+    servicio_descripcion: str
+    periodo: str
+    fecha_registro: Optional[str]
+
+    @classmethod
+    def desde(cls, r):
+        return cls(
+            r.id, r.estudiante_nombre, r.matricula, r.carrera, r.crn,
+            r.servicio_descripcion, r.periodo, serializers.iso(r.fecha_registro),
+        )
+
+
+def medir_serializacion(app, filas=10000, repeticiones=20, log=print):
+    """Tiempo de armar y serializar una lista grande de pre-registros con cada
+    combinación de proveedor JSON (Flask estándar / orjson) y forma de fila
+    (dict de app/serializers.py / dataclass con __slots__)."""
+    datos = _filas_sinteticas(filas)
+    proveedores = {'flask': DefaultJSONProvider(app)}
+    if json_provider.orjson is not None:
+        proveedores['orjson'] = json_provider.OrjsonProvider(app)
+    else:
+        log('orjson no está instalado: solo se mide el proveedor estándar')
+    formas = {'dict': serializers.preregistro, 'dataclass': _PreRegistroSlots.desde}
+
+    resultados = {}
+    for nombre_prov, proveedor in proveedores.items():
+        for nombre_forma, convertir in formas.items():
+            tiempos, tamano = [], 0
+            for _ in range(repeticiones):
+                t0 = time.perf_counter()
+                tamano = len(proveedor.dumps({'data': [convertir(r) for r in datos]}))
+                tiempos.append((time.perf_counter() - t0) * 1000)
+            nombre = f'{nombre_prov}+{nombre_forma}'
+            resultados[nombre] = {
+                'p50_ms': round(percentil(tiempos, 50), 2),
+                'p95_ms': round(percentil(tiempos, 95), 2),
+                'bytes': tamano,
+            }
+            log(f"{nombre:<20} p50={resultados[nombre]['p50_ms']:>8} ms  "
+                f"p95={resultados[nombre]['p95_ms']:>8} ms  {tamano} bytes")
+    return resultados
+
+
+def _reporte_orm(limite):
+    # Forma anterior de reporte_preregistros: entidades completas y relaciones perezosas
+    registros = PreRegistro.query.join(Estudiante).join(Servicio)\
+        .join(Carrera, Estudiante.carrera_id == Carrera.id)\
+        .order_by(PreRegistro.fecha_registro.desc()).limit(limite).all()
+    return [[
+        r.estudiante.nombre_completo, r.estudiante.matricula,
+        r.estudiante.carrera.nombre if r.estudiante.carrera else '',
+        r.servicio.crn, r.servicio.descripcion, r.periodo, r.fecha_registro,
+    ] for r in registros]
+
+
+def _reporte_select(limite):
+    stmt = db.select(
+        Estudiante.nombre_completo, Estudiante.matricula, Carrera.nombre, Servicio.crn,
+        Servicio.descripcion, PreRegistro.periodo, PreRegistro.fecha_registro,
+    ).join(Estudiante, Estudiante.id == PreRegistro.estudiante_id)\
+        .join(Servicio, Servicio.id == PreRegistro.servicio_id)\
+        .join(Carrera, Estudiante.carrera_id == Carrera.id)\
+        .order_by(PreRegistro.fecha_registro.desc()).limit(limite)
+    return [list(r) for r in db.session.execute(stmt)]
+
+
+def medir_proyecciones(limite=100000, repeticiones=3, log=print):
+    """Compara leer pre-registros como entidades del ORM contra un ``select()`` de
+    columnas: tiempo por fila (mejor de ``repeticiones``), pico de memoria
+    (tracemalloc, en una corrida aparte) y número de queries."""
+    resultados = {}
+    for nombre, leer in (('orm', _reporte_orm), ('select', _reporte_select)):
+        tiempos = []
+        for _ in range(repeticiones):
+            db.session.expunge_all()  # identity map vacío en cada corrida
+            with capturar_queries() as contador:
+                t0 = time.perf_counter()
+                filas = len(leer(limite))
+                tiempos.append(time.perf_counter() - t0)
+
+        db.session.expunge_all()
+        tracemalloc.start()
+        leer(limite)
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        db.session.expunge_all()
+
+        resultados[nombre] = {
+            'filas': filas,
+            'ms': round(min(tiempos) * 1000, 2),
+            'us_por_fila': round(min(tiempos) * 1e6 / filas, 2) if filas else 0.0,
+            'pico_mb': round(pico / 2 ** 20, 2),
+            'bytes_por_fila': pico // filas if filas else 0,
+            'queries': contador.total,
+        }
+        r = resultados[nombre]
+        log(f"{nombre:<7} filas={r['filas']:<7} {r['ms']:>9} ms  {r['us_por_fila']:>7} us/fila  "
+            f"pico={r['pico_mb']:>7} MB ({r['bytes_por_fila']} B/fila)  queries={r['queries']}")
+    return resultados
+
+
+def _datos_consultas():
+    fila = db.session.execute(
+        db.select(Estudiante.id, Estudiante.matricula, Usuario.id.label('usuario_id'), Usuario.username)
+        .join(Usuario, Usuario.id == Estudiante.usuario_id)
+        .join(AsistenciaFeria, AsistenciaFeria.estudiante_id == Estudiante.id).limit(1)
+    ).first()
+    crn = db.session.scalar(db.select(Servicio.crn).limit(1))
+    if fila is None or crn is None:
+        raise RuntimeError('No hay datos; ejecuta primero `flask seed-data`')
+    return SimpleNamespace(estudiante_id=fila.id, matricula=fila.matricula, usuario_id=fila.usuario_id,
+                           username=fila.username, crn=crn)
+
+
+def _escenarios_consultas(d):
+    """``{escenario: (forma_anterior, precompilada)}``; solo lecturas."""
+    from app.models import VentanaAsignacion
+
+    def login_orm():
+        u = Usuario.query.filter_by(username=d.username).first()
+        return u.estudiante.nombre_completo if u.estudiante else None
+
+    def login_matricula_orm():
+        e = Estudiante.query.filter(db.func.lower(Estudiante.matricula) == d.matricula.lower()).first()
+        return e.usuario.estudiante.nombre_completo
+
+    def inscripcion_orm():
+        Estudiante.query.get(d.estudiante_id)
+        s = Servicio.query.filter_by(crn=d.crn).first()
+        db.session.query(VentanaAsignacion.id).filter_by(periodo=s.periodo, estado='abierta').first()
+        AsistenciaFeria.query.filter_by(estudiante_id=d.estudiante_id).first()
+        PreRegistro.query.filter_by(servicio_id=s.id).count()
+        PreRegistro.query.filter_by(estudiante_id=d.estudiante_id, servicio_id=s.id).first()
+        PreRegistro.query.filter(PreRegistro.estudiante_id == d.estudiante_id,
+                                 PreRegistro.periodo == s.periodo).first()
+
+    def inscripcion_pre():
+        consultas.EXISTE_ESTUDIANTE.ejecutar(estudiante_id=d.estudiante_id).scalar()
+        s = consultas.SERVICIO_POR_CRN.ejecutar(crn=d.crn).first()
+        consultas.VENTANA_ABIERTA.ejecutar(periodo=s.periodo).scalar()
+        consultas.TIENE_ASISTENCIA.ejecutar(estudiante_id=d.estudiante_id).scalar()
+        consultas.INSCRITOS_SERVICIO.ejecutar(servicio_id=s.id).scalar()
+        consultas.INSCRIPCION_EXISTENTE.ejecutar(estudiante_id=d.estudiante_id, servicio_id=s.id).scalar()
+        consultas.INSCRIPCION_EN_PERIODO.ejecutar(estudiante_id=d.estudiante_id, periodo=s.periodo).scalar()
+
+    return {
+        'login': (login_orm, lambda: consultas.USUARIO_POR_USERNAME.ejecutar(username=d.username).first()),
+        'login_matricula': (login_matricula_orm,
+                            lambda: consultas.USUARIO_POR_MATRICULA.ejecutar(matricula=d.matricula.lower()).first()),
+        'role_required': (lambda: Usuario.query.get(d.usuario_id).rol,
+                          lambda: consultas.ROL_USUARIO.ejecutar(usuario_id=d.usuario_id).scalar()),
+        'checkin': (
+            lambda: AsistenciaFeria.query.filter_by(
+                estudiante_id=Estudiante.query.filter_by(matricula=d.matricula).first().id).first(),
+            lambda: consultas.ASISTENCIA_DE_ESTUDIANTE.ejecutar(
+                estudiante_id=consultas.ESTUDIANTE_POR_MATRICULA.ejecutar(matricula=d.matricula).first().id).first(),
+        ),
+        'inscripcion': (inscripcion_orm, inscripcion_pre),
+    }
+
+
+def _medir(fn, repeticiones):
+    for _ in range(min(50, repeticiones)):  # calentamiento: caché de compilación y PREPARE
+        fn()
+        db.session.expunge_all()
+    with capturar_queries() as contador:
+        fn()
+    db.session.expunge_all()
+    t0 = time.process_time()
+    for _ in range(repeticiones):
+        fn()
+        db.session.expunge_all()  # identity map vacío, como en una petición nueva
+    return (time.process_time() - t0) * 1e6 / repeticiones, contador.total
+
+
+def medir_consultas(repeticiones=2000, log=print):
+    """CPU del proceso por llamada (µs) de las consultas de login, role_required,
+    check-in e inscripción: forma anterior con ``Model.query`` contra las
+    sentencias de app/consultas.py. En PostgreSQL se mide además la sentencia
+    precompilada sin PREPARE, para separar lo que ahorra el servidor."""
+    d = _datos_consultas()
+    config = current_app.config
+    preparadas = config.get('CONSULTAS_PREPARADAS', True)
+    resultados = {}
+    try:
+        for nombre, (anterior, precompilada) in _escenarios_consultas(d).items():
+            r = resultados[nombre] = {'orm': _medir(anterior, repeticiones)}
+            if db.engine.dialect.name == 'postgresql':
+                config['CONSULTAS_PREPARADAS'] = False
+                r['sin_prepare'] = _medir(precompilada, repeticiones)
+                config['CONSULTAS_PREPARADAS'] = preparadas
+            r['precompilada'] = _medir(precompilada, repeticiones)
+            base = r['orm'][0]
+            partes = [f"{forma}={us:8.1f} us ({q} q)" for forma, (us, q) in r.items()]
+            log(f"{nombre:<16} " + '  '.join(partes) + f"  ahorro={100 * (1 - r['precompilada'][0] / base):5.1f}%")
+    finally:
+        config['CONSULTAS_PREPARADAS'] = preparadas
+        db.session.rollback()
+    return {
+        nombre: {forma: {'us': round(us, 1), 'queries': q} for forma, (us, q) in r.items()}
+        for nombre, r in resultados.items()
+    }
+
+
+def cargar_json(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def guardar_json(path, datos):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(datos, f, indent=2, ensure_ascii=False, sort_keys=True)
+        f.write('\n')
@@ -0,0 +1,89 @@
+"""Caché en proceso (read-through) para tablas de referencia pequeñas.
+
+Cada entrada guarda el valor junto con la versión de las tablas de las que
+depende (ver app/versiones.py). Los commits de este proceso invalidan las
+entradas afectadas al momento; los de otros workers se detectan releyendo los
+contadores de ``versiones_datos``, como mucho cada ``CACHE_REFERENCIA_TTL``
+segundos. Los valores cacheados se comparten entre peticiones: no modificarlos.
+"""
+import threading
+import time
+import weakref
+from functools import wraps
+
+from flask import current_app
+
+from app import versiones
+
+_instancias = weakref.WeakSet()
+
+
+class CacheReferencia:
+    def __init__(self, ttl=2.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entradas = {}
+        self._versiones = {}
+        self._leidas_en = 0.0
+        _instancias.add(self)
+
+    def _versiones_actuales(self):
+        ahora = time.monotonic()
+        if ahora - self._leidas_en >= self.ttl:
+            actuales = versiones.versiones(sorted(versiones.RECURSOS))
+            if actuales is None:
+                return None
+            with self._lock:
+                self._versiones = actuales
+                self._leidas_en = ahora
+        return self._versiones
+
+    def obtener(self, nombre, recursos, cargar):
+        actuales = self._versiones_actuales()
+        if actuales is None:
+            return cargar()
+        firma = tuple(actuales.get(r, 0) for r in recursos)
+        entrada = self._entradas.get(nombre)
+        if entrada is not None and entrada[0] == firma:
+            return entrada[1]
+        valor = cargar()
+        with self._lock:
+            self._entradas[nombre] = (firma, valor, frozenset(recursos))
+        return valor
+
+    def invalidar(self, recursos=None):
+        """Descarta las entradas que dependen de ``recursos`` (todas si es None)
+        y fuerza releer las versiones en la siguiente lectura."""
+        with self._lock:
+            if recursos is None:
+                self._entradas.clear()
+            else:
+                for nombre, entrada in list(self._entradas.items()):
+                    if entrada[2] & recursos:
+                        del self._entradas[nombre]
+            self._leidas_en = 0.0
+
+
+@versiones.al_cambiar
+def _invalidar_local(recursos):
+    for cache in list(_instancias):
+        cache.invalidar(recursos)
+
+
+def cache_referencia():
+    return current_app.extensions['cache_referencia']
+
+
+def cacheado(nombre, *recursos):
+    """Decorator para funciones sin argumentos que cargan datos de referencia."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper():
+            return cache_referencia().obtener(nombre, recursos, fn)
+        wrapper.sin_cache = fn
+        return wrapper
+    return decorator
+
+
+def init_cache(app):
+    app.extensions['cache_referencia'] = CacheReferencia(app.config.get('CACHE_REFERENCIA_TTL', 2.0))
@@ -0,0 +1,224 @@
+"""Feed de cambios incremental para sistemas que sincronizan con la base.
+
+``estudiantes``, ``preregistros`` y ``asistencias_feria`` tienen la columna
+``transaccion``, que el ORM pone en cada INSERT/UPDATE (incluidos
+``Query.update()`` y ``session.execute(update(...))``) con la marca de la
+transacción que escribe (``models.MarcaTransaccion``; en PostgreSQL, su xid).
+Las filas borradas dejan una lápida en ``registros_eliminados`` con la misma
+marca:
+
+- los ``session.delete(obj)`` se registran en ``before_flush``;
+- los borrados masivos (``Query.delete()`` / ``session.execute(delete(...))``)
+  leen antes los ids con el mismo WHERE, en la misma transacción;
+- el TRUNCATE de una partición deja una sola lápida con ``registro_id`` NULL
+  y el periodo (``registrar_vaciado``).
+
+``pagina()`` recorre filas y lápidas juntas, en orden ``(transaccion, lápidas
+antes que filas, id)``, y solo hasta el horizonte: la marca más baja de las
+transacciones que siguen abiertas (``txid_snapshot_xmin``). Todo lo que queda
+debajo ya confirmó o se descartó, así que una transacción lenta, por larga
+que sea, no queda detrás de un cursor ya entregado: frena el feed hasta que
+termina. El cursor es opaco para el cliente (base64 de JSON). Vence cuando
+tiene más de ``CAMBIOS_RETENCION_DIAS`` días, porque las lápidas más antiguas
+se purgan.
+"""
+import base64
+import binascii
+import json
+import logging
+from datetime import date, time, datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+
+from app import db
+from app.models import Estudiante, PreRegistro, AsistenciaFeria, RegistroEliminado, MarcaTransaccion
+
+logger = logging.getLogger(__name__)
+
+TABLAS = {
+    'estudiantes': Estudiante,
+    'preregistros': PreRegistro,
+    'asistencias_feria': AsistenciaFeria,
+}
+LIMITE = 1000
+LIMITE_MAX = 5000
+# Dentro de una misma transacción las lápidas van antes que las filas: un id
+# borrado y vuelto a insertar termina como upsert
+LAPIDA, FILA = 0, 1
+
+_lapidas = RegistroEliminado.__table__
+_disponible = {}
+
+
+class CursorVencido(RuntimeError):
+    pass
+
+
+class Horizonte(FunctionElement):
+    """Marca más baja que aún puede confirmar: todo lo de abajo ya es definitivo."""
+    type = db.BigInteger()
+    inherit_cache = True
+
+
+@compiles(Horizonte, 'postgresql')
+def _horizonte_postgresql(element, compiler, **kw):
+    return 'txid_snapshot_xmin(txid_current_snapshot())'
+
+
+@compiles(Horizonte)
+def _horizonte_sqlite(element, compiler, **kw):
+    return compiler.process(MarcaTransaccion(), **kw)
+
+
+def tabla_disponible():
+    engine = db.engine
+    if engine not in _disponible:
+        _disponible[engine] = db.inspect(engine).has_table(_lapidas.name)
+        if not _disponible[engine]:
+            logger.warning('Tabla registros_eliminados no encontrada: ejecuta migracion_feed_cambios.sql')
+    return _disponible[engine]
+
+
+# ─────────────────────────────────────────────
+#   Lápidas
+# ─────────────────────────────────────────────
+
+def _before_flush(session, flush_context, instances):
+    borrados = [o for o in session.deleted if getattr(o, '__tablename__', None) in TABLAS]
+    if not borrados or not tabla_disponible():
+        return
+    ahora = datetime.utcnow()
+    for obj in borrados:
+        session.add(RegistroEliminado(tabla=obj.__tablename__, registro_id=obj.id,
+                                      periodo=getattr(obj, 'periodo', None), eliminado=ahora))
+
+
+def _do_orm_execute(state):
+    if not state.is_delete or state.bind_mapper is None:
+        return
+    tabla = state.bind_mapper.persist_selectable
+    if tabla.name not in TABLAS or not tabla_disponible():
+        return
+    periodo = tabla.c.periodo if 'periodo' in tabla.c else db.null()
+    consulta = db.select(tabla.c.id, periodo)
+    if state.statement.whereclause is not None:
+        consulta = consulta.where(state.statement.whereclause)
+    filas = state.session.execute(consulta).all()
+    if filas:
+        ahora = datetime.utcnow()
+        state.session.execute(_lapidas.insert(), [
+            {'tabla': tabla.name, 'registro_id': f[0], 'periodo': f[1], 'eliminado': ahora} for f in filas
+        ])
+
+
+def registrar_vaciado(tabla, periodo):
+    """Lápida de periodo completo, para borrados que no pasan por el ORM (TRUNCATE)."""
+    if tabla in TABLAS and tabla_disponible():
+        db.session.add(RegistroEliminado(tabla=tabla, periodo=periodo, eliminado=datetime.utcnow()))
+
+
+def purgar(dias, lote=LIMITE):
+    """Borra por lotes las lápidas con más de ``dias`` días. Devuelve cuántas se eliminaron."""
+    limite = datetime.utcnow() - timedelta(days=dias)
+    borradas = 0
+    while True:
+        with db.engine.begin() as conn:
+            ids = list(conn.scalars(db.select(_lapidas.c.id).where(_lapidas.c.eliminado < limite)
+                                    .order_by(_lapidas.c.id).limit(lote)))
+            if not ids:
+                return borradas
+            conn.execute(_lapidas.delete().where(_lapidas.c.id.in_(ids)))
+        borradas += len(ids)
+
+
+# ─────────────────────────────────────────────
+#   Cursor y páginas
+# ─────────────────────────────────────────────
+
+def codificar_cursor(transaccion, fase, registro_id, emitido):
+    datos = {'t': transaccion, 'f': fase, 'i': registro_id, 'c': emitido.isoformat()}
+    return base64.urlsafe_b64encode(json.dumps(datos, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def leer_cursor(texto):
+    """``(transaccion, fase, id, emitido)`` del cursor; todo vacío si no hay cursor."""
+    if not texto:
+        return None, FILA, 0, None
+    try:
+        datos = json.loads(base64.urlsafe_b64decode(texto + '=' * (-len(texto) % 4)))
+        fase = int(datos['f'])
+        if fase not in (LAPIDA, FILA):
+            raise ValueError(fase)
+        return (int(datos['t']) if datos['t'] is not None else None, fase, int(datos['i']),
+                datetime.fromisoformat(datos['c']))
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise RuntimeError('Cursor inválido')
+
+
+def _valor(v):
+    return v.isoformat() if isinstance(v, (date, time, datetime)) else v
+
+
+def _posteriores(columnas, fase, t, f, i):
+    """Condición ``(transaccion, fase, id) > (t, f, i)`` para un lado del feed."""
+    if t is None:
+        return db.true()
+    if fase < f:
+        return columnas.transaccion > t
+    if fase > f:
+        return columnas.transaccion >= t
+    return db.tuple_(columnas.transaccion, columnas.id) > db.tuple_(t, i)
+
+
+def pagina(tabla, cursor=None, limite=LIMITE):
+    """Cambios de ``tabla`` posteriores al cursor, en el orden de sus transacciones.
+
+    Devuelve ``(cambios, siguiente_cursor, hay_mas)``. ``cambios`` es una lista
+    de ``('upsert', fila)``, con ``fila`` un dict con todas las columnas, y de
+    ``('delete', lapida)``, con ``lapida`` ``(id, registro_id, periodo,
+    eliminado, transaccion)``.
+    """
+    if tabla not in TABLAS:
+        raise RuntimeError(f'Tabla sin feed de cambios: {tabla}')
+    t, f, i, emitido = leer_cursor(cursor)
+    ahora = datetime.utcnow()
+    if emitido is not None and emitido < ahora - timedelta(days=current_app.config.get('CAMBIOS_RETENCION_DIAS', 30)):
+        raise CursorVencido('El cursor es más antiguo que la retención de borrados; sincroniza desde cero')
+    # Un solo horizonte para filas y lápidas: si no, una de las dos podría adelantarse a la otra
+    horizonte = db.session.scalar(db.select(Horizonte()))
+
+    columnas = TABLAS[tabla].__table__.c
+    pendientes = [
+        ((r.transaccion, FILA, r.id), ('upsert', {c: _valor(v) for c, v in r._mapping.items()}))
+        for r in db.session.execute(
+            db.select(*columnas)
+            .where(columnas.transaccion < horizonte, _posteriores(columnas, FILA, t, f, i))
+            .order_by(columnas.transaccion, columnas.id).limit(limite))
+    ]
+    lapidas = 0
+    if tabla_disponible():
+        for r in db.session.execute(
+            db.select(_lapidas.c.id, _lapidas.c.registro_id, _lapidas.c.periodo, _lapidas.c.eliminado,
+                      _lapidas.c.transaccion)
+            .where(_lapidas.c.tabla == tabla, _lapidas.c.transaccion < horizonte,
+                   _posteriores(_lapidas.c, LAPIDA, t, f, i))
+            .order_by(_lapidas.c.transaccion, _lapidas.c.id).limit(limite)
+        ):
+            pendientes.append(((r.transaccion, LAPIDA, r.id), ('delete', r)))
+            lapidas += 1
+
+    hay_mas = len(pendientes) > limite or lapidas == limite or len(pendientes) - lapidas == limite
+    pendientes.sort(key=lambda p: p[0])
+    pendientes = pendientes[:limite]
+    if pendientes:
+        t, f, i = pendientes[-1][0]
+    return [c for _, c in pendientes], codificar_cursor(t, f, i, ahora), hay_mas
+
+
+def init_cambios(app):
+    for nombre, fn in (('before_flush', _before_flush), ('do_orm_execute', _do_orm_execute)):
+        if not event.contains(db.session, nombre, fn):
+            event.listen(db.session, nombre, fn)
@@ -0,0 +1,182 @@
+"""Carriles de prioridad: límite de concurrencia por clase de ruta.
+
+Cada petición entra a un carril según su endpoint:
+
+- ``critico``: el check-in en la puerta y el login.
+- ``masivo``: reportes, dashboard, feed de cambios, archivo y operaciones
+  en bloque.
+- ``normal``: todo lo demás (estudiantes, becarios, catálogos).
+
+Cada carril es un semáforo por proceso de ``CARRIL_<CLASE>_MAX`` lugares.
+Si el carril está lleno, la petición espera como mucho ``ESPERA[clase]``
+segundos y luego responde ``503`` con ``Retry-After``, en lugar de quedar
+formada ocupando un hilo. Así, una exportación pesada no deja sin hilos al
+check-in. Los límites aíslan cargas dentro de un proceso, por lo que sirven
+con workers de varios hilos (``gunicorn -k gthread --threads N``); con
+workers síncronos cada proceso atiende una sola petición a la vez.
+
+En PostgreSQL, las transacciones de una petición de un carril con
+``CARRIL_<CLASE>_TIMEOUT_MS`` se abren con ``SET LOCAL statement_timeout``.
+Una consulta cancelada por ese límite también responde ``503``.
+
+Los long-poll de la cola de inscripciones sueltan su lugar antes de esperar
+(``liberar()``).
+"""
+import logging
+import threading
+
+from flask import g, request, jsonify, current_app, has_request_context
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+CRITICO = frozenset({
+    'checkin.registrar_entrada',
+    'asistencias.validar_asistencia',
+    'auth.login',
+})
+MASIVO = frozenset({
+    'admin.get_stats',
+    'admin.reporte_estudiantes',
+    'admin.reporte_preregistros',
+    'admin.reporte_archivado',
+    'admin.descargar_archivo',
+    'admin.get_cambios',
+    'admin.get_auditoria',
+    'admin.archivar_periodo',
+    'admin.restaurar_periodo',
+    'admin.ejecutar_asignacion',
+    'admin.recalcular_horarios_feria',
+    'admin.ejecutar_mantenimiento',
+    'asistencias.cerrar_feria',
+    'asistencias.validar_asistencias_lote',
+    'socios_formadores.stats_socios',
+    'socios_formadores.detalle_socio',
+})
+
+ESPERA = {'critico': 2.0, 'normal': 0.5, 'masivo': 0.0}
+RETRY_AFTER = {'critico': 1, 'normal': 2, 'masivo': 10}
+PGCODE_CANCELADA = '57014'  # query_canceled (statement_timeout)
+
+_carriles = {}   # clase -> (semáforo, máximo)
+_contadores = {}  # clase -> {'rechazadas': n, 'canceladas': n}
+_lock = threading.Lock()
+
+
+def clase(endpoint):
+    if endpoint in CRITICO:
+        return 'critico'
+    if endpoint in MASIVO:
+        return 'masivo'
+    return 'normal'
+
+
+def consulta_cancelada(error):
+    return getattr(getattr(error, 'orig', None), 'pgcode', None) == PGCODE_CANCELADA
+
+
+def estadisticas():
+    """Ocupación y rechazos de cada carril en este proceso."""
+    with _lock:
+        return {
+            nombre: {
+                'max': max_,
+                'ocupados': max_ - semaforo._value,
+                'rechazadas': _contadores.get(nombre, {}).get('rechazadas', 0),
+                'canceladas': _contadores.get(nombre, {}).get('canceladas', 0),
+            }
+            for nombre, (semaforo, max_) in _carriles.items()
+        }
+
+
+def _contar(nombre, motivo):
+    with _lock:
+        contadores = _contadores.setdefault(nombre, {'rechazadas': 0, 'canceladas': 0})
+        contadores[motivo] += 1
+
+
+def saturado(nombre):
+    response = jsonify({'error': 'El servidor está ocupado, intenta de nuevo en unos segundos'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(RETRY_AFTER[nombre])
+    return response
+
+
+def tomar(nombre):
+    """Toma un lugar del carril esperando como mucho ``ESPERA[nombre]``.
+
+    Devuelve el semáforo que hay que liberar, None si el carril no tiene
+    límite o False si está lleno.
+    """
+    carril = _carriles.get(nombre)
+    if carril is None:
+        return None
+    espera = ESPERA[nombre]
+    tomado = carril[0].acquire(timeout=espera) if espera else carril[0].acquire(blocking=False)
+    if not tomado:
+        _contar(nombre, 'rechazadas')
+        return False
+    return carril[0]
+
+
+def liberar():
+    """Devuelve antes de terminar el lugar que ocupa la petición actual en su carril.
+
+    Para esperas largas que no hacen trabajo (long-poll de la cola de
+    inscripciones): sin esto, cada espera ocupa un lugar del carril hasta
+    ``INSCRIPCION_ESPERA_MAX`` segundos y unas cuantas bastan para llenarlo.
+    """
+    semaforo = g.pop('carril', None)
+    if semaforo is not None:
+        semaforo.release()
+
+
+def _after_begin(session, transaction, connection):
+    if not has_request_context():
+        return
+    timeout = g.get('carril_timeout_ms')
+    if timeout and connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql(f'SET LOCAL statement_timeout = {int(timeout)}')
+
+
+def init_carriles(app):
+    if not app.config.get('CARRILES_HABILITADOS', True):
+        return
+    for nombre in ESPERA:
+        max_ = app.config.get(f'CARRIL_{nombre.upper()}_MAX', 0)
+        if max_ > 0:
+            _carriles[nombre] = (threading.BoundedSemaphore(max_), max_)
+    if not event.contains(db.session, 'after_begin', _after_begin):
+        event.listen(db.session, 'after_begin', _after_begin)
+
+    @app.before_request
+    def _entrar_carril():
+        nombre = clase(request.endpoint)
+        g.carril_timeout_ms = app.config.get(f'CARRIL_{nombre.upper()}_TIMEOUT_MS', 0)
+        semaforo = tomar(nombre)
+        if semaforo is False:
+            logger.warning('Carril %s saturado: %s rechazada', nombre, request.endpoint)
+            return saturado(nombre)
+        if semaforo is not None:
+            g.carril = semaforo
+        return None
+
+    @app.teardown_request
+    def _salir_carril(exc):
+        # Con respuestas en streaming esto corre al terminar de enviar el cuerpo
+        semaforo = g.pop('carril', None)
+        if semaforo is not None:
+            semaforo.release()
+
+    @app.errorhandler(OperationalError)
+    def _consulta_cancelada(e):
+        db.session.rollback()
+        if consulta_cancelada(e):
+            logger.warning('statement_timeout en %s', request.endpoint)
+            _contar(clase(request.endpoint), 'canceladas')
+            return saturado(clase(request.endpoint))
+        current_app.log_exception((type(e), e, e.__traceback__))
+        return jsonify({'error': 'Error interno del servidor'}), 500
@@ -0,0 +1,162 @@
+"""Catálogos de referencia servidos desde la caché en proceso (app/cache.py)
+y helpers de paginación compartidos por los listados."""
+from math import ceil
+
+from app import db, serializers
+from app.cache import cacheado
+from app.models import Carrera, SocioFormador, Servicio, PreRegistro
+
+
+class CamposInvalidos(ValueError):
+    """``?fields=`` con campos que el recurso no tiene."""
+
+
+@cacheado('carreras', 'carreras')
+def carreras():
+    return [
+        {'id': c.id, 'nombre': c.nombre, 'abreviatura': c.abreviatura}
+        for c in db.session.execute(
+            db.select(Carrera.id, Carrera.nombre, Carrera.abreviatura).order_by(Carrera.nombre)
+        )
+    ]
+
+
+@cacheado('socios', 'socios_formadores')
+def socios():
+    return [
+        {'id': s.id, 'nombre': s.nombre}
+        for s in db.session.execute(db.select(SocioFormador.id, SocioFormador.nombre).order_by(SocioFormador.nombre))
+    ]
+
+
+@cacheado('periodos', 'servicios')
+def periodos():
+    """Periodos con al menos un servicio."""
+    return list(db.session.scalars(db.select(Servicio.periodo).distinct().order_by(Servicio.periodo)))
+
+
+@cacheado('periodos_con_preregistros', 'preregistros')
+def periodos_con_preregistros():
+    return list(db.session.scalars(db.select(PreRegistro.periodo).distinct().order_by(PreRegistro.periodo)))
+
+
+def paginar_lista(items, page=1, per_page=20, max_per_page=None):
+    """Paginación en memoria con la misma respuesta que ``paginate_query``.
+    Como ``paginate()``, no limita ``per_page`` salvo que se pase ``max_per_page``."""
+    page = max(1, int(page))
+    per_page = per_page if per_page >= 1 else 20
+    if max_per_page:
+        per_page = min(per_page, max_per_page)
+    total = len(items)
+    inicio = (page - 1) * per_page
+    return items[inicio:inicio + per_page], {
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': ceil(total / per_page) if total else 0,
+    }
+
+
+def paginar_select(stmt, page=1, per_page=20, max_per_page=None):
+    """Pagina un ``select()`` de columnas y devuelve filas ligeras (``Row``) en vez
+    de entidades del ORM. La respuesta de paginación es la de ``paginate_query``,
+    también sin tope de ``per_page`` salvo ``max_per_page``."""
+    page = max(1, int(page))
+    per_page = per_page if per_page >= 1 else 20
+    if max_per_page:
+        per_page = min(per_page, max_per_page)
+    total = db.session.execute(
+        db.select(db.func.count()).select_from(stmt.order_by(None).subquery())
+    ).scalar()
+    filas = db.session.execute(stmt.limit(per_page).offset((page - 1) * per_page)).all()
+    return filas, {
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': ceil(total / per_page) if total else 0,
+    }
+
+
+def campos_pedidos(texto, disponibles):
+    """Campos de ``?fields=a,b`` en el orden de ``disponibles``; None si no se pidió ninguno."""
+    pedidos = {c.strip() for c in (texto or '').split(',') if c.strip()}
+    if not pedidos:
+        return None
+    desconocidos = pedidos - set(disponibles)
+    if desconocidos:
+        raise CamposInvalidos(f'Campos desconocidos: {", ".join(sorted(desconocidos))}. '
+                           f'Disponibles: {", ".join(disponibles)}')
+    return [c for c in disponibles if c in pedidos]
+
+
+def seleccionar(base, columnas, campos, joins, necesarios=()):
+    """``select()`` de solo las columnas de ``campos`` y los joins que usan.
+
+    ``columnas`` es ``campo -> (expresión, joins que necesita)``; ``joins`` es
+    la lista ordenada de ``(nombre, entidad, condición, outer)`` y
+    ``necesarios`` los joins que piden los filtros. Quitar un join interno
+    solo es válido si su llave foránea es NOT NULL.
+    """
+    usados = set(necesarios)
+    for campo in campos:
+        usados.update(columnas[campo][1])
+    stmt = db.select(*(columnas[c][0] for c in campos)).select_from(base)
+    for nombre, entidad, condicion, outer in joins:
+        if nombre in usados:
+            stmt = stmt.join(entidad, condicion, isouter=outer)
+    return stmt
+
+
+_COLUMNAS_SERVICIO = {
+    'id': (Servicio.id, ()),
+    'descripcion': (Servicio.descripcion, ()),
+    'crn': (Servicio.crn, ()),
+    'periodo': (Servicio.periodo, ()),
+    'cupo_maximo': (Servicio.cupo_maximo, ()),
+    'socio_formador_id': (Servicio.socio_formador_id, ()),
+    'socio_formador_nombre': (SocioFormador.nombre.label('socio_formador_nombre'), ('socio',)),
+}
+_JOINS_SERVICIO = [('socio', SocioFormador, SocioFormador.id == Servicio.socio_formador_id, True)]
+
+
+def pagina_servicios(page=1, per_page=20, q='', campos=None):
+    """Página del listado de servicios: ``(data, pagination)``.
+
+    Con todos los campos son tres queries por página (conteo, filas e inscritos
+    agrupados). Con ``campos``, el join con el socio y el conteo de inscritos
+    solo se hacen si se piden.
+    """
+    completo = campos is None
+    campos = list(serializers.CAMPOS_SERVICIO) if completo else campos
+    columnas = [c for c in campos if c != 'inscritos']
+    con_inscritos = 'inscritos' in campos
+    if con_inscritos and 'id' not in columnas:
+        columnas.insert(0, 'id')
+    stmt = seleccionar(Servicio, _COLUMNAS_SERVICIO, columnas, _JOINS_SERVICIO)\
+        .order_by(Servicio.periodo.desc(), Servicio.descripcion)
+    if q:
+        stmt = stmt.where(
+            db.or_(
+                Servicio.descripcion.ilike(f'%{q}%'),
+                Servicio.crn.ilike(f'%{q}%'),
+                Servicio.periodo.ilike(f'%{q}%'),
+            )
+        )
+
+    filas, pagination = paginar_select(stmt, page, per_page)
+    inscritos = dict(db.session.execute(
+        db.select(PreRegistro.servicio_id, db.func.count(PreRegistro.id))
+        .where(PreRegistro.servicio_id.in_([s.id for s in filas]))
+        .group_by(PreRegistro.servicio_id)
+    ).all()) if filas and con_inscritos else {}
+    if completo:
+        return [serializers.servicio(s, inscritos.get(s.id, 0)) for s in filas], pagination
+
+    sin_inscritos = [c for c in campos if c != 'inscritos']
+    data = []
+    for s in filas:
+        fila = serializers.proyectar(s, sin_inscritos, serializers.CAMPOS_SERVICIO)
+        if con_inscritos:
+            fila['inscritos'] = inscritos.get(s.id, 0)
+        data.append(fila)
+    return data, pagination
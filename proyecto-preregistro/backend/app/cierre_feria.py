@@ -0,0 +1,80 @@
+"""Transiciones de estatus de asistencias en bloque.
+
+Al final de la feria ``cerrar`` marca como ``asistió`` (con ``hora_salida``)
+a todos los que siguen ``dentro`` y como ``no_asistió`` a los ``pendiente``
+de un periodo o evento. ``validar_lote`` aplica un mismo estatus a una lista
+de ids. Ambas trabajan con UPDATEs por lotes de ``lote`` filas, cada uno en
+su propia transacción: los locks duran poco y un cierre interrumpido se
+puede volver a ejecutar sin efectos dobles (solo toca filas en el estatus
+de origen).
+"""
+from datetime import datetime
+
+from app import db
+from app.models import AsistenciaFeria
+
+LOTE = 1000
+ESTATUS = ('pendiente', 'dentro', 'asistió', 'no_asistió')
+MAX_IDS = 10000
+
+
+def _valores(estatus, ahora):
+    """Columnas que cambian con cada estatus (mismo criterio que validar_asistencia)."""
+    valores = {AsistenciaFeria.estatus_asistencia: estatus}
+    if estatus == 'dentro':
+        valores[AsistenciaFeria.hora_real_asistencia] = ahora.time()
+    elif estatus == 'asistió':
+        valores[AsistenciaFeria.hora_salida] = ahora
+    return valores
+
+
+def _actualizar_en_lotes(condicion, valores, lote, log):
+    total = 0
+    while True:
+        ids = list(db.session.scalars(
+            db.select(AsistenciaFeria.id).where(condicion).order_by(AsistenciaFeria.id).limit(lote)
+        ))
+        if not ids:
+            return total
+        # rowcount y no len(ids): las filas que cambiaron de estatus desde el SELECT no se tocan
+        total += AsistenciaFeria.query.filter(AsistenciaFeria.id.in_(ids), condicion)\
+            .update(valores, synchronize_session=False)
+        db.session.commit()
+        log(f'  {valores[AsistenciaFeria.estatus_asistencia]}: {total}')
+
+
+def cerrar(periodo=None, evento_id=None, lote=LOTE, log=lambda *_: None):
+    """Cierra las asistencias abiertas del periodo o del evento. Devuelve los conteos."""
+    if not periodo and evento_id is None:
+        raise RuntimeError('Indica el periodo o el evento a cerrar')
+    alcance = AsistenciaFeria.evento_feria_id == evento_id if evento_id is not None \
+        else AsistenciaFeria.periodo == periodo
+    ahora = datetime.now()
+    return {
+        'asistio': _actualizar_en_lotes(
+            db.and_(alcance, AsistenciaFeria.estatus_asistencia == 'dentro'),
+            _valores('asistió', ahora), lote, log),
+        'no_asistio': _actualizar_en_lotes(
+            db.and_(alcance, AsistenciaFeria.estatus_asistencia == 'pendiente'),
+            _valores('no_asistió', ahora), lote, log),
+    }
+
+
+def validar_lote(ids, estatus, lote=LOTE):
+    """Aplica ``estatus`` a las asistencias ``ids``. Devuelve actualizados y no encontrados."""
+    if estatus not in ESTATUS:
+        raise RuntimeError('Estatus inválido')
+    # Sin coerción: 1.9 o true no deben terminar cambiando la asistencia 1
+    if any(isinstance(i, bool) or not isinstance(i, int) for i in ids):
+        raise RuntimeError('ids debe contener solo números enteros')
+    ids = sorted(set(ids))
+    if len(ids) > MAX_IDS:
+        raise RuntimeError(f'Máximo {MAX_IDS} ids por petición')
+    valores = _valores(estatus, datetime.now())
+    actualizados = 0
+    for i in range(0, len(ids), lote):
+        parte = ids[i:i + lote]
+        actualizados += AsistenciaFeria.query.filter(AsistenciaFeria.id.in_(parte))\
+            .update(valores, synchronize_session=False)
+        db.session.commit()
+    return {'actualizados': actualizados, 'no_encontrados': len(ids) - actualizados}
@@ -0,0 +1,260 @@
+"""Comandos ``flask`` para datos sintéticos y benchmarks.
+
+Uso (desde ``backend/``, con ``FLASK_APP=run.py``)::
+
+    flask seed-data --estudiantes 20000 --servicios 1000 --preregistros 100000
+    flask benchmark --guardar-baseline bench/baseline.json
+    flask benchmark --baseline bench/baseline.json --umbral 0.2
+    flask stress-inscripciones --intentos 500 --hilos 50 --crns 3
+    flask stress-inscripciones --modo cola
+    flask planes --guardar bench/planes.json
+    flask planes --comparar bench/planes.json
+    flask benchmark-json --filas 10000
+    flask benchmark-proyecciones --limite 100000
+    flask benchmark-consultas --repeticiones 2000
+    flask benchmark-asignacion --estudiantes 30000 --servicios 1000
+    flask asignar-periodo 2026-1 --simular
+    flask archivar-periodo 2023-1
+    flask restaurar-periodo 2023-1
+    flask recalcular-horarios 2026-1
+    flask cerrar-feria --periodo 2026-1
+    flask mantenimiento purgar_tokens_reset
+"""
+import json
+import os
+import sys
+
+import click
+from flask import current_app
+
+from app import db, seeder, benchmark, stress, planes, archivo, asignacion, horarios, cierre_feria, mantenimiento
+
+
+def register_cli(app):
+    @app.cli.command('seed-data')
+    @click.option('--estudiantes', default=20000, show_default=True)
+    @click.option('--servicios', default=1000, show_default=True)
+    @click.option('--periodos', default=6, show_default=True)
+    @click.option('--preregistros', default=100000, show_default=True)
+    @click.option('--asistencias', default=100000, show_default=True)
+    @click.option('--socios', default=50, show_default=True)
+    @click.option('--semilla', default=42, show_default=True, help='Semilla para datos reproducibles')
+    @click.option('--limpiar', is_flag=True, help='Eliminar datos de benchmark previos antes de sembrar')
+    def seed_data(estudiantes, servicios, periodos, preregistros, asistencias, socios, semilla, limpiar):
+        """Inserta datos sintéticos (prefijo 'bench') en volumen realista."""
+        if seeder.hay_datos_bench():
+            if not limpiar:
+                raise click.ClickException('Ya existen datos de benchmark; usa --limpiar para regenerarlos')
+            click.echo('Eliminando datos de benchmark previos...')
+            seeder.limpiar()
+        resumen = seeder.sembrar(
+            estudiantes=estudiantes, servicios=servicios, periodos=periodos,
+            preregistros=preregistros, asistencias=asistencias, socios=socios,
+            semilla=semilla, log=click.echo,
+        )
+        click.echo(f"Listo. Periodos: {', '.join(resumen['periodos'])}")
+
+    @app.cli.command('seed-clean')
+    def seed_clean():
+        """Elimina los datos sintéticos generados por seed-data."""
+        seeder.limpiar()
+        click.echo('Datos de benchmark eliminados')
+
+    @app.cli.command('benchmark')
+    @click.option('--escenario', 'escenarios', multiple=True, help='Limitar a ciertos escenarios')
+    @click.option('--factor', default=1.0, show_default=True, help='Multiplica las iteraciones')
+    @click.option('--salida', type=click.Path(dir_okay=False), help='Guardar resultados en JSON')
+    @click.option('--baseline', type=click.Path(exists=True, dir_okay=False), help='Comparar contra baseline')
+    @click.option('--guardar-baseline', type=click.Path(dir_okay=False), help='Guardar resultados como baseline')
+    @click.option('--umbral', default=0.20, show_default=True, help='Regresión tolerada en p95 (0.2 = 20%)')
+    def run_benchmark(escenarios, factor, salida, baseline, guardar_baseline, umbral):
+        """Mide p50/p95/p99 y queries por petición de los endpoints clave."""
+        resultados = benchmark.ejecutar(current_app._get_current_object(), solo=escenarios,
+                                        factor=factor, log=click.echo)
+        for path in (salida, guardar_baseline):
+            if path:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                benchmark.guardar_json(path, resultados)
+                click.echo(f'Resultados guardados en {path}')
+
+        if baseline:
+            regresiones = benchmark.comparar(resultados, benchmark.cargar_json(baseline), umbral)
+            if regresiones:
+                click.echo('REGRESIONES:', err=True)
+                for r in regresiones:
+                    click.echo(f'  - {r}', err=True)
+                sys.exit(1)
+            click.echo('Sin regresiones contra el baseline')
+
+    @app.cli.command('benchmark-json')
+    @click.option('--filas', default=10000, show_default=True)
+    @click.option('--repeticiones', default=20, show_default=True)
+    @click.option('--salida', type=click.Path(dir_okay=False), help='Guardar resultados en JSON')
+    def run_benchmark_json(filas, repeticiones, salida):
+        """Compara proveedores JSON y serializadores sobre una lista grande."""
+        resultados = benchmark.medir_serializacion(current_app._get_current_object(), filas=filas,
+                                                   repeticiones=repeticiones, log=click.echo)
+        if salida:
+            os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+            benchmark.guardar_json(salida, resultados)
+            click.echo(f'Resultados guardados en {salida}')
+
+    @app.cli.command('benchmark-proyecciones')
+    @click.option('--limite', default=100000, show_default=True, help='Filas de pre-registros a leer')
+    @click.option('--repeticiones', default=3, show_default=True)
+    def run_benchmark_proyecciones(limite, repeticiones):
+        """CPU y memoria por fila: entidades del ORM contra select() de columnas."""
+        benchmark.medir_proyecciones(limite=limite, repeticiones=repeticiones, log=click.echo)
+
+    @app.cli.command('benchmark-consultas')
+    @click.option('--repeticiones', default=2000, show_default=True)
+    def run_benchmark_consultas(repeticiones):
+        """CPU por llamada de login, role_required, check-in e inscripción: Model.query contra sentencias precompiladas."""
+        try:
+            benchmark.medir_consultas(repeticiones=repeticiones, log=click.echo)
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+
+    @app.cli.command('stress-inscripciones')
+    @click.option('--intentos', default=500, show_default=True)
+    @click.option('--hilos', default=50, show_default=True)
+    @click.option('--crns', 'num_crns', default=3, show_default=True, help='Número de CRNs calientes')
+    @click.option('--lugares', default=25, show_default=True, help='Lugares libres por CRN durante la prueba')
+    @click.option('--periodo', default=None, help='Periodo a usar (default: el más reciente de benchmark)')
+    @click.option('--semilla', default=7, show_default=True)
+    @click.option('--conservar', is_flag=True, help='No borrar las inscripciones creadas ni restaurar cupos')
+    @click.option('--modo', type=click.Choice(['directo', 'cola']), default='directo', show_default=True,
+                  help='Modo de inscripción (INSCRIPCION_MODO) a probar')
+    def stress_inscripciones(intentos, hilos, num_crns, lugares, periodo, semilla, conservar, modo):
+        """Inscripciones concurrentes contra PostgreSQL y verificación de invariantes."""
+        try:
+            reporte = stress.ejecutar(intentos=intentos, hilos=hilos, num_crns=num_crns, lugares=lugares,
+                                      periodo=periodo, semilla=semilla, conservar=conservar, modo=modo,
+                                      log=click.echo)
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+
+        click.echo(f"{reporte['intentos']} intentos en {reporte['duracion_s']} s "
+                   f"({reporte['throughput_rps']} req/s)")
+        click.echo(f"latencia p50={reporte['p50_ms']} p95={reporte['p95_ms']} p99={reporte['p99_ms']} ms")
+        click.echo(f"status: {reporte['status']}")
+        click.echo(f"locks: {reporte['locks']}  deadlocks: {reporte['deadlocks']}")
+        if reporte['violaciones']:
+            click.echo(f"VIOLACIONES DE INVARIANTES ({len(reporte['violaciones'])}):", err=True)
+            for v in reporte['violaciones']:
+                click.echo(f'  - {v}', err=True)
+            sys.exit(1)
+        click.echo('Invariantes OK')
+
+    @app.cli.command('planes')
+    @click.option('--guardar', type=click.Path(dir_okay=False), help='Guardar el snapshot de planes')
+    @click.option('--comparar', type=click.Path(exists=True, dir_okay=False), help='Comparar contra un snapshot')
+    @click.option('--min-filas', default=10000, show_default=True,
+                  help='Tamaño mínimo de tabla para marcar un Seq Scan como regresión')
+    @click.option('--verbose', is_flag=True, help='Mostrar también los avisos')
+    def planes_snapshot(guardar, comparar, min_filas, verbose):
+        """Captura EXPLAIN (FORMAT JSON) de las queries de los endpoints clave."""
+        try:
+            actual = planes.capturar(current_app._get_current_object(), log=click.echo)
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        if guardar:
+            os.makedirs(os.path.dirname(os.path.abspath(guardar)), exist_ok=True)
+            benchmark.guardar_json(guardar, actual)
+            click.echo(f'Snapshot guardado en {guardar}')
+
+        if comparar:
+            regresiones, avisos = planes.comparar(actual, benchmark.cargar_json(comparar),
+                                                  planes.tamanos_tablas(), min_filas)
+            if verbose or not regresiones:
+                for a in avisos:
+                    click.echo(f'  aviso: {a}')
+            if regresiones:
+                click.echo('REGRESIONES DE PLAN:', err=True)
+                for r in regresiones:
+                    click.echo(f'  - {r}', err=True)
+                sys.exit(1)
+            click.echo(f'Sin regresiones de plan ({len(avisos)} avisos)')
+
+    @app.cli.command('archivar-periodo')
+    @click.argument('periodo')
+    @click.option('--lote', default=archivo.LOTE_BORRADO, show_default=True, help='Filas por transacción de borrado')
+    def archivar_periodo(periodo, lote):
+        """Exporta un periodo cerrado a ARCHIVO_DIR y borra sus filas."""
+        try:
+            meta = archivo.archivar(periodo, lote=lote, log=click.echo)
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Periodo {periodo} archivado en {meta['archivo']}")
+
+    @app.cli.command('restaurar-periodo')
+    @click.argument('periodo')
+    def restaurar_periodo(periodo):
+        """Reinserta en la base un periodo archivado."""
+        try:
+            resultado = archivo.restaurar(periodo, log=click.echo)
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Periodo {periodo} restaurado (omitidos: {resultado['omitidos']})")
+
+    @app.cli.command('asignar-periodo')
+    @click.argument('periodo')
+    @click.option('--semilla', type=int, default=None, help='Semilla del sorteo (default: aleatoria)')
+    @click.option('--simular', is_flag=True, help='Calcular la asignación sin escribir nada')
+    def asignar_periodo(periodo, semilla, simular):
+        """Ejecuta la asignación por preferencias de un periodo."""
+        try:
+            resumen = asignacion.ejecutar(periodo, semilla=semilla, simular=simular)
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        click.echo(json.dumps(resumen, indent=2, ensure_ascii=False))
+
+    @app.cli.command('benchmark-asignacion')
+    @click.option('--estudiantes', default=30000, show_default=True)
+    @click.option('--servicios', default=1000, show_default=True)
+    @click.option('--preferencias', default=5, show_default=True, help='Preferencias por estudiante')
+    @click.option('--cupo', default=40, show_default=True, help='Lugares por servicio')
+    @click.option('--semilla', default=1, show_default=True)
+    @click.option('--repeticiones', default=5, show_default=True)
+    def run_benchmark_asignacion(estudiantes, servicios, preferencias, cupo, semilla, repeticiones):
+        """Mide el solver de asignación con datos sintéticos reproducibles."""
+        resumen = asignacion.benchmark(estudiantes, servicios, preferencias, cupo, semilla, repeticiones)
+        click.echo(json.dumps(resumen, indent=2, ensure_ascii=False))
+
+    @app.cli.command('recalcular-horarios')
+    @click.argument('periodo')
+    def recalcular_horarios(periodo):
+        """Liga asistencias a sus bloques de horario y recalcula los contadores de ocupación."""
+        ocupacion = horarios.recalcular(periodo)
+        db.session.commit()
+        if not ocupacion:
+            raise click.ClickException(f'El periodo {periodo} no tiene bloques de horario')
+        for nombre, ocupados in ocupacion.items():
+            click.echo(f'  {nombre}: {ocupados}')
+
+    @app.cli.command('cerrar-feria')
+    @click.option('--periodo', default=None, help='Periodo a cerrar')
+    @click.option('--evento', 'evento_id', type=int, default=None, help='Id del evento a cerrar')
+    @click.option('--lote', default=cierre_feria.LOTE, show_default=True, help='Filas por transacción')
+    def cerrar_feria(periodo, evento_id, lote):
+        """Marca dentro -> asistió y pendiente -> no_asistió en lotes."""
+        try:
+            resultado = cierre_feria.cerrar(periodo=periodo, evento_id=evento_id, lote=lote, log=click.echo)
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"asistió: {resultado['asistio']}, no_asistió: {resultado['no_asistio']}")
+
+    @app.cli.command('mantenimiento')
+    @click.argument('tareas', nargs=-1)
+    def ejecutar_mantenimiento(tareas):
+        """Ejecuta ahora las tareas de mantenimiento indicadas (todas si no se indica ninguna)."""
+        for nombre in tareas or mantenimiento.TAREAS:
+            try:
+                resultado = mantenimiento.ejecutar(nombre, forzar=True)
+            except RuntimeError as e:
+                raise click.ClickException(str(e))
+            if resultado is None:
+                click.echo(f'  {nombre}: omitida (lease tomado por otro proceso o falta la migración)')
+                continue
+            detalle = resultado['error'] or json.dumps(resultado['resultado'], ensure_ascii=False)
+            click.echo(f"  {nombre}: {resultado['estado']} en {resultado['duracion']}s {detalle}")
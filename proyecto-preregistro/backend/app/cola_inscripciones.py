@@ -0,0 +1,158 @@
+"""Cola de admisión para inscripciones (``INSCRIPCION_MODO=cola``).
+
+En la apertura del pre-registro muchas peticiones compiten por los mismos
+CRNs. En modo cola ``POST /api/preregistros`` solo guarda un ticket y responde
+``202``; un worker por CRN (un hilo por proceso, creado al llegar el primer
+ticket y terminado tras ``INSCRIPCION_WORKER_INACTIVO`` segundos sin trabajo)
+atiende los tickets en orden de llegada. En PostgreSQL cada ticket se procesa
+con ``pg_advisory_xact_lock`` sobre el CRN, así que aunque haya varios procesos
+solo uno inscribe en un CRN a la vez y siempre toma el ticket más antiguo.
+
+Los tickets viven en la tabla ``tickets_inscripcion``: si un proceso muere, sus
+tickets pendientes los atiende el siguiente worker de ese CRN.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.inscripciones import inscribir
+from app.models import TicketInscripcion
+
+logger = logging.getLogger(__name__)
+
+EN_COLA = 'en_cola'
+
+_lock = threading.Lock()
+_workers = {}   # crn -> threading.Thread
+_avisos = {}    # crn -> threading.Event
+_atendidos = threading.Condition()
+
+
+def _clave_lock(crn):
+    """Llave int64 para pg_advisory_xact_lock derivada del CRN."""
+    return int.from_bytes(hashlib.md5(f'inscripcion:{crn}'.encode()).digest()[:8], 'big', signed=True)
+
+
+def encolar(app, estudiante_id, crn):
+    ticket = TicketInscripcion(codigo=uuid.uuid4().hex, estudiante_id=estudiante_id, crn=crn, estado=EN_COLA)
+    db.session.add(ticket)
+    db.session.commit()
+    despertar(app, crn)
+    return ticket.codigo
+
+
+def despertar(app, crn):
+    """Avisa al worker del CRN, creándolo si este proceso no tiene uno."""
+    with _lock:
+        aviso = _avisos.setdefault(crn, threading.Event())
+        aviso.set()
+        if crn not in _workers:
+            hilo = threading.Thread(target=_worker, args=(app, crn, aviso),
+                                    name=f'cola-inscripciones-{crn}', daemon=True)
+            _workers[crn] = hilo
+            hilo.start()
+
+
+def _worker(app, crn, aviso):
+    inactivo = app.config.get('INSCRIPCION_WORKER_INACTIVO', 30)
+    with app.app_context():
+        try:
+            while True:
+                aviso.clear()
+                try:
+                    while _procesar_siguiente(crn):
+                        pass
+                except Exception:
+                    logger.exception('Error en la cola de inscripciones del CRN %s', crn)
+                    db.session.rollback()
+                    time.sleep(1)
+                    continue
+                if aviso.wait(inactivo):
+                    continue
+                with _lock:
+                    # Un ticket pudo llegar justo ahora: se revisa bajo el lock de despertar()
+                    if not aviso.is_set():
+                        _workers.pop(crn, None)
+                        _avisos.pop(crn, None)
+                        return
+        finally:
+            db.session.remove()
+
+
+def _procesar_siguiente(crn):
+    """Atiende el ticket más antiguo del CRN. Devuelve False si no había ninguno."""
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(db.text('SELECT pg_advisory_xact_lock(:k)'), {'k': _clave_lock(crn)})
+    ticket = TicketInscripcion.query.filter_by(crn=crn, estado=EN_COLA)\
+        .order_by(TicketInscripcion.id).first()
+    if ticket is None:
+        db.session.rollback()
+        return False
+
+    try:
+        with db.session.begin_nested():
+            cuerpo, status = inscribir(ticket.estudiante_id, crn)
+    except IntegrityError:
+        cuerpo, status = {'error': 'El estudiante ya está inscrito en este servicio'}, 409
+
+    ticket.estado = 'completado' if status == 201 else 'rechazado'
+    ticket.status_code = status
+    ticket.resultado = json.dumps(cuerpo, ensure_ascii=False)
+    ticket.atendido = datetime.utcnow()
+    db.session.commit()
+    with _atendidos:
+        _atendidos.notify_all()
+    return True
+
+
+def estado(codigo):
+    ticket = TicketInscripcion.query.filter_by(codigo=codigo).first()
+    if ticket is None:
+        return None
+    info = {
+        'ticket': ticket.codigo,
+        'crn': ticket.crn,
+        'estudiante_id': ticket.estudiante_id,
+        'estado': ticket.estado,
+        'creado': ticket.creado.isoformat(),
+    }
+    if ticket.estado == EN_COLA:
+        info['posicion'] = TicketInscripcion.query.filter(
+            TicketInscripcion.crn == ticket.crn,
+            TicketInscripcion.estado == EN_COLA,
+            TicketInscripcion.id < ticket.id,
+        ).count() + 1
+    else:
+        info['status_code'] = ticket.status_code
+        info['resultado'] = json.loads(ticket.resultado)
+        info['atendido'] = ticket.atendido.isoformat() if ticket.atendido else None
+    return info
+
+
+def esperar(app, codigo, segundos):
+    """Long-poll: devuelve el estado del ticket cuando deja de estar en cola o al
+    vencer ``segundos``. Los tickets atendidos en otro proceso se detectan
+    releyendo la tabla cada medio segundo."""
+    limite = time.monotonic() + max(0, segundos)
+    despertado = False
+    while True:
+        info = estado(codigo)
+        # Terminar la transacción: libera la conexión durante la espera y la
+        # siguiente lectura ve los commits de otros workers.
+        db.session.rollback()
+        restante = limite - time.monotonic()
+        if info is None or info['estado'] != EN_COLA or restante <= 0:
+            return info
+        if not despertado:
+            # Si el proceso que recibió el ticket murió, este proceso lo atiende
+            despertar(app, info['crn'])
+            despertado = True
+        with _atendidos:
+            _atendidos.wait(min(0.5, restante))
@@ -0,0 +1,112 @@
+"""Sentencias precompiladas de las rutas más llamadas.
+
+Login, ``role_required``, check-in e inscripción armaban sus consultas con
+``Model.query.filter_by(...)`` en cada petición: construir el Query, generar
+la llave de caché y cargar entidades en el identity map cuesta más CPU que la
+consulta misma. Aquí cada consulta es un ``select()`` de columnas armado una
+sola vez al importar el módulo, con ``bindparam`` para los valores.
+
+En PostgreSQL, con ``CONSULTAS_PREPARADAS`` (default), la primera ejecución
+en cada conexión hace ``PREPARE`` y las siguientes solo ``EXECUTE``. Así el
+servidor tampoco vuelve a parsear ni planear la consulta. Los nombres
+preparados se guardan en ``Connection.info``, que vive lo mismo que la
+conexión del pool. Detrás de pgbouncer en modo ``transaction`` hay que
+desactivarlo, porque cada transacción puede caer en otra conexión del
+servidor.
+
+Las escrituras (UPDATE/INSERT) siguen pasando por ``session.execute`` para
+que ``versiones``, ``cambios`` y los ``onupdate`` del ORM las vean.
+"""
+from flask import current_app
+from sqlalchemy.dialects import postgresql
+
+from app import db
+from app.models import Usuario, Estudiante, Servicio, PreRegistro, AsistenciaFeria, EventoFeria, VentanaAsignacion
+
+_DIALECTO_PREPARE = postgresql.psycopg2.dialect(paramstyle='numeric_dollar')
+
+
+class Consulta:
+    def __init__(self, nombre, stmt):
+        self.nombre = nombre
+        self.stmt = stmt
+        compilada = stmt.compile(dialect=_DIALECTO_PREPARE)
+        self._sql_prepare = f'PREPARE {nombre} AS {compilada.string}'
+        self._orden = compilada.positiontup
+        self._fijos = {k: v for k, v in compilada.params.items() if v is not None}
+        self._sql_execute = f"EXECUTE {nombre}({', '.join(f'%({p})s' for p in self._orden)})"
+
+    def ejecutar(self, **params):
+        """Ejecuta con la sesión actual (misma transacción) y devuelve el Result."""
+        conn = db.session.connection()
+        if conn.dialect.name != 'postgresql' or not current_app.config.get('CONSULTAS_PREPARADAS', True):
+            return conn.execute(self.stmt, params)
+        preparadas = conn.info.setdefault('consultas_preparadas', set())
+        if self.nombre not in preparadas:
+            conn.exec_driver_sql(self._sql_prepare)
+            preparadas.add(self.nombre)
+        return conn.exec_driver_sql(self._sql_execute, {**self._fijos, **params})
+
+
+_USUARIO = (Usuario.id, Usuario.username, Usuario.password_hash, Usuario.rol,
+            Estudiante.id.label('estudiante_id'), Estudiante.nombre_completo)
+
+USUARIO_POR_USERNAME = Consulta('q_usuario_por_username', db.select(*_USUARIO)
+    .outerjoin(Estudiante, Estudiante.usuario_id == Usuario.id)
+    .where(Usuario.username == db.bindparam('username')).limit(1))
+
+USUARIO_POR_MATRICULA = Consulta('q_usuario_por_matricula', db.select(*_USUARIO)
+    .join(Estudiante, Estudiante.usuario_id == Usuario.id)
+    .where(db.func.lower(Estudiante.matricula) == db.bindparam('matricula')).limit(1))
+
+ROL_USUARIO = Consulta('q_rol_usuario', db.select(Usuario.rol)
+    .where(Usuario.id == db.bindparam('usuario_id')))
+
+ESTATUS_EVENTO = Consulta('q_estatus_evento', db.select(EventoFeria.estatus)
+    .where(EventoFeria.id == db.bindparam('evento_id')))
+
+ESTUDIANTE_POR_MATRICULA = Consulta('q_estudiante_por_matricula',
+    db.select(Estudiante.id, Estudiante.nombre_completo, Estudiante.matricula)
+    .where(Estudiante.matricula == db.bindparam('matricula')))
+
+_ASISTENCIA = (AsistenciaFeria.id, AsistenciaFeria.estatus_asistencia, AsistenciaFeria.horario_seleccionado)
+
+ASISTENCIA_DE_ESTUDIANTE = Consulta('q_asistencia_de_estudiante', db.select(*_ASISTENCIA)
+    .where(AsistenciaFeria.estudiante_id == db.bindparam('estudiante_id')).limit(1))
+
+ASISTENCIA_DE_ESTUDIANTE_EN_EVENTO = Consulta('q_asistencia_de_estudiante_evento', db.select(*_ASISTENCIA)
+    .where(AsistenciaFeria.evento_feria_id == db.bindparam('evento_id'),
+           AsistenciaFeria.estudiante_id == db.bindparam('estudiante_id')).limit(1))
+
+EXISTE_ESTUDIANTE = Consulta('q_existe_estudiante', db.select(Estudiante.id)
+    .where(Estudiante.id == db.bindparam('estudiante_id')))
+
+SERVICIO_POR_CRN = Consulta('q_servicio_por_crn',
+    db.select(Servicio.id, Servicio.periodo, Servicio.cupo_maximo)
+    .where(Servicio.crn == db.bindparam('crn')).limit(1))
+
+VENTANA_ABIERTA = Consulta('q_ventana_abierta', db.select(VentanaAsignacion.id)
+    .where(VentanaAsignacion.periodo == db.bindparam('periodo'), VentanaAsignacion.estado == 'abierta').limit(1))
+
+TIENE_ASISTENCIA = Consulta('q_tiene_asistencia', db.select(AsistenciaFeria.id)
+    .where(AsistenciaFeria.estudiante_id == db.bindparam('estudiante_id')).limit(1))
+
+INSCRITOS_SERVICIO = Consulta('q_inscritos_servicio', db.select(db.func.count(PreRegistro.id))
+    .where(PreRegistro.servicio_id == db.bindparam('servicio_id')))
+
+INSCRIPCION_EXISTENTE = Consulta('q_inscripcion_existente', db.select(PreRegistro.id)
+    .where(PreRegistro.estudiante_id == db.bindparam('estudiante_id'),
+           PreRegistro.servicio_id == db.bindparam('servicio_id')).limit(1))
+
+INSCRIPCION_EN_PERIODO = Consulta('q_inscripcion_en_periodo', db.select(PreRegistro.id)
+    .where(PreRegistro.estudiante_id == db.bindparam('estudiante_id'),
+           PreRegistro.periodo == db.bindparam('periodo')).limit(1))
+
+# Escrituras: ORM-enabled para que pasen por do_orm_execute y apliquen onupdate
+MARCAR_DENTRO = db.update(AsistenciaFeria).where(
+    AsistenciaFeria.id == db.bindparam('asistencia_id'),
+    db.func.coalesce(AsistenciaFeria.estatus_asistencia, 'pendiente').notin_(('dentro', 'asistió', 'no_asistió')),
+).values(estatus_asistencia='dentro', hora_real_asistencia=db.bindparam('hora'))\
+    .execution_options(synchronize_session=False)
+
+INSERTAR_PREREGISTRO = db.insert(PreRegistro).returning(PreRegistro.id)
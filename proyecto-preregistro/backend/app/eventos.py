@@ -0,0 +1,39 @@
+"""Eventos de feria (``eventos_feria``).
+
+Cada asistencia puede pertenecer a un evento. Las consultas acotadas por
+evento usan los índices ``(evento_feria_id, estatus_asistencia)`` y
+``(evento_feria_id, estudiante_id)``, así que una feria en curso no recorre
+las filas de ferias pasadas o simultáneas. Las asistencias sin evento (datos
+anteriores a esta tabla) siguen funcionando con las consultas globales.
+"""
+from app import db
+from app.models import EventoFeria, AsistenciaFeria
+
+ESTATUS = ('activo', 'cerrado')
+
+
+def evento_activo(periodo):
+    """El evento activo del periodo si hay exactamente uno; si no, None."""
+    if not periodo:
+        return None
+    activos = EventoFeria.query.filter_by(periodo=periodo, estatus='activo').limit(2).all()
+    return activos[0] if len(activos) == 1 else None
+
+
+def conteos(evento_id):
+    """``{estatus: total}`` de las asistencias del evento (un solo GROUP BY por índice)."""
+    return dict(db.session.execute(
+        db.select(AsistenciaFeria.estatus_asistencia, db.func.count())
+        .where(AsistenciaFeria.evento_feria_id == evento_id)
+        .group_by(AsistenciaFeria.estatus_asistencia)
+    ).all())
+
+
+def resumen(evento_id):
+    por_estatus = conteos(evento_id)
+    return {
+        'total_registrados': sum(por_estatus.values()),
+        'dentro_ahora': por_estatus.get('dentro', 0),
+        'total_asistieron': por_estatus.get('dentro', 0) + por_estatus.get('asistió', 0),
+        'por_estatus': por_estatus,
+    }
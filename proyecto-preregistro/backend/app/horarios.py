@@ -0,0 +1,132 @@
+"""Bloques de horario de la feria con cupo por bloque.
+
+Cuando un periodo tiene bloques en ``horarios_feria``, el registro de
+asistencia reserva un lugar con un UPDATE condicional sobre el contador
+``ocupados`` (``... SET ocupados = ocupados + 1 WHERE ocupados < capacidad``):
+no hay lectura previa, así que dos registros simultáneos no pueden exceder el
+cupo, y el lock de la fila dura solo hasta el commit del registro. Si el
+bloque está lleno se sugieren los bloques con menor carga, para repartir las
+llegadas en vez de saturar una hora en la puerta.
+
+Los periodos sin bloques siguen aceptando ``horario_seleccionado`` como texto
+libre, igual que antes.
+"""
+from datetime import datetime, time
+
+from app import db
+from app.models import HorarioFeria, AsistenciaFeria
+
+MAX_SUGERENCIAS = 3
+
+
+def parsear_etiqueta(etiqueta):
+    """``"11:00 - 12:00"`` -> ``(time(11, 0), time(12, 0))``; ValueError si no se puede."""
+    inicio, fin = (parte.strip() for parte in etiqueta.split('-', 1))
+    return (datetime.strptime(inicio, '%H:%M').time(), datetime.strptime(fin, '%H:%M').time())
+
+
+def etiqueta(hora_inicio, hora_fin):
+    return f'{hora_inicio:%H:%M} - {hora_fin:%H:%M}'
+
+
+def tiene_horarios(periodo):
+    if not periodo:
+        return False
+    return db.session.query(HorarioFeria.id).filter_by(periodo=periodo).first() is not None
+
+
+def buscar(periodo, horario_id=None, etiqueta=None):
+    """Bloque del periodo por id o por etiqueta."""
+    consulta = HorarioFeria.query.filter_by(periodo=periodo)
+    if horario_id is not None:
+        return consulta.filter_by(id=horario_id).first()
+    if etiqueta:
+        return consulta.filter_by(etiqueta=etiqueta.strip()).first()
+    return None
+
+
+def reservar(horario_id):
+    """Ocupa un lugar del bloque dentro de la transacción actual. False si está lleno."""
+    tabla = HorarioFeria.__table__
+    resultado = db.session.execute(
+        tabla.update()
+        .where(tabla.c.id == horario_id, tabla.c.ocupados < tabla.c.capacidad)
+        .values(ocupados=tabla.c.ocupados + 1)
+    )
+    return resultado.rowcount == 1
+
+
+def liberar(horario_id, cantidad=1):
+    if horario_id is None or cantidad <= 0:
+        return
+    tabla = HorarioFeria.__table__
+    db.session.execute(
+        tabla.update()
+        .where(tabla.c.id == horario_id)
+        .values(ocupados=db.case((tabla.c.ocupados > cantidad, tabla.c.ocupados - cantidad), else_=0))
+    )
+
+
+def liberar_asistencias(condicion):
+    """Libera los lugares de las asistencias que cumplen ``condicion`` (antes de borrarlas)."""
+    for horario_id, total in db.session.execute(
+        db.select(AsistenciaFeria.horario_id, db.func.count(AsistenciaFeria.id))
+        .where(condicion, AsistenciaFeria.horario_id.isnot(None))
+        .group_by(AsistenciaFeria.horario_id)
+    ):
+        liberar(horario_id, total)
+
+
+def _minutos(t):
+    return t.hour * 60 + t.minute
+
+
+def carga(h):
+    return h.ocupados / h.capacidad if h.capacidad else 1.0
+
+
+def disponibilidad(periodo):
+    """Bloques del periodo en orden cronológico."""
+    return HorarioFeria.query.filter_by(periodo=periodo).order_by(HorarioFeria.hora_inicio).all()
+
+
+def sugerencias(periodo, referencia=None, limite=MAX_SUGERENCIAS):
+    """Bloques con lugar, de menor a mayor carga; a igual carga, los más cercanos
+    a ``referencia`` (la hora que pidió el estudiante)."""
+    ref = _minutos(referencia) if isinstance(referencia, time) else None
+    libres = [h for h in disponibilidad(periodo) if h.ocupados < h.capacidad]
+    libres.sort(key=lambda h: (round(carga(h), 2),
+                               abs(_minutos(h.hora_inicio) - ref) if ref is not None else 0,
+                               h.hora_inicio))
+    return libres[:limite]
+
+
+def recalcular(periodo):
+    """Liga las asistencias de texto libre a su bloque por etiqueta y recalcula
+    ``ocupados`` desde las asistencias. Devuelve ``{etiqueta: ocupados}``.
+
+    Bloquea primero las filas de los bloques del periodo (``FOR UPDATE``): un
+    ``reservar`` en curso termina antes y su asistencia entra en el conteo, y
+    los que lleguen después esperan al commit y suman sobre el valor nuevo.
+    """
+    t = HorarioFeria.__table__
+    db.session.execute(db.select(t.c.id).where(t.c.periodo == periodo).order_by(t.c.id).with_for_update())
+
+    bloques = db.session.execute(db.select(t.c.id, t.c.etiqueta).where(t.c.periodo == periodo)).all()
+    for h in bloques:
+        AsistenciaFeria.query.filter(
+            AsistenciaFeria.periodo == periodo,
+            AsistenciaFeria.horario_id.is_(None),
+            AsistenciaFeria.horario_seleccionado == h.etiqueta,
+        ).update({AsistenciaFeria.horario_id: h.id}, synchronize_session=False)
+
+    conteo = (db.select(db.func.count(AsistenciaFeria.id))
+              .where(AsistenciaFeria.horario_id == t.c.id).scalar_subquery())
+    db.session.execute(t.update().where(t.c.periodo == periodo).values(ocupados=conteo))
+    # Las instancias ya cargadas en la sesión tienen el contador viejo
+    for h in list(db.session.identity_map.values()):
+        if isinstance(h, HorarioFeria) and h.periodo == periodo:
+            db.session.expire(h, ['ocupados'])
+    return dict(db.session.execute(
+        db.select(t.c.etiqueta, t.c.ocupados).where(t.c.periodo == periodo).order_by(t.c.hora_inicio)
+    ).all())
@@ -0,0 +1,97 @@
+"""Caché HTTP: ETags débiles por versión de datos y compresión de respuestas.
+
+``@etag_versionado('carreras')`` calcula el ETag a partir de las versiones de
+las tablas de las que depende el endpoint (ver app/versiones.py) y de la URL,
+y responde ``304 Not Modified`` a ``If-None-Match`` sin ejecutar el endpoint.
+
+Las respuestas JSON/CSV mayores a ``COMPRESS_MIN_SIZE`` se comprimen con
+brotli (si el paquete está instalado y el cliente lo acepta) o gzip.
+"""
+import gzip
+import hashlib
+from functools import wraps
+
+from flask import request, make_response, current_app
+from flask_jwt_extended import get_jwt_identity
+
+from app.versiones import versiones
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional
+    brotli = None
+
+COMPRIMIBLES = ('application/json', 'text/csv', 'application/x-ndjson')
+
+
+def calcular_etag(recursos, por_usuario=False):
+    actuales = versiones(recursos)
+    if actuales is None:
+        return None
+    partes = [f'{r}:{actuales[r]}' for r in sorted(recursos)]
+    partes.append(request.full_path)
+    if por_usuario:
+        partes.append(f'u:{get_jwt_identity()}')
+    return hashlib.sha1('|'.join(partes).encode()).hexdigest()[:24]
+
+
+def etag_versionado(*recursos, por_usuario=False):
+    """Decorator para GETs cuya respuesta depende solo de ``recursos`` y de la URL.
+
+    Va debajo de ``role_required``/``jwt_required`` para que la autorización
+    se verifique antes de responder 304. ``por_usuario`` incluye la identidad
+    del JWT en el ETag para respuestas que dependen del usuario.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            etag = calcular_etag(recursos, por_usuario)
+            if etag is None:
+                return fn(*args, **kwargs)
+
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(fn(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+def _elegir_codificacion():
+    aceptadas = request.accept_encodings
+    if brotli is not None and aceptadas['br']:
+        return 'br'
+    if aceptadas['gzip']:
+        return 'gzip'
+    return None
+
+
+def init_http_cache(app):
+    @app.after_request
+    def _comprimir(response):
+        if (response.status_code != 200 or response.direct_passthrough
+                or response.is_streamed or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRIMIBLES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        datos = response.get_data()
+        if len(datos) < app.config.get('COMPRESS_MIN_SIZE', 1024):
+            return response
+
+        codificacion = _elegir_codificacion()
+        if codificacion == 'br':
+            datos = brotli.compress(datos, quality=app.config.get('COMPRESS_BR_QUALITY', 5))
+        elif codificacion == 'gzip':
+            datos = gzip.compress(datos, compresslevel=app.config.get('COMPRESS_GZIP_LEVEL', 6))
+        else:
+            return response
+
+        response.set_data(datos)
+        response.headers['Content-Encoding'] = codificacion
+        return response
@@ -0,0 +1,207 @@
+"""Soporte del header ``Idempotency-Key`` en endpoints que escriben.
+
+En la feria los teléfonos reintentan ``POST`` cuando la red falla. Con
+``@idempotente`` la primera petición con una clave se ejecuta normalmente y su
+respuesta (status, cuerpo y headers relevantes) se guarda en
+``claves_idempotencia``; los reintentos con la misma clave reciben esa misma
+respuesta sin volver a consultar ni modificar las tablas del dominio.
+
+- La clave se reserva con un INSERT en una transacción corta propia, así que
+  un duplicado concurrente la ve de inmediato y espera hasta
+  ``IDEMPOTENCIA_ESPERA`` segundos a que la primera termine.
+- Reusar una clave con otro body responde ``422``.
+- Las respuestas 5xx (o una excepción) liberan la clave para que el
+  reintento vuelva a ejecutar el endpoint.
+- Mientras está en proceso, la reserva dura solo ``IDEMPOTENCIA_LEASE``
+  segundos. Si el worker muere o gunicorn lo corta a media petición, al
+  vencer el lease un reintento toma la clave y vuelve a ejecutar, en vez de
+  recibir ``409`` hasta que venza el TTL. La reserva se identifica por su
+  ``creado``: una petición que perdió el lease ya no guarda ni libera.
+- Las respuestas guardadas expiran a los ``IDEMPOTENCIA_TTL`` segundos; ``purgar()`` borra
+  las vencidas desde la tarea ``purgar_idempotencia`` (app/mantenimiento.py)
+  o, con el programador deshabilitado, como mucho cada ``PURGA_CADA``
+  segundos por proceso.
+
+Si la tabla no existe (migración pendiente) el header se ignora.
+"""
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import request, jsonify, make_response, current_app
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import ClaveIdempotencia
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+MAX_CLAVE = 128
+HEADERS_GUARDADOS = ('Content-Type', 'Location', 'Retry-After')
+PURGA_CADA = 60
+
+_tabla = ClaveIdempotencia.__table__
+_disponible = {}
+_ultima_purga = [0.0]
+
+
+def tabla_disponible():
+    engine = db.engine
+    if engine not in _disponible:
+        _disponible[engine] = db.inspect(engine).has_table(_tabla.name)
+        if not _disponible[engine]:
+            logger.warning('Tabla claves_idempotencia no encontrada: ejecuta migracion_claves_idempotencia.sql')
+    return _disponible[engine]
+
+
+def _alcance():
+    try:
+        usuario = get_jwt_identity()
+    except RuntimeError:  # endpoint sin JWT (check-in con QR)
+        usuario = None
+    return f'{request.endpoint}:{usuario if usuario is not None else "-"}'[:120]
+
+
+def _leer(conn, alcance, clave):
+    return conn.execute(
+        db.select(_tabla).where(_tabla.c.alcance == alcance, _tabla.c.clave == clave)
+    ).first()
+
+
+def reclamar(alcance, clave, huella, lease, creado):
+    """Intenta reservar la clave por ``lease`` segundos con la marca ``creado``.
+    Devuelve None si esta petición la obtuvo o la fila existente (en proceso o
+    completada) si otra petición la tiene. Una reserva vencida (en proceso con
+    el lease vencido o completada con el TTL vencido) se reemplaza."""
+    for _ in range(2):
+        ahora = datetime.utcnow()
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(_tabla.insert().values(
+                    alcance=alcance, clave=clave, huella=huella, estado='en_proceso',
+                    creado=creado, expira=ahora + timedelta(seconds=lease)))
+            return None
+        except IntegrityError:
+            pass
+        with db.engine.begin() as conn:
+            fila = _leer(conn, alcance, clave)
+            if fila is not None and fila.expira >= ahora:
+                return fila
+            if fila is not None:
+                # Vencida pero aún sin purgar (o lease de un worker que murió): se borra y se reintenta
+                conn.execute(_tabla.delete().where(
+                    _tabla.c.alcance == alcance, _tabla.c.clave == clave, _tabla.c.expira < ahora))
+    with db.engine.connect() as conn:
+        return _leer(conn, alcance, clave)
+
+
+def esperar(alcance, clave, segundos):
+    """Relee la clave hasta que deja de estar en proceso o se acaba el tiempo.
+    Devuelve None si se liberó o si su lease venció (se puede reclamar)."""
+    limite = time.monotonic() + segundos
+    pausa = 0.05
+    while True:
+        with db.engine.connect() as conn:
+            fila = _leer(conn, alcance, clave)
+        if fila is not None and fila.estado == 'en_proceso' and fila.expira < datetime.utcnow():
+            return None
+        if fila is None or fila.estado != 'en_proceso' or time.monotonic() >= limite:
+            return fila
+        time.sleep(pausa)
+        pausa = min(pausa * 2, 0.5)
+
+
+def _reserva(alcance, clave, creado):
+    return (_tabla.c.alcance == alcance, _tabla.c.clave == clave, _tabla.c.creado == creado)
+
+
+def guardar(alcance, clave, creado, response, ttl):
+    """Guarda la respuesta y extiende la expiración al TTL completo."""
+    headers = {h: response.headers[h] for h in HEADERS_GUARDADOS if h in response.headers}
+    with db.engine.begin() as conn:
+        guardadas = conn.execute(_tabla.update().where(*_reserva(alcance, clave, creado)).values(
+            estado='completada', status_code=response.status_code, cuerpo=response.get_data(),
+            headers=json.dumps(headers), expira=datetime.utcnow() + timedelta(seconds=ttl))).rowcount
+    if not guardadas:
+        logger.warning('La petición con %s %r terminó después de vencer su lease', HEADER, clave)
+
+
+def liberar(alcance, clave, creado):
+    with db.engine.begin() as conn:
+        conn.execute(_tabla.delete().where(*_reserva(alcance, clave, creado)))
+
+
+def purgar():
+    """Borra las claves vencidas. Devuelve cuántas se eliminaron."""
+    with db.engine.begin() as conn:
+        return conn.execute(_tabla.delete().where(_tabla.c.expira < datetime.utcnow())).rowcount
+
+
+def _purgar_si_toca():
+    if time.monotonic() - _ultima_purga[0] < PURGA_CADA:
+        return
+    _ultima_purga[0] = time.monotonic()
+    try:
+        purgar()
+    except Exception:
+        logger.exception('No se pudieron purgar las claves de idempotencia')
+
+
+def _repetir(fila):
+    response = current_app.response_class(fila.cuerpo, status=fila.status_code)
+    for nombre, valor in json.loads(fila.headers or '{}').items():
+        response.headers[nombre] = valor
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotente(fn):
+    """Decorator para endpoints que escriben. Va debajo de ``role_required`` /
+    ``jwt_required`` para que el alcance incluya al usuario autenticado."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        clave = request.headers.get(HEADER, '').strip()
+        if not clave or not tabla_disponible():
+            return fn(*args, **kwargs)
+        if len(clave) > MAX_CLAVE:
+            return jsonify({'error': f'{HEADER} admite como máximo {MAX_CLAVE} caracteres'}), 400
+
+        config = current_app.config
+        alcance = _alcance()
+        huella = hashlib.sha256(request.get_data()).hexdigest()
+        if not config.get('MANTENIMIENTO_HABILITADO', True):
+            _purgar_si_toca()  # con el programador de mantenimiento lo hace la tarea purgar_idempotencia
+
+        lease = config.get('IDEMPOTENCIA_LEASE', 60)
+        creado = datetime.utcnow()
+        fila = reclamar(alcance, clave, huella, lease, creado)
+        if fila is not None and fila.estado == 'en_proceso':
+            fila = esperar(alcance, clave, config.get('IDEMPOTENCIA_ESPERA', 10))
+            if fila is None:  # la primera petición falló y liberó la clave, o su lease venció
+                fila = reclamar(alcance, clave, huella, lease, creado)
+        if fila is not None:
+            if fila.huella != huella:
+                return jsonify({'error': f'{HEADER} ya se usó con otra petición'}), 422
+            if fila.estado == 'en_proceso':
+                response = jsonify({'error': 'La petición original sigue en proceso'})
+                response.status_code = 409
+                response.headers['Retry-After'] = '1'
+                return response
+            return _repetir(fila)
+
+        try:
+            response = make_response(fn(*args, **kwargs))
+        except Exception:
+            liberar(alcance, clave, creado)
+            raise
+        if response.status_code >= 500:
+            liberar(alcance, clave, creado)
+        else:
+            guardar(alcance, clave, creado, response, config.get('IDEMPOTENCIA_TTL', 86400))
+        return response
+    return wrapper
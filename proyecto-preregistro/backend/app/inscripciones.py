@@ -0,0 +1,43 @@
+"""Reglas de inscripción a un servicio, compartidas por el modo directo y la cola.
+
+``inscribir`` valida e inserta el pre-registro sin hacer commit: el llamador
+decide la transacción (el endpoint en modo directo, o el worker de la cola que
+además actualiza el ticket en la misma transacción). Las consultas son las
+sentencias precompiladas de app/consultas.py.
+"""
+from app import db, asignacion, consultas
+
+
+def inscribir(estudiante_id, crn):
+    """Devuelve ``(cuerpo, status)``. Con 201 el pre-registro queda insertado en la transacción."""
+    if consultas.EXISTE_ESTUDIANTE.ejecutar(estudiante_id=estudiante_id).scalar() is None:
+        return {'error': 'Estudiante no encontrado'}, 404
+
+    servicio = consultas.SERVICIO_POR_CRN.ejecutar(crn=crn).first()
+    if not servicio:
+        return {'error': 'Servicio con ese CRN no encontrado'}, 404
+
+    if asignacion.periodo_por_preferencias(servicio.periodo):
+        return {'error': f'Los servicios del periodo {servicio.periodo} se asignan por preferencias'}, 409
+
+    # Verificar que el estudiante tenga asistencia registrada a la feria
+    if consultas.TIENE_ASISTENCIA.ejecutar(estudiante_id=estudiante_id).scalar() is None:
+        return {'error': 'El estudiante debe tener asistencia registrada a la feria para inscribirse a un servicio'}, 400
+
+    # Verificar cupo
+    inscritos = consultas.INSCRITOS_SERVICIO.ejecutar(servicio_id=servicio.id).scalar()
+    if inscritos >= servicio.cupo_maximo:
+        return {'error': 'El servicio ha alcanzado su cupo máximo'}, 409
+
+    # Verificar duplicado
+    if consultas.INSCRIPCION_EXISTENTE.ejecutar(estudiante_id=estudiante_id, servicio_id=servicio.id).scalar():
+        return {'error': 'El estudiante ya está inscrito en este servicio'}, 409
+
+    # Verificar límite de 1 servicio por periodo
+    if consultas.INSCRIPCION_EN_PERIODO.ejecutar(estudiante_id=estudiante_id, periodo=servicio.periodo).scalar():
+        return {'error': f'El estudiante ya tiene un servicio inscrito en el periodo {servicio.periodo}'}, 409
+
+    preregistro_id = db.session.execute(consultas.INSERTAR_PREREGISTRO, {
+        'estudiante_id': estudiante_id, 'servicio_id': servicio.id, 'periodo': servicio.periodo,
+    }).scalar()
+    return {'id': preregistro_id, 'message': 'Inscripción exitosa'}, 201
@@ -0,0 +1,55 @@
+"""Proveedor JSON de Flask basado en orjson.
+
+Se activa con ``JSON_PROVIDER=orjson`` (default) si el paquete está instalado;
+si no, Flask sigue usando su proveedor estándar. La salida es compatible con
+la del proveedor estándar: fechas en formato HTTP, ``Decimal``/``UUID`` como
+texto y dataclasses como objetos. Lo único que cambia es que las llaves no se
+ordenan.
+"""
+import decimal
+import uuid
+from datetime import date
+
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional
+    orjson = None
+
+_OPCIONES = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+
+def _default(o):
+    if isinstance(o, date):
+        return http_date(o)
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    def dumps_bytes(self, obj):
+        return orjson.dumps(obj, default=_default, option=_OPCIONES)
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:  # opciones de json.dumps (indent, sort_keys...): proveedor estándar
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
+
+
+def init_json_provider(app):
+    if app.config.get('JSON_PROVIDER', 'orjson') == 'orjson' and orjson is not None:
+        app.json = OrjsonProvider(app)
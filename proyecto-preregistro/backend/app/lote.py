@@ -0,0 +1,174 @@
+"""Varias peticiones a la API en un solo round trip (``POST /api/batch``).
+
+Cada sub-petición se despacha a los blueprints registrados con su propio
+contexto de petición (``request``, ``view_args``, decorators y manejadores de
+error de siempre), pero dentro del contexto de aplicación del lote:
+
+- las que corren en el hilo del lote usan su misma sesión de ``db`` y, por
+  lo tanto, la misma conexión del pool;
+- reusa el rol del usuario que el lote ya consultó (``middleware.rol_usuario``),
+  así que ``role_required`` no vuelve a ir a la base. La firma del JWT sí se
+  verifica en cada sub-petición, con los decorators de cada endpoint.
+
+Cada sub-petición tiene su propio ``g``, para que los hooks de teardown
+(carriles, perfilado) de la sub-petición no toquen el estado del lote. Corren
+los ``after_request`` (auditoría de escrituras incluida), pero no los
+``before_request``. Una sub-petición de otro carril que el del lote toma
+lugar en ese carril y, si está lleno, responde ``503`` solo para esa
+sub-petición.
+
+Las sub-peticiones se ejecutan en orden. Los GET consecutivos, que no
+dependen entre sí, se ejecutan en paralelo (hasta ``BATCH_HILOS``), cada uno
+con su propio contexto y sesión. Las escrituras marcan un corte: un GET
+posterior ve lo que escribieron las anteriores.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, request, jsonify
+from flask.globals import app_ctx
+
+from app import db, carriles
+from app.middleware import rol_usuario
+
+logger = logging.getLogger(__name__)
+
+METODOS = frozenset({'GET', 'POST', 'PUT', 'PATCH', 'DELETE'})
+RUTA_LOTE = '/api/batch'
+# Headers de la sub-respuesta que se devuelven al cliente
+HEADERS = ('ETag', 'Location', 'Retry-After', 'X-Cursor', 'X-Origen-Lectura', 'Cache-Control')
+# No se reenvían a la sub-petición: la respuesta la comprime el lote, no cada parte
+HEADERS_OMITIDOS = frozenset({'accept-encoding', 'content-length', 'content-type', 'host'})
+
+
+def validar(peticiones, maximo):
+    """Normaliza la lista del body. Lanza RuntimeError si algo no es válido."""
+    if not isinstance(peticiones, list) or not peticiones:
+        raise RuntimeError('Se requiere una lista "peticiones" no vacía')
+    if len(peticiones) > maximo:
+        raise RuntimeError(f'Máximo {maximo} peticiones por lote')
+    normalizadas = []
+    for i, p in enumerate(peticiones):
+        if not isinstance(p, dict):
+            raise RuntimeError(f'La petición {i} debe ser un objeto')
+        metodo = str(p.get('metodo') or 'GET').upper()
+        ruta = str(p.get('ruta') or '')
+        if metodo not in METODOS:
+            raise RuntimeError(f'Método no soportado en la petición {i}: {metodo}')
+        if not ruta.startswith('/api/') or ruta.split('?', 1)[0].rstrip('/') == RUTA_LOTE:
+            raise RuntimeError(f'Ruta no válida en la petición {i}: {ruta!r}')
+        headers = p.get('headers') or {}
+        if not isinstance(headers, dict):
+            raise RuntimeError(f'"headers" de la petición {i} debe ser un objeto')
+        normalizadas.append({
+            'id': p.get('id', i),
+            'metodo': metodo,
+            'ruta': ruta,
+            'body': p.get('body'),
+            'headers': {k: str(v) for k, v in headers.items() if k.lower() not in HEADERS_OMITIDOS},
+        })
+    return normalizadas
+
+
+def _grupos(peticiones):
+    """Parte la lista en tramos: GET consecutivos juntos, cada escritura sola."""
+    grupo = []
+    for p in peticiones:
+        if p['metodo'] != 'GET':
+            if grupo:
+                yield grupo
+                grupo = []
+            yield [p]
+        else:
+            grupo.append(p)
+    if grupo:
+        yield grupo
+
+
+def _incluible(response):
+    # Las respuestas de error de werkzeug (405...) también vienen como iterador; esas sí se leen
+    if response.is_streamed and response.status_code < 400:
+        return False
+    return response.is_json or response.mimetype.startswith('text/')
+
+
+def _cuerpo(response):
+    if response.is_json:
+        return response.get_json(silent=True)
+    return response.get_data(as_text=True) or None
+
+
+def _despachar(app, p, lote, carril_lote):
+    """Ejecuta una sub-petición en el contexto de aplicación actual y devuelve su resultado."""
+    ctx = app_ctx._get_current_object()
+    g_lote = ctx.g
+    ctx.g = app.app_ctx_globals_class()
+    ctx.g.rol_usuario = lote['rol']
+    semaforo = None
+    try:
+        headers = {**p['headers'], 'Authorization': lote['autorizacion']} if lote['autorizacion'] else p['headers']
+        kwargs = {'json': p['body']} if p['body'] is not None else {}
+        with app.test_request_context(p['ruta'], method=p['metodo'], headers=headers,
+                                      environ_base={'REMOTE_ADDR': lote['ip']}, **kwargs):
+            nombre = carriles.clase(request.endpoint)
+            ctx.g.carril_timeout_ms = app.config.get(f'CARRIL_{nombre.upper()}_TIMEOUT_MS', 0)
+            if nombre != carril_lote:
+                semaforo = carriles.tomar(nombre)
+            if semaforo is False:
+                response = carriles.saturado(nombre)
+            else:
+                try:
+                    try:
+                        rv = app.dispatch_request()
+                    except Exception as e:
+                        rv = app.handle_user_exception(e)
+                except Exception:
+                    logger.exception('Falló la sub-petición %s %s del lote', p['metodo'], p['ruta'])
+                    db.session.rollback()
+                    rv = jsonify({'error': 'Error interno del servidor'}), 500
+                response = app.process_response(app.make_response(rv))
+            if not _incluible(response):
+                response.close()
+                return {'id': p['id'], 'status': 400,
+                        'body': {'error': 'Solo se pueden incluir en un lote respuestas JSON o de texto, sin streaming'}}
+            return {
+                'id': p['id'],
+                'status': response.status_code,
+                'headers': {h: response.headers[h] for h in HEADERS if h in response.headers},
+                'body': _cuerpo(response),
+            }
+    finally:
+        if semaforo:
+            semaforo.release()
+        ctx.g = g_lote
+
+
+def _despachar_aparte(app, p, lote, carril_lote):
+    """Igual que ``_despachar``, en otro hilo con su propio contexto y sesión."""
+    with app.app_context():
+        try:
+            return _despachar(app, p, lote, carril_lote)
+        finally:
+            db.session.remove()
+
+
+def ejecutar(peticiones, identidad):
+    """Ejecuta las sub-peticiones ya validadas y devuelve sus resultados en el mismo orden."""
+    app = current_app._get_current_object()
+    lote = {
+        'autorizacion': request.headers.get('Authorization'),
+        'rol': (identidad, rol_usuario(identidad)),
+        'ip': request.remote_addr or '',
+    }
+    carril_lote = carriles.clase(request.endpoint)
+    hilos = max(1, app.config.get('BATCH_HILOS', 4))
+
+    resultados = []
+    for grupo in _grupos(peticiones):
+        if len(grupo) == 1 or hilos == 1:
+            resultados.extend(_despachar(app, p, lote, carril_lote) for p in grupo)
+            continue
+        with ThreadPoolExecutor(max_workers=min(hilos, len(grupo)), thread_name_prefix='lote') as pool:
+            # En paralelo cada hilo toma lugar en su carril, también en el del lote
+            resultados.extend(pool.map(lambda p: _despachar_aparte(app, p, lote, None), grupo))
+    return resultados
@@ -0,0 +1,328 @@
+"""Tareas periódicas de mantenimiento.
+
+Un hilo por proceso (creado con la primera petición) revisa cada
+``MANTENIMIENTO_TICK`` segundos qué tareas tocan. Hay dos tipos:
+
+- Compartidas: su estado vive en ``tareas_mantenimiento``. Para ejecutar una,
+  el proceso toma un lease con un UPDATE condicional (``proxima`` vencida y sin
+  lease vigente). Así, aunque haya varios workers, cada tarea corre en uno solo
+  y respeta su intervalo. Mientras la tarea corre, un hilo renueva el lease
+  cada tercio de ``MANTENIMIENTO_LEASE``, así que una tarea larga no se
+  duplica. Si el proceso muere, el lease vence a los ``MANTENIMIENTO_LEASE``
+  segundos y otro la retoma.
+- Locales: se ejecutan en cada proceso, como el precalentado de la caché en
+  proceso, que solo sirve al worker que la llena.
+
+Cada ejecución guarda su duración, su resultado y su error. Las compartidas
+los guardan en la tabla; las locales, en memoria. ``estado()`` junta ambos.
+Si la tabla no existe (migración pendiente), solo corren las locales.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from app import db, catalogos, cambios, horarios, idempotencia
+from app.models import TareaMantenimiento, PasswordResetToken, HorarioFeria, AsistenciaFeria
+
+logger = logging.getLogger(__name__)
+
+LOTE = 1000
+TABLAS_ANALYZE = ('preregistros', 'asistencias_feria', 'servicios', 'estudiantes', 'horarios_feria')
+
+_tabla = TareaMantenimiento.__table__
+_lock = threading.Lock()
+_estado = {'hilo': None}
+_disponible = {}
+_locales = {}   # nombre -> métricas de este proceso
+
+TAREAS = {}
+
+
+class Tarea:
+    def __init__(self, nombre, fn, cada, compartida=True):
+        self.nombre = nombre
+        self.fn = fn
+        self.cada = cada
+        self.compartida = compartida
+
+
+def tarea(nombre, cada, compartida=True):
+    """Registra ``fn`` como tarea que se ejecuta cada ``cada`` segundos."""
+    def decorator(fn):
+        TAREAS[nombre] = Tarea(nombre, fn, cada, compartida)
+        return fn
+    return decorator
+
+
+# ─────────────────────────────────────────────
+#   Tareas
+# ─────────────────────────────────────────────
+
+@tarea('purgar_tokens_reset', cada=3600)
+def purgar_tokens_reset(lote=LOTE):
+    """Borra por lotes los tokens de recuperación usados o vencidos."""
+    t = PasswordResetToken
+    condicion = db.or_(t.used.is_(True), t.expires_at < datetime.utcnow())
+    borrados = 0
+    while True:
+        ids = list(db.session.scalars(db.select(t.id).where(condicion).order_by(t.id).limit(lote)))
+        if not ids:
+            return {'borrados': borrados}
+        t.query.filter(t.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        borrados += len(ids)
+
+
+@tarea('purgar_idempotencia', cada=300)
+def purgar_idempotencia():
+    if not idempotencia.tabla_disponible():
+        return {'borrados': 0}
+    return {'borrados': idempotencia.purgar()}
+
+
+@tarea('purgar_registros_eliminados', cada=24 * 3600)
+def purgar_registros_eliminados():
+    """Borra las lápidas del feed de cambios más antiguas que la retención."""
+    if not cambios.tabla_disponible():
+        return {'borrados': 0}
+    return {'borrados': cambios.purgar(current_app.config.get('CAMBIOS_RETENCION_DIAS', 30))}
+
+
+@tarea('analizar_tablas', cada=6 * 3600)
+def analizar_tablas():
+    """ANALYZE de las tablas con más escrituras, para que el planner tenga
+    estadísticas al día tras cargas masivas (apertura, cierre de feria)."""
+    existentes = [n for n in TABLAS_ANALYZE if db.inspect(db.engine).has_table(n)]
+    with db.engine.begin() as conn:
+        for nombre in existentes:
+            conn.execute(db.text(f'ANALYZE {nombre}'))
+    return {'tablas': existentes}
+
+
+@tarea('recalcular_horarios', cada=900)
+def recalcular_horarios():
+    """Reconcilia los contadores ``ocupados`` de los bloques de horario.
+
+    Se salta los periodos con asistencias creadas o modificadas en los últimos
+    ``HORARIOS_RECALCULO_QUIETO`` segundos: ahí la feria sigue en marcha y no
+    hace falta tomar el lock de sus bloques. ``horarios.recalcular`` es seguro
+    frente a ``reservar`` de todos modos.
+    """
+    desde = datetime.utcnow() - timedelta(seconds=current_app.config.get('HORARIOS_RECALCULO_QUIETO', 3600))
+    recientes = db.select(AsistenciaFeria.id).where(
+        AsistenciaFeria.periodo == HorarioFeria.periodo, AsistenciaFeria.actualizado >= desde)
+    periodos = db.session.scalars(
+        db.select(HorarioFeria.periodo).where(~recientes.exists()).distinct()).all()
+    for periodo in periodos:
+        horarios.recalcular(periodo)
+        db.session.commit()
+    return {'periodos': periodos}
+
+
+@tarea('calentar_caches', cada=60, compartida=False)
+def calentar_caches():
+    """Recarga en este proceso los catálogos cuya versión cambió."""
+    catalogos.carreras()
+    catalogos.socios()
+    catalogos.periodos()
+    catalogos.periodos_con_preregistros()
+    return {}
+
+
+# ─────────────────────────────────────────────
+#   Lease y ejecución
+# ─────────────────────────────────────────────
+
+def tabla_disponible():
+    engine = db.engine
+    if engine not in _disponible:
+        _disponible[engine] = db.inspect(engine).has_table(_tabla.name)
+        if not _disponible[engine]:
+            logger.warning('Tabla tareas_mantenimiento no encontrada: ejecuta migracion_tareas_mantenimiento.sql')
+        else:
+            _registrar_tareas()
+    return _disponible[engine]
+
+
+def _registrar_tareas():
+    ahora = datetime.utcnow()
+    for t in TAREAS.values():
+        if not t.compartida:
+            continue
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(_tabla.insert().values(nombre=t.nombre, proxima=ahora, ejecuciones=0, fallos=0))
+        except IntegrityError:
+            pass
+
+
+def _dueno():
+    # Se calcula en cada llamada: con gunicorn --preload el import ocurre antes del fork
+    return f'{socket.gethostname()}:{os.getpid()}'[:80]
+
+
+def _tomar(nombre, forzar):
+    ahora = datetime.utcnow()
+    lease = timedelta(seconds=current_app.config.get('MANTENIMIENTO_LEASE', 600))
+    condiciones = [_tabla.c.nombre == nombre,
+                   db.or_(_tabla.c.bloqueado_hasta.is_(None), _tabla.c.bloqueado_hasta < ahora)]
+    if not forzar:
+        condiciones.append(_tabla.c.proxima <= ahora)
+    with db.engine.begin() as conn:
+        tomadas = conn.execute(_tabla.update().where(*condiciones).values(
+            dueno=_dueno(), bloqueado_hasta=ahora + lease, ultimo_inicio=ahora)).rowcount
+    return tomadas == 1
+
+
+def _soltar(t, inicio, duracion, resultado, error):
+    with db.engine.begin() as conn:
+        conn.execute(_tabla.update().where(_tabla.c.nombre == t.nombre, _tabla.c.dueno == _dueno()).values(
+            bloqueado_hasta=None,
+            proxima=inicio + timedelta(seconds=t.cada),
+            ultima_duracion=duracion,
+            ultimo_estado='error' if error else 'ok',
+            ultimo_resultado=json.dumps(resultado, ensure_ascii=False, default=str) if resultado is not None else None,
+            ultimo_error=error,
+            ejecuciones=_tabla.c.ejecuciones + 1,
+            fallos=_tabla.c.fallos + (1 if error else 0),
+        ))
+
+
+def _renovar(engine, nombre, dueno, lease, parar):
+    while not parar.wait(lease / 3):
+        try:
+            with engine.begin() as conn:
+                renovado = conn.execute(_tabla.update().where(_tabla.c.nombre == nombre, _tabla.c.dueno == dueno).values(
+                    bloqueado_hasta=datetime.utcnow() + timedelta(seconds=lease))).rowcount
+            if not renovado:
+                logger.warning('La tarea de mantenimiento %s perdió su lease', nombre)
+                return
+        except Exception:
+            logger.exception('No se pudo renovar el lease de la tarea de mantenimiento %s', nombre)
+
+
+def _mantener_lease(nombre):
+    """Renueva el lease de ``nombre`` en otro hilo hasta que se active el Event devuelto."""
+    parar = threading.Event()
+    lease = current_app.config.get('MANTENIMIENTO_LEASE', 600)
+    threading.Thread(target=_renovar, args=(db.engine, nombre, _dueno(), lease, parar),
+                     name=f'lease-{nombre}', daemon=True).start()
+    return parar
+
+
+def _correr(t):
+    inicio = datetime.utcnow()
+    t0 = time.perf_counter()
+    resultado, error = None, None
+    try:
+        resultado = t.fn()
+    except Exception as e:
+        db.session.rollback()
+        logger.exception('Falló la tarea de mantenimiento %s', t.nombre)
+        error = f'{type(e).__name__}: {e}'[:2000]
+    return inicio, time.perf_counter() - t0, resultado, error
+
+
+def ejecutar(nombre, forzar=False):
+    """Ejecuta la tarea si le toca (o ya, con ``forzar``) y nadie más la tiene.
+
+    Devuelve ``{'estado', 'duracion', 'resultado', 'error'}`` o None si no se
+    ejecutó porque otro proceso tiene el lease o aún no le toca.
+    """
+    t = TAREAS.get(nombre)
+    if t is None:
+        raise RuntimeError(f'Tarea desconocida: {nombre}')
+
+    if t.compartida:
+        if not tabla_disponible() or not _tomar(nombre, forzar):
+            return None
+        parar = _mantener_lease(nombre)
+        try:
+            inicio, duracion, resultado, error = _correr(t)
+        finally:
+            parar.set()
+        _soltar(t, inicio, duracion, resultado, error)
+    else:
+        with _lock:
+            metricas = _locales.setdefault(nombre, {'proxima': 0.0, 'ejecuciones': 0, 'fallos': 0})
+            if not forzar and time.monotonic() < metricas['proxima']:
+                return None
+            metricas['proxima'] = time.monotonic() + t.cada
+        inicio, duracion, resultado, error = _correr(t)
+        with _lock:
+            metricas.update(ultimo_inicio=inicio, ultima_duracion=duracion,
+                            ultimo_estado='error' if error else 'ok', ultimo_resultado=resultado,
+                            ultimo_error=error, ejecuciones=metricas['ejecuciones'] + 1,
+                            fallos=metricas['fallos'] + (1 if error else 0))
+    return {'estado': 'error' if error else 'ok', 'duracion': round(duracion, 4),
+            'resultado': resultado, 'error': error}
+
+
+def ejecutar_pendientes():
+    for nombre in TAREAS:
+        try:
+            ejecutar(nombre)
+        except Exception:
+            # Fallo al tomar o soltar el lease (base caída): se reintenta en el siguiente tick
+            logger.exception('No se pudo ejecutar la tarea de mantenimiento %s', nombre)
+        finally:
+            db.session.remove()
+
+
+def estado():
+    """Métricas de todas las tareas: compartidas (de la tabla) y locales (de este proceso)."""
+    filas = {}
+    if tabla_disponible():
+        with db.engine.connect() as conn:
+            filas = {f.nombre: f for f in conn.execute(db.select(_tabla))}
+    salida = []
+    for t in TAREAS.values():
+        if t.compartida:
+            f = filas.get(t.nombre)
+            datos = {
+                'proxima': f.proxima, 'bloqueado_hasta': f.bloqueado_hasta, 'dueno': f.dueno,
+                'ultimo_inicio': f.ultimo_inicio, 'ultima_duracion': f.ultima_duracion,
+                'ultimo_estado': f.ultimo_estado,
+                'ultimo_resultado': json.loads(f.ultimo_resultado) if f.ultimo_resultado else None,
+                'ultimo_error': f.ultimo_error, 'ejecuciones': f.ejecuciones, 'fallos': f.fallos,
+            } if f is not None else {}
+        else:
+            with _lock:
+                datos = {k: v for k, v in _locales.get(t.nombre, {}).items() if k != 'proxima'}
+        salida.append({'nombre': t.nombre, 'cada': t.cada, 'compartida': t.compartida, **datos})
+    return salida
+
+
+def _hilo(app, tick):
+    with app.app_context():
+        while True:
+            ejecutar_pendientes()
+            time.sleep(tick)
+
+
+def _iniciar_hilo(app):
+    with _lock:
+        if _estado['hilo'] is not None and _estado['hilo'].is_alive():
+            return
+        hilo = threading.Thread(target=_hilo, args=(app, app.config.get('MANTENIMIENTO_TICK', 30)),
+                                name='mantenimiento', daemon=True)
+        _estado['hilo'] = hilo
+    hilo.start()
+
+
+def init_mantenimiento(app):
+    if not app.config.get('MANTENIMIENTO_HABILITADO', True):
+        return
+
+    @app.before_request
+    def arrancar_mantenimiento():
+        # Con la primera petición del proceso (después del fork de gunicorn)
+        if _estado['hilo'] is None:
+            _iniciar_hilo(app)
@@ -1,7 +1,21 @@
 from functools import wraps
-from flask import jsonify
+from flask import g, jsonify
 from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
-from app.models import Usuario
+from app import consultas
+
+
+def rol_usuario(identidad):
+    """Rol del usuario del JWT. Se guarda en ``g`` (``/api/batch`` lo precarga
+    en cada sub-petición para no repetir la consulta)."""
+    guardado = g.get('rol_usuario')
+    if guardado is not None and guardado[0] == identidad:
+        return guardado[1]
+    try:
+        rol = consultas.ROL_USUARIO.ejecutar(usuario_id=int(identidad)).scalar()
+    except (TypeError, ValueError):
+        rol = None
+    g.rol_usuario = (identidad, rol)
+    return rol
 
 
 def role_required(*roles):
@@ -10,9 +24,8 @@ def role_required(*roles):
         @wraps(fn)
         def wrapper(*args, **kwargs):
             verify_jwt_in_request()
-            user_id = get_jwt_identity()
-            user = Usuario.query.get(user_id)
-            if not user or user.rol not in roles:
+            rol = rol_usuario(get_jwt_identity())
+            if rol not in roles:
                 return jsonify({'error': 'No tienes permisos para esta acción'}), 403
             return fn(*args, **kwargs)
         return wrapper
@@ -1,6 +1,27 @@
 from app import db
 from datetime import datetime
 
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+
+
+class MarcaTransaccion(FunctionElement):
+    """Marca de la transacción que escribe la fila, para el feed de cambios
+    (ver app/cambios.py). En PostgreSQL es el xid de la transacción."""
+    type = db.BigInteger()
+    inherit_cache = True
+
+
+@compiles(MarcaTransaccion, 'postgresql')
+def _marca_postgresql(element, compiler, **kw):
+    return 'txid_current()'
+
+
+@compiles(MarcaTransaccion)
+def _marca_sqlite(element, compiler, **kw):
+    # SQLite (desarrollo) serializa las escrituras: basta el reloj de la base en ms
+    return "CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)"
+
 
 class Usuario(db.Model):
     __tablename__ = 'usuarios'
@@ -30,10 +51,17 @@ class Estudiante(db.Model):
     carrera_id = db.Column(db.Integer, db.ForeignKey('carreras.id'), nullable=False)
     celular = db.Column(db.String(20))
     correo_alterno = db.Column(db.String(150), unique=True)
+    # Feed de cambios (app/cambios.py): se actualizan en cada INSERT/UPDATE del ORM
+    actualizado = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    transaccion = db.Column(db.BigInteger, nullable=False, default=MarcaTransaccion(), onupdate=MarcaTransaccion())
 
     preregistros = db.relationship('PreRegistro', backref='estudiante')
     asistencias = db.relationship('AsistenciaFeria', backref='estudiante')
 
+    __table_args__ = (
+        db.Index('ix_estudiantes_transaccion', 'transaccion', 'id'),
+    )
+
 
 class SocioFormador(db.Model):
     __tablename__ = 'socios_formadores'
@@ -57,14 +85,24 @@ class Servicio(db.Model):
 
 class PreRegistro(db.Model):
     __tablename__ = 'preregistros'
-    id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(db.Integer, db.Identity(), autoincrement=True)
     estudiante_id = db.Column(db.Integer, db.ForeignKey('estudiantes.id'), nullable=False)
-    servicio_id = db.Column(db.Integer, db.ForeignKey('servicios.id'), nullable=False)
+    servicio_id = db.Column(db.Integer, db.ForeignKey('servicios.id'), nullable=False, index=True)
     fecha_registro = db.Column(db.DateTime, default=datetime.utcnow)
+    # Copia de servicios.periodo: llave de partición (ver migracion_particiones_periodo.sql)
+    periodo = db.Column(db.String(30), nullable=False)
+    actualizado = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    transaccion = db.Column(db.BigInteger, nullable=False, default=MarcaTransaccion(), onupdate=MarcaTransaccion())
 
     __table_args__ = (
-        db.UniqueConstraint('estudiante_id', 'servicio_id', name='uq_estudiante_servicio'),
+        # Tabla particionada por periodo: la PK y los UNIQUE tienen que incluir la llave de partición
+        db.PrimaryKeyConstraint('id', 'periodo', name='pk_preregistros'),
+        db.UniqueConstraint('estudiante_id', 'servicio_id', 'periodo', name='uq_estudiante_servicio'),
+        db.Index('ix_preregistros_estudiante_periodo', 'estudiante_id', 'periodo'),
+        db.Index('ix_preregistros_transaccion', 'transaccion', 'id'),
     )
+    # id sale de una sola identidad para todas las particiones: basta para identificar la fila
+    __mapper_args__ = {'primary_key': [id]}
 
 
 class PasswordResetToken(db.Model):
@@ -72,13 +110,17 @@ class PasswordResetToken(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
     token = db.Column(db.String(128), unique=True, nullable=False)
-    expires_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
     used = db.Column(db.Boolean, default=False)
 
 
+# Asistencias sin periodo (ni evento): caen en la partición DEFAULT
+SIN_PERIODO = ''
+
+
 class AsistenciaFeria(db.Model):
     __tablename__ = 'asistencias_feria'
-    id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(db.Integer, db.Identity(), autoincrement=True)
     estudiante_id = db.Column(db.Integer, db.ForeignKey('estudiantes.id'), nullable=False)
     servicio_id = db.Column(db.Integer, db.ForeignKey('servicios.id'), nullable=True)  # C1: vínculo opcional con servicio
     fecha_asistencia = db.Column(db.Date, default=datetime.utcnow)
@@ -86,7 +128,198 @@ class AsistenciaFeria(db.Model):
     hora_real_asistencia = db.Column(db.Time)
     hora_salida = db.Column(db.DateTime)
     estatus_asistencia = db.Column(db.String(30), default='pendiente')
-    evento_feria_id = db.Column(db.Integer, nullable=True)
-    periodo = db.Column(db.String(30))
+    evento_feria_id = db.Column(db.Integer, db.ForeignKey('eventos_feria.id'), nullable=True)
+    periodo = db.Column(db.String(30), nullable=False, default=SIN_PERIODO)
+    horario_id = db.Column(db.Integer, db.ForeignKey('horarios_feria.id'), nullable=True, index=True)
+    actualizado = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    transaccion = db.Column(db.BigInteger, nullable=False, default=MarcaTransaccion(), onupdate=MarcaTransaccion())
 
     servicio = db.relationship('Servicio', backref='asistencias')
+
+    __table_args__ = (
+        db.PrimaryKeyConstraint('id', 'periodo', name='pk_asistencias_feria'),
+        # Consultas por evento: conteos por estatus y "¿ya tiene registro en este evento?"
+        db.Index('ix_asistencias_feria_evento_estatus', 'evento_feria_id', 'estatus_asistencia'),
+        db.Index('ix_asistencias_feria_evento_estudiante', 'evento_feria_id', 'estudiante_id'),
+        db.Index('ix_asistencias_feria_transaccion', 'transaccion', 'id'),
+    )
+    __mapper_args__ = {'primary_key': [id]}
+
+
+class EventoFeria(db.Model):
+    """Edición de la feria. Las asistencias y los QR de check-in se acotan al evento."""
+    __tablename__ = 'eventos_feria'
+    id = db.Column(db.Integer, primary_key=True)
+    nombre = db.Column(db.String(150), nullable=False)
+    descripcion = db.Column(db.Text, nullable=False, default='')
+    fecha_evento = db.Column(db.Date, nullable=False)
+    hora_inicio = db.Column(db.Time, nullable=False)
+    hora_fin = db.Column(db.Time, nullable=False)
+    ubicacion = db.Column(db.String(200), nullable=False, default='')
+    estatus = db.Column(db.String(20), nullable=False, default='activo')  # activo | cerrado
+    periodo = db.Column(db.String(30), index=True)
+
+
+class HorarioFeria(db.Model):
+    """Bloque de horario de la feria con cupo propio.
+
+    ``ocupados`` es un contador precalculado que se incrementa y decrementa con
+    UPDATEs atómicos al registrar o cancelar asistencias (ver app/horarios.py).
+    """
+    __tablename__ = 'horarios_feria'
+    id = db.Column(db.Integer, primary_key=True)
+    periodo = db.Column(db.String(30), nullable=False)
+    etiqueta = db.Column(db.String(50), nullable=False)  # "11:00 - 12:00", igual que horario_seleccionado
+    hora_inicio = db.Column(db.Time, nullable=False)
+    hora_fin = db.Column(db.Time, nullable=False)
+    capacidad = db.Column(db.Integer, nullable=False)
+    ocupados = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('periodo', 'etiqueta', name='uq_horario_periodo_etiqueta'),
+        db.CheckConstraint('ocupados >= 0', name='ck_horario_ocupados'),
+    )
+
+
+class VersionDatos(db.Model):
+    """Contador de versión por tabla; se incrementa en cada commit que la modifica.
+
+    Sirve para ETags y para invalidar cachés entre workers (ver app/versiones.py).
+    """
+    __tablename__ = 'versiones_datos'
+    recurso = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class TicketInscripcion(db.Model):
+    """Solicitud de inscripción en espera cuando ``INSCRIPCION_MODO=cola``.
+
+    Cada CRN se atiende en orden de ``id`` por un solo worker a la vez
+    (ver app/cola_inscripciones.py); ``resultado`` guarda la respuesta JSON.
+    """
+    __tablename__ = 'tickets_inscripcion'
+    id = db.Column(db.Integer, primary_key=True)
+    codigo = db.Column(db.String(32), unique=True, nullable=False)
+    estudiante_id = db.Column(db.Integer, nullable=False)
+    crn = db.Column(db.String(30), nullable=False)
+    estado = db.Column(db.String(20), nullable=False, default='en_cola')  # en_cola | completado | rechazado
+    status_code = db.Column(db.Integer)
+    resultado = db.Column(db.Text)
+    creado = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    atendido = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_tickets_inscripcion_crn_estado', 'crn', 'estado', 'id'),
+    )
+
+
+class VentanaAsignacion(db.Model):
+    """Ventana de asignación por preferencias de un periodo.
+
+    Mientras existe y no se ha ejecutado la asignación, los estudiantes registran
+    preferencias y no se aceptan inscripciones directas a servicios del periodo.
+    """
+    __tablename__ = 'ventanas_asignacion'
+    id = db.Column(db.Integer, primary_key=True)
+    periodo = db.Column(db.String(30), unique=True, nullable=False)
+    abre = db.Column(db.DateTime, nullable=False)
+    cierra = db.Column(db.DateTime, nullable=False)
+    estado = db.Column(db.String(20), nullable=False, default='abierta')  # abierta | asignada
+    semilla = db.Column(db.Integer)
+    ejecutada_en = db.Column(db.DateTime)
+    resumen = db.Column(db.Text)
+
+
+class PreferenciaServicio(db.Model):
+    __tablename__ = 'preferencias_servicio'
+    id = db.Column(db.Integer, primary_key=True)
+    estudiante_id = db.Column(db.Integer, db.ForeignKey('estudiantes.id'), nullable=False)
+    periodo = db.Column(db.String(30), nullable=False)
+    servicio_id = db.Column(db.Integer, db.ForeignKey('servicios.id'), nullable=False)
+    rango = db.Column(db.Integer, nullable=False)  # 1 = primera opción
+
+    __table_args__ = (
+        db.UniqueConstraint('estudiante_id', 'periodo', 'rango', name='uq_preferencia_rango'),
+        db.UniqueConstraint('estudiante_id', 'servicio_id', name='uq_preferencia_servicio'),
+        db.Index('ix_preferencias_servicio_periodo', 'periodo'),
+    )
+
+
+class ClaveIdempotencia(db.Model):
+    """Respuesta guardada de una petición con header ``Idempotency-Key``.
+
+    ``alcance`` es el endpoint más el usuario, para que dos clientes no
+    compartan claves. Mientras ``estado`` es ``en_proceso`` los duplicados
+    esperan la primera respuesta (ver app/idempotencia.py).
+    """
+    __tablename__ = 'claves_idempotencia'
+    alcance = db.Column(db.String(120), primary_key=True)
+    clave = db.Column(db.String(128), primary_key=True)
+    huella = db.Column(db.String(64), nullable=False)  # sha256 del body
+    estado = db.Column(db.String(20), nullable=False, default='en_proceso')
+    status_code = db.Column(db.Integer)
+    cuerpo = db.Column(db.LargeBinary)
+    headers = db.Column(db.Text)
+    creado = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expira = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class EventoAuditoria(db.Model):
+    """Registro de una petición que modificó datos administrativos.
+
+    Se escribe en lotes desde un hilo en segundo plano (ver app/auditoria.py).
+    """
+    __tablename__ = 'eventos_auditoria'
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    creado = db.Column(db.DateTime, nullable=False, index=True)
+    usuario_id = db.Column(db.Integer)
+    metodo = db.Column(db.String(10), nullable=False)
+    accion = db.Column(db.String(80), nullable=False)   # endpoint de Flask, p. ej. admin.delete_estudiante
+    recurso_id = db.Column(db.String(40))
+    status_code = db.Column(db.Integer, nullable=False)
+    ip = db.Column(db.String(45))
+    detalle = db.Column(db.Text)  # JSON con el body (sin contraseñas)
+
+    __table_args__ = (
+        db.Index('ix_eventos_auditoria_usuario_creado', 'usuario_id', 'creado'),
+        db.Index('ix_eventos_auditoria_accion_creado', 'accion', 'creado'),
+    )
+
+
+class TareaMantenimiento(db.Model):
+    """Estado compartido de una tarea periódica (ver app/mantenimiento.py).
+
+    ``bloqueado_hasta`` es el lease: mientras no venza, ningún otro proceso
+    ejecuta la tarea.
+    """
+    __tablename__ = 'tareas_mantenimiento'
+    nombre = db.Column(db.String(60), primary_key=True)
+    proxima = db.Column(db.DateTime, nullable=False)
+    bloqueado_hasta = db.Column(db.DateTime)
+    dueno = db.Column(db.String(80))
+    ultimo_inicio = db.Column(db.DateTime)
+    ultima_duracion = db.Column(db.Float)
+    ultimo_estado = db.Column(db.String(10))  # ok | error
+    ultimo_resultado = db.Column(db.Text)     # JSON
+    ultimo_error = db.Column(db.Text)
+    ejecuciones = db.Column(db.Integer, nullable=False, default=0)
+    fallos = db.Column(db.Integer, nullable=False, default=0)
+
+
+class RegistroEliminado(db.Model):
+    """Lápida de una fila borrada de una tabla con feed de cambios (ver app/cambios.py).
+
+    ``registro_id`` NULL con ``periodo`` indica que se vació el periodo completo
+    (TRUNCATE de su partición).
+    """
+    __tablename__ = 'registros_eliminados'
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    tabla = db.Column(db.String(40), nullable=False)
+    registro_id = db.Column(db.Integer)
+    periodo = db.Column(db.String(30))
+    eliminado = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    transaccion = db.Column(db.BigInteger, nullable=False, default=MarcaTransaccion())
+
+    __table_args__ = (
+        db.Index('ix_registros_eliminados_tabla_transaccion', 'tabla', 'transaccion', 'id'),
+    )
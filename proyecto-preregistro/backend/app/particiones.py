@@ -0,0 +1,84 @@
+"""Particiones por periodo de ``preregistros`` y ``asistencias_feria`` (PostgreSQL).
+
+Las tablas se convierten con ``migracion_particiones_periodo.sql`` en tablas
+particionadas por LIST(periodo) con una partición DEFAULT. Este módulo crea la
+partición de un periodo nuevo (moviendo las filas que hubieran caído en la
+DEFAULT) y permite vaciar un periodo con TRUNCATE. En bases sin particionar
+(o en SQLite) todas las funciones son no-op y el código usa DELETE normal.
+"""
+import hashlib
+import logging
+import re
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+TABLAS = ('preregistros', 'asistencias_feria')
+
+_conocidas = set()
+
+
+def nombre_particion(tabla, periodo):
+    """Debe coincidir con la función usada en la migración SQL."""
+    slug = re.sub(r'[^a-z0-9]+', '_', periodo.lower()).strip('_')
+    return f"{tabla}_p_{slug}_{hashlib.md5(periodo.encode()).hexdigest()[:6]}"
+
+
+def esta_particionada(tabla, conn=None):
+    if db.engine.dialect.name != 'postgresql':
+        return False
+    conn = conn or db.session
+    return conn.execute(db.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt "
+        "JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :tabla)"
+    ), {'tabla': tabla}).scalar()
+
+
+def particion_existe(tabla, periodo, conn=None):
+    conn = conn or db.session
+    return conn.execute(db.text('SELECT to_regclass(:nombre) IS NOT NULL'),
+                        {'nombre': nombre_particion(tabla, periodo)}).scalar()
+
+
+def asegurar_particion(periodo):
+    """Crea (si falta) la partición del periodo en ambas tablas.
+
+    Se ejecuta en su propia transacción. Si la DEFAULT ya tiene filas de ese
+    periodo, se mueven a la partición nueva antes de adjuntarla.
+    """
+    if not periodo or periodo in _conocidas or db.engine.dialect.name != 'postgresql':
+        return
+    try:
+        with db.engine.begin() as conn:
+            for tabla in TABLAS:
+                if not esta_particionada(tabla, conn) or particion_existe(tabla, periodo, conn):
+                    continue
+                nombre = nombre_particion(tabla, periodo)
+                default = f'{tabla}_default'
+                conn.execute(db.text(f'LOCK TABLE {tabla} IN SHARE ROW EXCLUSIVE MODE'))
+                conn.execute(db.text(f'CREATE TABLE "{nombre}" (LIKE {tabla} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+                movidas = conn.execute(db.text(
+                    f'WITH movidas AS (DELETE FROM {default} WHERE periodo = :periodo RETURNING *) '
+                    f'INSERT INTO "{nombre}" SELECT * FROM movidas'
+                ), {'periodo': periodo}).rowcount
+                # DDL: el valor no puede ir como parámetro, se escapa como literal.
+                literal = periodo.replace("'", "''")
+                conn.exec_driver_sql(
+                    f'ALTER TABLE {tabla} ATTACH PARTITION "{nombre}" FOR VALUES IN (\'{literal}\')'
+                )
+                logger.info('Partición %s creada (%s filas movidas desde %s)', nombre, movidas, default)
+        _conocidas.add(periodo)
+    except Exception:
+        logger.exception('No se pudo crear la partición del periodo %s', periodo)
+
+
+def truncar_periodo(tabla, periodo):
+    """Vacía la partición del periodo con TRUNCATE dentro de la transacción de la
+    sesión. Devuelve el número de filas borradas, o None si no hay partición."""
+    if not esta_particionada(tabla) or not particion_existe(tabla, periodo):
+        return None
+    nombre = nombre_particion(tabla, periodo)
+    total = db.session.execute(db.text(f'SELECT count(*) FROM "{nombre}"')).scalar()
+    db.session.execute(db.text(f'TRUNCATE TABLE "{nombre}"'))
+    return total
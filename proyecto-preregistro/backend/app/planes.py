@@ -0,0 +1,174 @@
+"""Snapshots de planes de ejecución para las queries calientes.
+
+Ejecuta los endpoints clave sobre una base poblada (``flask seed-data``),
+captura cada sentencia SQL que emiten y obtiene su ``EXPLAIN (FORMAT JSON)``.
+Los planes se normalizan a su forma (tipo de nodo, tabla, índice) sin costos
+ni estimaciones, para que el snapshot sea estable entre corridas y solo cambie
+cuando cambia la estrategia de ejecución. Solo PostgreSQL.
+"""
+import hashlib
+import re
+
+from flask_jwt_extended import create_access_token
+
+from app import db, limiter
+from app.benchmark import capturar_queries, preparar_contexto, escenarios, _restaurar
+from app.models import Usuario, Estudiante, Servicio, PreRegistro, AsistenciaFeria
+from app.seeder import PREFIJO
+
+# Escenarios de app.benchmark incluidos en el snapshot (más create_preregistro).
+ESCENARIOS = (
+    'login', 'checkin', 'get_servicios', 'get_preregistros', 'dashboard_stats',
+    'dashboard_stats_periodo', 'reporte_preregistros', 'reporte_estudiantes',
+)
+
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_ESPACIOS = re.compile(r'\s+')
+
+
+def normalizar_sql(sql):
+    sql = _LITERALES.sub('?', sql)
+    return _ESPACIOS.sub(' ', sql).strip()
+
+
+def huella(sql):
+    return hashlib.sha1(normalizar_sql(sql).encode()).hexdigest()[:12]
+
+
+def forma_plan(nodo):
+    """Reduce un nodo de EXPLAIN JSON a su forma: tipo, relación, índice e hijos."""
+    forma = {'nodo': nodo['Node Type']}
+    for clave, destino in (('Relation Name', 'tabla'), ('Index Name', 'indice'),
+                           ('Join Type', 'join'), ('Strategy', 'estrategia')):
+        if clave in nodo:
+            forma[destino] = nodo[clave]
+    hijos = [forma_plan(h) for h in nodo.get('Plans', [])]
+    if hijos:
+        forma['hijos'] = hijos
+    return forma
+
+
+def recorrer(forma):
+    yield forma
+    for hijo in forma.get('hijos', []):
+        yield from recorrer(hijo)
+
+
+def seq_scans(forma):
+    return {n['tabla'] for n in recorrer(forma) if n['nodo'] == 'Seq Scan' and 'tabla' in n}
+
+
+def indices(forma):
+    return {n['indice'] for n in recorrer(forma) if 'indice' in n}
+
+
+def tamanos_tablas():
+    filas = db.session.execute(db.text(
+        "SELECT relname, reltuples::bigint FROM pg_class "
+        "WHERE relkind IN ('r', 'p') AND relnamespace = 'public'::regnamespace"
+    )).all()
+    return {nombre: max(int(n), 0) for nombre, n in filas}
+
+
+def _explicar(conn, sentencia, parametros):
+    # EXPLAIN sin ANALYZE: no ejecuta la sentencia, también es seguro para DML.
+    resultado = conn.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {sentencia}', parametros).scalar()
+    return forma_plan(resultado[0]['Plan'])
+
+
+def _escenario_inscripcion(ctx):
+    """Petición de create_preregistro que recorre todas las validaciones y luego se revierte."""
+    periodo = ctx['periodo']
+    servicio = Servicio.query.filter(Servicio.crn.startswith(f'{PREFIJO}-'), Servicio.periodo == periodo)\
+        .order_by(Servicio.id).first()
+    con_servicio = db.session.query(PreRegistro.estudiante_id).join(Servicio).filter(Servicio.periodo == periodo)
+    estudiante_id = db.session.query(Estudiante.id)\
+        .join(AsistenciaFeria, AsistenciaFeria.estudiante_id == Estudiante.id)\
+        .filter(Estudiante.matricula.startswith('b'), ~Estudiante.id.in_(con_servicio)).limit(1).scalar()
+    Servicio.query.filter_by(id=servicio.id).update({'cupo_maximo': Servicio.cupo_maximo + 1})
+    db.session.commit()
+    becario = Usuario.query.filter_by(username=f'{PREFIJO}_becario').first()
+    headers = {'Authorization': f'Bearer {create_access_token(identity=becario.id)}'}
+
+    def deshacer():
+        PreRegistro.query.filter_by(estudiante_id=estudiante_id, servicio_id=servicio.id)\
+            .delete(synchronize_session=False)
+        Servicio.query.filter_by(id=servicio.id).update({'cupo_maximo': Servicio.cupo_maximo - 1})
+        db.session.commit()
+
+    peticion = ('POST', '/api/preregistros', {
+        'json': {'estudiante_id': estudiante_id, 'crn': servicio.crn}, 'headers': headers})
+    return peticion, deshacer
+
+
+def capturar(app, log=print):
+    """Devuelve ``{endpoint: {huella: {'sql', 'plan'}}}`` para los endpoints clave."""
+    if db.engine.dialect.name != 'postgresql':
+        raise RuntimeError('Los snapshots de planes requieren PostgreSQL')
+
+    limiter.enabled = False
+    # Con PREPARE/EXECUTE las consultas de app/consultas.py llegarían como ``EXECUTE q_*``,
+    # que no se puede explicar: se capturan como SELECT normales con sus parámetros.
+    preparadas = app.config.get('CONSULTAS_PREPARADAS', True)
+    app.config['CONSULTAS_PREPARADAS'] = False
+    client = app.test_client()
+    ctx = preparar_contexto()
+    peticiones = [(n, p(0)) for n, iteraciones, p in escenarios(ctx) if n in ESCENARIOS and iteraciones]
+    inscripcion, deshacer = _escenario_inscripcion(ctx)
+    peticiones.append(('create_preregistro', inscripcion))
+
+    snapshot = {}
+    try:
+        for nombre, (metodo, url, kwargs) in peticiones:
+            with capturar_queries(guardar=True) as contador:
+                client.open(url, method=metodo, **kwargs)
+            planes = {}
+            with db.engine.connect() as conn:
+                for sentencia, parametros in contador.sentencias:
+                    h = huella(sentencia)
+                    if h in planes or isinstance(parametros, list) or not sentencia.lstrip().upper().startswith(
+                            ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')):
+                        continue
+                    planes[h] = {'sql': normalizar_sql(sentencia), 'plan': _explicar(conn, sentencia, parametros)}
+                conn.rollback()
+            snapshot[nombre] = planes
+            log(f'{nombre:<26} {len(contador.sentencias):>5} sentencias, {len(planes)} distintas')
+    finally:
+        db.session.rollback()
+        deshacer()
+        _restaurar(ctx)
+        limiter.enabled = True
+        app.config['CONSULTAS_PREPARADAS'] = preparadas
+    return snapshot
+
+
+def comparar(actual, anterior, tamanos, min_filas=10000):
+    """Compara dos snapshots. Devuelve ``(regresiones, avisos)``.
+
+    Regresión: un Seq Scan nuevo sobre una tabla con al menos ``min_filas``
+    filas, o un índice que el plan anterior usaba y el actual ya no.
+    Aviso: queries nuevas o que desaparecieron y cualquier otro cambio de forma.
+    """
+    regresiones, avisos = [], []
+    for endpoint, planes in actual.items():
+        previos = anterior.get(endpoint)
+        if previos is None:
+            avisos.append(f'{endpoint}: endpoint sin snapshot previo')
+            continue
+        for h, q in planes.items():
+            grandes = {t for t in seq_scans(q['plan']) if tamanos.get(t, 0) >= min_filas}
+            previo = previos.get(h)
+            if previo is None:
+                avisos.append(f'{endpoint}: query nueva {h}: {q["sql"][:100]}')
+                for t in sorted(grandes):
+                    regresiones.append(f'{endpoint} [{h}]: Seq Scan sobre {t} ({tamanos[t]} filas) en query nueva')
+                continue
+            for t in sorted(grandes - seq_scans(previo['plan'])):
+                regresiones.append(f'{endpoint} [{h}]: nuevo Seq Scan sobre {t} ({tamanos[t]} filas)')
+            for i in sorted(indices(previo['plan']) - indices(q['plan'])):
+                regresiones.append(f'{endpoint} [{h}]: ya no usa el índice {i}')
+            if previo['plan'] != q['plan']:
+                avisos.append(f'{endpoint} [{h}]: cambió la forma del plan')
+        for h in previos.keys() - planes.keys():
+            avisos.append(f'{endpoint}: ya no se ejecuta la query {h}')
+    return regresiones, avisos
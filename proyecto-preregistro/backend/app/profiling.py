@@ -0,0 +1,112 @@
+"""Perfilado bajo demanda de peticiones individuales (solo Admin).
+
+Se activa enviando el header ``X-Profile: 1`` o el parámetro ``?__profile=1``.
+Sin el disparador el costo es una búsqueda en los headers/args de la petición.
+El resultado se guarda como archivo ``.pstats`` en ``PROFILE_DIR`` y se puede
+abrir con ``python -m pstats``, snakeviz o flameprof (flame graph).
+"""
+import cProfile
+import os
+import re
+import time
+from datetime import datetime
+
+from flask import g, request, current_app
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_ARG = '__profile'
+_NOMBRE_VALIDO = re.compile(r'^[\w.-]+\.pstats$')
+
+
+def _solicitado():
+    return request.headers.get(PROFILE_HEADER) == '1' or request.args.get(PROFILE_ARG) == '1'
+
+
+def _es_admin():
+    from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+    from app.models import Usuario
+
+    try:
+        verify_jwt_in_request(optional=True)
+    except Exception:
+        return False
+    user_id = get_jwt_identity()
+    if not user_id:
+        return False
+    user = Usuario.query.get(user_id)
+    return bool(user and user.rol == 'Admin')
+
+
+def profile_dir(app=None):
+    app = app or current_app
+    path = app.config.get('PROFILE_DIR') or os.path.join(app.instance_path, 'profiles')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def nombre_valido(nombre):
+    return bool(_NOMBRE_VALIDO.match(nombre))
+
+
+def listar_perfiles():
+    path = profile_dir()
+    perfiles = []
+    for nombre in os.listdir(path):
+        if not nombre_valido(nombre):
+            continue
+        stat = os.stat(os.path.join(path, nombre))
+        perfiles.append({
+            'nombre': nombre,
+            'tamano': stat.st_size,
+            'creado': datetime.fromtimestamp(stat.st_mtime).isoformat(),
+        })
+    perfiles.sort(key=lambda p: p['creado'], reverse=True)
+    return perfiles
+
+
+def _purgar_antiguos(path, maximo):
+    archivos = sorted(
+        (os.path.join(path, n) for n in os.listdir(path) if nombre_valido(n)),
+        key=os.path.getmtime,
+    )
+    for archivo in archivos[:max(0, len(archivos) - maximo)]:
+        try:
+            os.remove(archivo)
+        except OSError:
+            pass
+
+
+def init_profiler(app):
+    @app.before_request
+    def _iniciar_perfil():
+        if not _solicitado() or not _es_admin():
+            return
+        perfil = cProfile.Profile()
+        g._perfil = perfil
+        g._perfil_inicio = time.perf_counter()
+        perfil.enable()
+
+    @app.after_request
+    def _guardar_perfil(response):
+        perfil = g.pop('_perfil', None)
+        if perfil is None:
+            return response
+        perfil.disable()
+        duracion_ms = (time.perf_counter() - g.pop('_perfil_inicio')) * 1000
+
+        endpoint = (request.endpoint or 'desconocido').replace('.', '-')
+        nombre = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}_{endpoint}_{int(duracion_ms)}ms.pstats"
+        path = profile_dir()
+        perfil.dump_stats(os.path.join(path, nombre))
+        _purgar_antiguos(path, app.config.get('PROFILE_MAX_FILES', 200))
+
+        response.headers['X-Profile-Id'] = nombre
+        return response
+
+    @app.teardown_request
+    def _detener_perfil(exc):
+        # Si la petición terminó con una excepción no manejada, el perfil
+        # sigue activo en el hilo: se detiene sin guardarlo.
+        perfil = g.pop('_perfil', None)
+        if perfil is not None:
+            perfil.disable()
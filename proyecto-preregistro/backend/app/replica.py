@@ -0,0 +1,123 @@
+"""Enrutamiento de lecturas pesadas a una réplica de solo lectura.
+
+Con ``DATABASE_REPLICA_URL`` configurada, ``SQLALCHEMY_BINDS['replica']``
+crea un segundo engine. Los endpoints marcados con ``@lectura_replica``
+(dashboard, reportes, estadísticas de socios) ejecutan sus SELECT en la
+réplica a través de ``SesionEnrutada.get_bind``; los flush y las sentencias
+DML siempre van a la primaria.
+
+La réplica se usa solo si:
+
+- su retraso es como mucho ``REPLICA_MAX_LAG`` segundos (se mide como mucho
+  cada ``REPLICA_LAG_CHECK`` segundos por proceso), y
+- no falló en los últimos ``REPLICA_REINTENTO`` segundos. Si una consulta
+  falla en la réplica, el endpoint se vuelve a ejecutar en la primaria.
+
+La respuesta lleva ``X-Origen-Lectura: replica|primaria``.
+
+Este módulo no importa ``app.db``: la sesión se construye al crear ``db``.
+"""
+import logging
+import time
+from functools import wraps
+
+from flask import g, current_app, has_app_context, make_response
+from flask_sqlalchemy.session import Session
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+logger = logging.getLogger(__name__)
+
+BIND = 'replica'
+
+_estado = {'lag': None, 'revisar_en': 0.0, 'caida_hasta': 0.0}
+
+_SQL_LAG_PG = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class SesionEnrutada(Session):
+    """Sesión que manda los SELECT a la réplica mientras ``g.usar_replica`` está activo."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._leer_de_replica(clause):
+            return self._db.engines[BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _leer_de_replica(self, clause):
+        if self._flushing or not has_app_context() or not g.get('usar_replica'):
+            return False
+        return not getattr(clause, 'is_dml', False)
+
+
+def _db():
+    return current_app.extensions['sqlalchemy']
+
+
+def configurada():
+    return BIND in _db().engines
+
+
+def medir_lag(engine):
+    """Segundos de retraso de la réplica (0 si no es PostgreSQL en recuperación)."""
+    if engine.dialect.name != 'postgresql':
+        return 0.0
+    with engine.connect() as conn:
+        return float(conn.execute(_SQL_LAG_PG).scalar() or 0)
+
+
+def marcar_caida():
+    _estado['caida_hasta'] = time.monotonic() + current_app.config.get('REPLICA_REINTENTO', 30)
+    _estado['lag'] = None
+    _estado['revisar_en'] = 0.0
+
+
+def disponible():
+    if not configurada():
+        return False
+    ahora = time.monotonic()
+    if ahora < _estado['caida_hasta']:
+        return False
+    if ahora >= _estado['revisar_en']:
+        try:
+            _estado['lag'] = medir_lag(_db().engines[BIND])
+        except DBAPIError:
+            logger.warning('Réplica no disponible; las lecturas van a la primaria', exc_info=True)
+            marcar_caida()
+            return False
+        _estado['revisar_en'] = ahora + current_app.config.get('REPLICA_LAG_CHECK', 5)
+    return _estado['lag'] is not None and _estado['lag'] <= current_app.config.get('REPLICA_MAX_LAG', 10)
+
+
+def lectura_replica(fn):
+    """Decorator para endpoints de solo lectura. Va debajo de ``role_required``
+    y encima de ``etag_versionado``, para que el ETag se calcule con las
+    versiones de la misma base que responde."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not disponible():
+            response = make_response(fn(*args, **kwargs))
+            response.headers['X-Origen-Lectura'] = 'primaria'
+            return response
+
+        g.usar_replica = True
+        try:
+            response = make_response(fn(*args, **kwargs))
+            origen = 'replica'
+        except DBAPIError as e:
+            if getattr(getattr(e, 'orig', None), 'pgcode', None) == '57014':
+                raise  # statement_timeout del carril: la réplica está bien, la consulta es cara
+            logger.warning('Falló la lectura en la réplica; se repite en la primaria', exc_info=True)
+            marcar_caida()
+            _db().session.rollback()
+            g.usar_replica = False
+            response = make_response(fn(*args, **kwargs))
+            origen = 'primaria'
+        finally:
+            g.usar_replica = False
+        response.headers['X-Origen-Lectura'] = origen
+        return response
+    return wrapper
@@ -1,9 +1,19 @@
-from flask import Blueprint, request, jsonify, Response
+from flask import Blueprint, request, jsonify, Response, send_from_directory, stream_with_context, current_app
 from app import db
-from app.models import Estudiante, Servicio, PreRegistro, AsistenciaFeria, Carrera, SocioFormador, Usuario
+from app.models import (
+    Estudiante, Servicio, PreRegistro, AsistenciaFeria, Carrera, SocioFormador, Usuario,
+    PreferenciaServicio, VentanaAsignacion, HorarioFeria, EventoFeria, EventoAuditoria,
+)
 from app.middleware import role_required
+from app.profiling import listar_perfiles, nombre_valido, profile_dir
+from app.http_cache import etag_versionado
+from app.replica import lectura_replica
+from app import serializers
+from app import catalogos, particiones, versiones, archivo, asignacion, horarios, eventos, auditoria, mantenimiento, cambios, carriles
 from io import StringIO, BytesIO
+from datetime import datetime
 import csv
+import json
 import bcrypt
 
 admin_bp = Blueprint('admin', __name__)
@@ -22,6 +32,7 @@ def paginate_query(query, page=1, per_page=20):
 
 @admin_bp.route('/dashboard/stats', methods=['GET'])
 @role_required('Admin')
+@lectura_replica
 def get_stats():
     periodo = request.args.get('periodo')
 
@@ -29,18 +40,24 @@ def get_stats():
 
     if periodo:
         total_asistencias = AsistenciaFeria.query.filter_by(periodo=periodo).count()
-        total_preregistros = PreRegistro.query.join(Servicio).filter(Servicio.periodo == periodo).count()
+        total_preregistros = PreRegistro.query.filter_by(periodo=periodo).count()
         servicios_activos = Servicio.query.filter_by(periodo=periodo).count()
     else:
         total_asistencias = AsistenciaFeria.query.count()
         total_preregistros = PreRegistro.query.count()
         servicios_activos = Servicio.query.count()
 
-    # Asistencias por horario
-    asistencias_horario = db.session.query(
-        AsistenciaFeria.horario_seleccionado,
-        db.func.count(AsistenciaFeria.id)
-    ).group_by(AsistenciaFeria.horario_seleccionado).all()
+    # Asistencias por horario: con bloques definidos es una lectura de los contadores
+    bloques = horarios.disponibilidad(periodo) if periodo else []
+    if bloques:
+        asistencias_horario = [
+            {'horario': h.etiqueta, 'total': h.ocupados, 'capacidad': h.capacidad} for h in bloques
+        ]
+    else:
+        asistencias_horario = [{'horario': h, 'total': t} for h, t in db.session.query(
+            AsistenciaFeria.horario_seleccionado,
+            db.func.count(AsistenciaFeria.id)
+        ).group_by(AsistenciaFeria.horario_seleccionado).all()]
 
     # Ocupación por periodo
     ocupacion_q = db.session.query(
@@ -105,8 +122,7 @@ def get_stats():
     ).join(Estudiante, Estudiante.carrera_id == Carrera.id)\
      .join(PreRegistro, PreRegistro.estudiante_id == Estudiante.id)
     if periodo:
-        preregistros_carrera_q = preregistros_carrera_q.join(Servicio, Servicio.id == PreRegistro.servicio_id)\
-            .filter(Servicio.periodo == periodo)
+        preregistros_carrera_q = preregistros_carrera_q.filter(PreRegistro.periodo == periodo)
     preregistros_carrera = preregistros_carrera_q\
         .group_by(Carrera.id, Carrera.abreviatura, Carrera.nombre)\
         .order_by(db.func.count(PreRegistro.id).desc()).all()
@@ -116,8 +132,7 @@ def get_stats():
         db.func.date(PreRegistro.fecha_registro), db.func.count(PreRegistro.id)
     )
     if periodo:
-        tendencia_q = tendencia_q.join(Servicio, Servicio.id == PreRegistro.servicio_id)\
-            .filter(Servicio.periodo == periodo)
+        tendencia_q = tendencia_q.filter(PreRegistro.periodo == periodo)
     tendencia = tendencia_q.group_by(db.func.date(PreRegistro.fecha_registro))\
         .order_by(db.func.date(PreRegistro.fecha_registro)).all()
 
@@ -130,16 +145,14 @@ def get_stats():
     estatus_dist = estatus_dist_q.group_by(AsistenciaFeria.estatus_asistencia).all()
 
     # Periodos disponibles
-    periodos_disponibles = [p[0] for p in db.session.query(Servicio.periodo).distinct().order_by(Servicio.periodo).all()]
+    periodos_disponibles = catalogos.periodos()
 
     return jsonify({
         'total_registrados': total_registrados,
         'total_asistencias_feria': total_asistencias,
         'total_preregistros': total_preregistros,
         'servicios_activos': servicios_activos,
-        'asistencias_por_horario': [
-            {'horario': h, 'total': t} for h, t in asistencias_horario
-        ],
+        'asistencias_por_horario': asistencias_horario,
         'ocupacion_por_periodo': [
             {
                 'periodo': p,
@@ -184,14 +197,20 @@ def get_stats():
 
 @admin_bp.route('/reportes/estudiantes', methods=['GET'])
 @role_required('Admin')
+@lectura_replica
 def reporte_estudiantes():
     formato = request.args.get('formato', 'csv')
     carrera = request.args.get('carrera', '').strip()
 
-    query = Estudiante.query.join(Carrera).join(Usuario).order_by(Estudiante.nombre_completo)
+    stmt = db.select(
+        Estudiante.nombre_completo, Estudiante.matricula, Carrera.nombre.label('carrera'),
+        Estudiante.celular, Estudiante.correo_alterno,
+    ).join(Carrera, Carrera.id == Estudiante.carrera_id)\
+        .join(Usuario, Usuario.id == Estudiante.usuario_id)\
+        .order_by(Estudiante.nombre_completo)
     if carrera:
-        query = query.filter(Carrera.nombre.ilike(f'%{carrera}%'))
-    estudiantes = query.all()
+        stmt = stmt.where(Carrera.nombre.ilike(f'%{carrera}%'))
+    estudiantes = db.session.execute(stmt).all()
 
     if formato == 'excel':
         try:
@@ -202,8 +221,7 @@ def reporte_estudiantes():
             ws.append(['Nombre', 'Matrícula', 'Carrera', 'Celular', 'Correo Alterno'])
             for e in estudiantes:
                 ws.append([
-                    e.nombre_completo, e.matricula,
-                    e.carrera.nombre if e.carrera else '',
+                    e.nombre_completo, e.matricula, e.carrera or '',
                     e.celular or '', e.correo_alterno or '',
                 ])
             output = BytesIO()
@@ -223,8 +241,7 @@ def reporte_estudiantes():
     writer.writerow(['Nombre', 'Matrícula', 'Carrera', 'Celular', 'Correo Alterno'])
     for e in estudiantes:
         writer.writerow([
-            e.nombre_completo, e.matricula,
-            e.carrera.nombre if e.carrera else '',
+            e.nombre_completo, e.matricula, e.carrera or '',
             e.celular or '', e.correo_alterno or '',
         ])
 
@@ -237,6 +254,7 @@ def reporte_estudiantes():
 
 @admin_bp.route('/reportes/preregistros', methods=['GET'])
 @role_required('Admin')
+@lectura_replica
 def reporte_preregistros():
     formato = request.args.get('formato', 'csv')
     periodo = request.args.get('periodo', '').strip()
@@ -244,31 +262,32 @@ def reporte_preregistros():
     socio_formador = request.args.get('socio_formador', '').strip()
     crn = request.args.get('crn', '').strip()
 
-    query = PreRegistro.query.join(Estudiante).join(Servicio).join(
-        Carrera, Estudiante.carrera_id == Carrera.id
-    )
+    stmt = db.select(
+        Estudiante.nombre_completo, Estudiante.matricula, Carrera.nombre.label('carrera'),
+        Servicio.crn, Servicio.descripcion, PreRegistro.periodo, PreRegistro.fecha_registro,
+    ).join(Estudiante, Estudiante.id == PreRegistro.estudiante_id)\
+        .join(Servicio, Servicio.id == PreRegistro.servicio_id)\
+        .join(Carrera, Estudiante.carrera_id == Carrera.id)
     if periodo:
-        query = query.filter(Servicio.periodo == periodo)
+        stmt = stmt.where(PreRegistro.periodo == periodo)
     if carrera:
-        query = query.filter(Carrera.nombre.ilike(f'%{carrera}%'))
+        stmt = stmt.where(Carrera.nombre.ilike(f'%{carrera}%'))
     if crn:
-        query = query.filter(Servicio.crn.ilike(f'%{crn}%'))
+        stmt = stmt.where(Servicio.crn.ilike(f'%{crn}%'))
     if socio_formador:
-        query = query.join(SocioFormador, SocioFormador.id == Servicio.socio_formador_id)\
-            .filter(SocioFormador.nombre.ilike(f'%{socio_formador}%'))
-    registros = query.order_by(PreRegistro.fecha_registro.desc()).all()
-
-    rows = []
-    for r in registros:
-        rows.append([
-            r.estudiante.nombre_completo,
-            r.estudiante.matricula,
-            r.estudiante.carrera.nombre if r.estudiante.carrera else '',
-            r.servicio.crn,
-            r.servicio.descripcion,
-            r.servicio.periodo,
-            r.fecha_registro.strftime('%Y-%m-%d %H:%M') if r.fecha_registro else '',
-        ])
+        stmt = stmt.join(SocioFormador, SocioFormador.id == Servicio.socio_formador_id)\
+            .where(SocioFormador.nombre.ilike(f'%{socio_formador}%'))
+    stmt = stmt.order_by(PreRegistro.fecha_registro.desc())
+
+    rows = [[
+        r.nombre_completo,
+        r.matricula,
+        r.carrera or '',
+        r.crn,
+        r.descripcion,
+        r.periodo,
+        r.fecha_registro.strftime('%Y-%m-%d %H:%M') if r.fecha_registro else '',
+    ] for r in db.session.execute(stmt)]
 
     headers_row = ['Nombre', 'Matrícula', 'Carrera', 'CRN', 'Servicio', 'Periodo', 'Fecha Registro']
 
@@ -307,9 +326,9 @@ def reporte_preregistros():
 
 # Endpoint adicional: carreras (público, para el registro)
 @admin_bp.route('/carreras', methods=['GET'])
+@etag_versionado('carreras')
 def get_carreras():
-    carreras = Carrera.query.order_by(Carrera.nombre).all()
-    return jsonify([{'id': c.id, 'nombre': c.nombre, 'abreviatura': c.abreviatura} for c in carreras])
+    return jsonify(catalogos.carreras())
 
 
 # ═══════════════════════════════════════════
@@ -335,16 +354,45 @@ def reset_user_password(id):
 #   GESTIÓN ESTUDIANTES
 # ═══════════════════════════════════════════
 
+# Columnas de cada campo de ``?fields=`` en el listado de estudiantes. El join
+# con usuarios se reemplaza por ``usuario_id IS NOT NULL`` cuando no se pide
+# el username (mismas filas: la llave foránea garantiza que el usuario existe).
+_COLUMNAS_ESTUDIANTE = {
+    'id': (Estudiante.id, ()),
+    'nombre_completo': (Estudiante.nombre_completo, ()),
+    'matricula': (Estudiante.matricula, ()),
+    'carrera': (Carrera.nombre.label('carrera'), ('carrera',)),
+    'carrera_id': (Estudiante.carrera_id, ()),
+    'celular': (Estudiante.celular, ()),
+    'correo_alterno': (Estudiante.correo_alterno, ()),
+    'username': (Usuario.username, ('usuario',)),
+    'usuario_id': (Estudiante.usuario_id, ()),
+}
+_JOINS_ESTUDIANTE = [
+    ('carrera', Carrera, Carrera.id == Estudiante.carrera_id, False),
+    ('usuario', Usuario, Usuario.id == Estudiante.usuario_id, False),
+]
+
+
 @admin_bp.route('/admin/estudiantes', methods=['GET'])
 @role_required('Admin')
 def get_estudiantes():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     q = request.args.get('q', '').strip()
-
-    query = Estudiante.query.join(Carrera).join(Usuario).order_by(Estudiante.nombre_completo)
+    try:
+        campos = catalogos.campos_pedidos(request.args.get('fields'), list(serializers.CAMPOS_ESTUDIANTE))
+    except catalogos.CamposInvalidos as e:
+        return jsonify({'error': str(e)}), 400
+
+    necesarios = {'usuario'} if q else set()
+    stmt = catalogos.seleccionar(Estudiante, _COLUMNAS_ESTUDIANTE, campos or list(_COLUMNAS_ESTUDIANTE),
+                                 _JOINS_ESTUDIANTE, necesarios)\
+        .order_by(Estudiante.nombre_completo)
+    if 'usuario' not in necesarios and campos is not None and 'username' not in campos:
+        stmt = stmt.where(Estudiante.usuario_id.isnot(None))
     if q:
-        query = query.filter(
+        stmt = stmt.where(
             db.or_(
                 Estudiante.nombre_completo.ilike(f'%{q}%'),
                 Estudiante.matricula.ilike(f'%{q}%'),
@@ -352,21 +400,12 @@ def get_estudiantes():
             )
         )
 
-    items, pagination = paginate_query(query, page, per_page)
-    return jsonify({
-        'data': [{
-            'id': e.id,
-            'nombre_completo': e.nombre_completo,
-            'matricula': e.matricula,
-            'carrera': e.carrera.nombre if e.carrera else '',
-            'carrera_id': e.carrera_id,
-            'celular': e.celular or '',
-            'correo_alterno': e.correo_alterno or '',
-            'username': e.usuario.username if e.usuario else '',
-            'usuario_id': e.usuario_id,
-        } for e in items],
-        'pagination': pagination,
-    })
+    filas, pagination = catalogos.paginar_select(stmt, page, per_page)
+    if campos is None:
+        data = [serializers.estudiante(e) for e in filas]
+    else:
+        data = [serializers.proyectar(e, campos, serializers.CAMPOS_ESTUDIANTE) for e in filas]
+    return jsonify({'data': data, 'pagination': pagination})
 
 
 @admin_bp.route('/admin/estudiantes', methods=['POST'])
@@ -454,7 +493,9 @@ def delete_estudiante(id):
     usuario_id = estudiante.usuario_id
 
     PreRegistro.query.filter_by(estudiante_id=id).delete()
+    horarios.liberar_asistencias(AsistenciaFeria.estudiante_id == id)
     AsistenciaFeria.query.filter_by(estudiante_id=id).delete()
+    PreferenciaServicio.query.filter_by(estudiante_id=id).delete()
     db.session.delete(estudiante)
 
     if usuario_id:
@@ -523,8 +564,7 @@ def delete_becario(id):
 @admin_bp.route('/admin/carreras', methods=['GET'])
 @role_required('Admin')
 def get_carreras_admin():
-    carreras = Carrera.query.order_by(Carrera.nombre).all()
-    return jsonify([{'id': c.id, 'nombre': c.nombre, 'abreviatura': c.abreviatura} for c in carreras])
+    return jsonify(catalogos.carreras())
 
 
 @admin_bp.route('/admin/carreras', methods=['POST'])
@@ -596,6 +636,515 @@ def reboot_feria():
     if not periodo:
         return jsonify({'error': 'El periodo es requerido'}), 400
 
-    deleted = AsistenciaFeria.query.filter_by(periodo=periodo).delete()
-    db.session.commit()
+    # Con tablas particionadas el periodo completo se vacía con TRUNCATE de su partición.
+    deleted = particiones.truncar_periodo('asistencias_feria', periodo)
+    if deleted is None:
+        deleted = AsistenciaFeria.query.filter_by(periodo=periodo).delete()
+        HorarioFeria.query.filter_by(periodo=periodo).update({HorarioFeria.ocupados: 0})
+        db.session.commit()
+    else:
+        HorarioFeria.query.filter_by(periodo=periodo).update({HorarioFeria.ocupados: 0})
+        cambios.registrar_vaciado('asistencias_feria', periodo)
+        versiones.incrementar({'asistencias_feria'})  # TRUNCATE no pasa por los eventos del ORM
+        db.session.commit()
     return jsonify({'message': f'Se eliminaron {deleted} registros de asistencia del periodo {periodo}', 'deleted': deleted})
+
+
+# ═══════════════════════════════════════════
+#   PERFILES DE RENDIMIENTO
+# ═══════════════════════════════════════════
+
+@admin_bp.route('/admin/perfiles', methods=['GET'])
+@role_required('Admin')
+def get_perfiles():
+    return jsonify(listar_perfiles())
+
+
+@admin_bp.route('/admin/perfiles/<nombre>', methods=['GET'])
+@role_required('Admin')
+def descargar_perfil(nombre):
+    if not nombre_valido(nombre):
+        return jsonify({'error': 'Nombre de perfil inválido'}), 400
+    return send_from_directory(profile_dir(), nombre, as_attachment=True)
+
+
+# ═══════════════════════════════════════════
+#   ARCHIVO DE PERIODOS
+# ═══════════════════════════════════════════
+
+@admin_bp.route('/admin/archivo', methods=['GET'])
+@role_required('Admin')
+def get_archivos():
+    return jsonify(archivo.listar_archivos())
+
+
+@admin_bp.route('/admin/archivo', methods=['POST'])
+@role_required('Admin')
+def archivar_periodo():
+    data = request.get_json() or {}
+    periodo = data.get('periodo', '').strip()
+    if not periodo:
+        return jsonify({'error': 'El periodo es requerido'}), 400
+    try:
+        meta = archivo.archivar(periodo)
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify({'message': f'Periodo {periodo} archivado', **meta}), 201
+
+
+@admin_bp.route('/admin/archivo/restaurar', methods=['POST'])
+@role_required('Admin')
+def restaurar_periodo():
+    data = request.get_json() or {}
+    periodo = data.get('periodo', '').strip()
+    if not periodo:
+        return jsonify({'error': 'El periodo es requerido'}), 400
+    try:
+        resultado = archivo.restaurar(periodo)
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify({'message': f'Periodo {periodo} restaurado', **resultado})
+
+
+@admin_bp.route('/admin/archivo/reporte', methods=['GET'])
+@role_required('Admin')
+def reporte_archivado():
+    periodo = request.args.get('periodo', '').strip()
+    rows = archivo.filas_reporte(periodo) if periodo else None
+    if rows is None:
+        return jsonify({'error': 'Periodo no archivado'}), 404
+
+    output = StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['Nombre', 'Matrícula', 'Carrera', 'CRN', 'Servicio', 'Periodo', 'Fecha Registro'])
+    for row in rows:
+        writer.writerow(row)
+
+    return Response(
+        output.getvalue(),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={archivo.nombre_archivo(periodo)[:-8]}.csv'},
+    )
+
+
+@admin_bp.route('/admin/archivo/descargar', methods=['GET'])
+@role_required('Admin')
+def descargar_archivo():
+    periodo = request.args.get('periodo', '').strip()
+    if not periodo:
+        return jsonify({'error': 'El periodo es requerido'}), 400
+    return send_from_directory(archivo.archivo_dir(), archivo.nombre_archivo(periodo), as_attachment=True)
+
+
+# ═══════════════════════════════════════════
+#   ASIGNACIÓN POR PREFERENCIAS
+# ═══════════════════════════════════════════
+
+def _ventana_dict(v):
+    return {
+        'id': v.id,
+        'periodo': v.periodo,
+        'abre': v.abre.isoformat(),
+        'cierra': v.cierra.isoformat(),
+        'estado': v.estado,
+        'preferencias': PreferenciaServicio.query.filter_by(periodo=v.periodo).count(),
+        'ejecutada_en': v.ejecutada_en.isoformat() if v.ejecutada_en else None,
+        'resumen': json.loads(v.resumen) if v.resumen else None,
+    }
+
+
+@admin_bp.route('/admin/asignacion/ventanas', methods=['GET'])
+@role_required('Admin')
+def get_ventanas_asignacion():
+    ventanas = VentanaAsignacion.query.order_by(VentanaAsignacion.periodo.desc()).all()
+    return jsonify([_ventana_dict(v) for v in ventanas])
+
+
+@admin_bp.route('/admin/asignacion/ventanas', methods=['POST'])
+@role_required('Admin')
+def create_ventana_asignacion():
+    data = request.get_json() or {}
+    periodo = (data.get('periodo') or '').strip()
+    try:
+        abre = datetime.fromisoformat(data.get('abre', ''))
+        cierra = datetime.fromisoformat(data.get('cierra', ''))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'abre y cierra deben ser fechas ISO 8601'}), 400
+    if not periodo:
+        return jsonify({'error': 'El periodo es requerido'}), 400
+    if cierra <= abre:
+        return jsonify({'error': 'La ventana debe cerrar después de abrir'}), 400
+    if VentanaAsignacion.query.filter_by(periodo=periodo).first():
+        return jsonify({'error': 'El periodo ya tiene ventana de asignación'}), 409
+
+    ventana = VentanaAsignacion(periodo=periodo, abre=abre, cierra=cierra, estado='abierta')
+    db.session.add(ventana)
+    db.session.commit()
+    return jsonify(_ventana_dict(ventana)), 201
+
+
+@admin_bp.route('/admin/asignacion/ventanas/<int:id>', methods=['PUT'])
+@role_required('Admin')
+def update_ventana_asignacion(id):
+    ventana = VentanaAsignacion.query.get_or_404(id)
+    if ventana.estado != 'abierta':
+        return jsonify({'error': 'La asignación ya se ejecutó'}), 409
+    data = request.get_json() or {}
+    try:
+        if 'abre' in data:
+            ventana.abre = datetime.fromisoformat(data['abre'])
+        if 'cierra' in data:
+            ventana.cierra = datetime.fromisoformat(data['cierra'])
+    except (TypeError, ValueError):
+        return jsonify({'error': 'abre y cierra deben ser fechas ISO 8601'}), 400
+    if ventana.cierra <= ventana.abre:
+        return jsonify({'error': 'La ventana debe cerrar después de abrir'}), 400
+    db.session.commit()
+    return jsonify(_ventana_dict(ventana))
+
+
+@admin_bp.route('/admin/asignacion/ventanas/<int:id>', methods=['DELETE'])
+@role_required('Admin')
+def delete_ventana_asignacion(id):
+    """Cancela la ventana: el periodo vuelve a inscripción directa."""
+    ventana = VentanaAsignacion.query.get_or_404(id)
+    if ventana.estado != 'abierta':
+        return jsonify({'error': 'La asignación ya se ejecutó'}), 409
+    PreferenciaServicio.query.filter_by(periodo=ventana.periodo).delete()
+    db.session.delete(ventana)
+    db.session.commit()
+    return jsonify({'message': 'Ventana eliminada'})
+
+
+@admin_bp.route('/admin/asignacion/ejecutar', methods=['POST'])
+@role_required('Admin')
+def ejecutar_asignacion():
+    data = request.get_json() or {}
+    periodo = (data.get('periodo') or '').strip()
+    if not periodo:
+        return jsonify({'error': 'El periodo es requerido'}), 400
+    ventana = VentanaAsignacion.query.filter_by(periodo=periodo).first()
+    if ventana and ventana.estado == 'abierta' and datetime.utcnow() < ventana.cierra and not data.get('simular'):
+        return jsonify({'error': 'La ventana de preferencias sigue abierta'}), 409
+    try:
+        resumen = asignacion.ejecutar(periodo, semilla=data.get('semilla'), simular=bool(data.get('simular')))
+    except RuntimeError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 409
+    return jsonify(resumen)
+
+
+# ═══════════════════════════════════════════
+#   HORARIOS DE LA FERIA
+# ═══════════════════════════════════════════
+
+def _horas_bloque(data, bloque=None):
+    """Lee hora_inicio/hora_fin (HH:MM) o la etiqueta "HH:MM - HH:MM" del body."""
+    if data.get('etiqueta'):
+        return horarios.parsear_etiqueta(data['etiqueta'])
+    inicio = data.get('hora_inicio') or (bloque.hora_inicio.strftime('%H:%M') if bloque else None)
+    fin = data.get('hora_fin') or (bloque.hora_fin.strftime('%H:%M') if bloque else None)
+    return datetime.strptime(inicio, '%H:%M').time(), datetime.strptime(fin, '%H:%M').time()
+
+
+@admin_bp.route('/admin/horarios', methods=['GET'])
+@role_required('Admin')
+def get_horarios_feria():
+    periodo = request.args.get('periodo', '').strip()
+    if not periodo:
+        return jsonify({'error': 'El periodo es requerido'}), 400
+    return jsonify([horarios.a_dict(h) for h in horarios.disponibilidad(periodo)])
+
+
+@admin_bp.route('/admin/horarios', methods=['POST'])
+@role_required('Admin')
+def create_horario_feria():
+    data = request.get_json() or {}
+    periodo = (data.get('periodo') or '').strip()
+    if not periodo:
+        return jsonify({'error': 'El periodo es requerido'}), 400
+    try:
+        hora_inicio, hora_fin = _horas_bloque(data)
+        capacidad = int(data.get('capacidad', 0))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Horario inválido: usa hora_inicio y hora_fin HH:MM y una capacidad numérica'}), 400
+    if hora_fin <= hora_inicio:
+        return jsonify({'error': 'El bloque debe terminar después de iniciar'}), 400
+    if capacidad < 1:
+        return jsonify({'error': 'La capacidad debe ser mayor a 0'}), 400
+    nombre = horarios.etiqueta(hora_inicio, hora_fin)
+    if horarios.buscar(periodo, etiqueta=nombre):
+        return jsonify({'error': f'El periodo ya tiene el horario {nombre}'}), 409
+
+    bloque = HorarioFeria(periodo=periodo, etiqueta=nombre, hora_inicio=hora_inicio,
+                          hora_fin=hora_fin, capacidad=capacidad, ocupados=0)
+    db.session.add(bloque)
+    db.session.flush()
+    # Los registros previos en texto libre con la misma etiqueta cuentan en el bloque
+    horarios.recalcular(periodo)
+    db.session.commit()
+    return jsonify(horarios.a_dict(bloque)), 201
+
+
+@admin_bp.route('/admin/horarios/<int:id>', methods=['PUT'])
+@role_required('Admin')
+def update_horario_feria(id):
+    bloque = HorarioFeria.query.get_or_404(id)
+    data = request.get_json() or {}
+    try:
+        hora_inicio, hora_fin = _horas_bloque(data, bloque)
+        capacidad = int(data.get('capacidad', bloque.capacidad))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Horario inválido: usa hora_inicio y hora_fin HH:MM y una capacidad numérica'}), 400
+    if hora_fin <= hora_inicio:
+        return jsonify({'error': 'El bloque debe terminar después de iniciar'}), 400
+    if capacidad < 1:
+        return jsonify({'error': 'La capacidad debe ser mayor a 0'}), 400
+
+    nombre = horarios.etiqueta(hora_inicio, hora_fin)
+    if nombre != bloque.etiqueta:
+        otro = horarios.buscar(bloque.periodo, etiqueta=nombre)
+        if otro and otro.id != bloque.id:
+            return jsonify({'error': f'El periodo ya tiene el horario {nombre}'}), 409
+        AsistenciaFeria.query.filter_by(horario_id=bloque.id)\
+            .update({AsistenciaFeria.horario_seleccionado: nombre}, synchronize_session=False)
+    bloque.etiqueta, bloque.hora_inicio, bloque.hora_fin = nombre, hora_inicio, hora_fin
+    # Bajar la capacidad por debajo de ocupados no cancela registros: solo cierra el bloque
+    bloque.capacidad = capacidad
+    db.session.commit()
+    return jsonify(horarios.a_dict(bloque))
+
+
+@admin_bp.route('/admin/horarios/<int:id>', methods=['DELETE'])
+@role_required('Admin')
+def delete_horario_feria(id):
+    bloque = HorarioFeria.query.get_or_404(id)
+    if db.session.query(AsistenciaFeria.id).filter_by(horario_id=id).first():
+        return jsonify({'error': 'El horario tiene asistencias registradas'}), 409
+    db.session.delete(bloque)
+    db.session.commit()
+    return jsonify({'message': 'Horario eliminado'})
+
+
+@admin_bp.route('/admin/horarios/recalcular', methods=['POST'])
+@role_required('Admin')
+def recalcular_horarios_feria():
+    data = request.get_json() or {}
+    periodo = (data.get('periodo') or '').strip()
+    if not periodo:
+        return jsonify({'error': 'El periodo es requerido'}), 400
+    ocupacion = horarios.recalcular(periodo)
+    db.session.commit()
+    return jsonify({'periodo': periodo, 'ocupados': ocupacion})
+
+
+# ═══════════════════════════════════════════
+#   EVENTOS DE FERIA
+# ═══════════════════════════════════════════
+
+def _aplicar_evento(evento, data):
+    """Copia los campos del body al evento. Devuelve un mensaje de error o None."""
+    try:
+        if 'fecha_evento' in data:
+            evento.fecha_evento = datetime.strptime(data['fecha_evento'], '%Y-%m-%d').date()
+        if 'hora_inicio' in data:
+            evento.hora_inicio = datetime.strptime(data['hora_inicio'], '%H:%M').time()
+        if 'hora_fin' in data:
+            evento.hora_fin = datetime.strptime(data['hora_fin'], '%H:%M').time()
+    except (TypeError, ValueError):
+        return 'fecha_evento debe ser YYYY-MM-DD y las horas HH:MM'
+    for campo in ('nombre', 'descripcion', 'ubicacion'):
+        if campo in data:
+            setattr(evento, campo, (data[campo] or '').strip())
+    if 'periodo' in data:
+        evento.periodo = (data['periodo'] or '').strip() or None
+    if 'estatus' in data:
+        if data['estatus'] not in eventos.ESTATUS:
+            return 'Estatus inválido'
+        evento.estatus = data['estatus']
+    if not evento.nombre or not evento.fecha_evento or not evento.hora_inicio or not evento.hora_fin:
+        return 'nombre, fecha_evento, hora_inicio y hora_fin son requeridos'
+    if evento.hora_fin <= evento.hora_inicio:
+        return 'El evento debe terminar después de iniciar'
+    return None
+
+
+@admin_bp.route('/admin/eventos', methods=['GET'])
+@role_required('Admin')
+def get_eventos():
+    consulta = EventoFeria.query
+    if request.args.get('periodo'):
+        consulta = consulta.filter_by(periodo=request.args['periodo'])
+    return jsonify([serializers.evento(e) for e in consulta.order_by(EventoFeria.fecha_evento.desc()).all()])
+
+
+@admin_bp.route('/admin/eventos', methods=['POST'])
+@role_required('Admin')
+def create_evento():
+    data = request.get_json() or {}
+    evento = EventoFeria(descripcion='', ubicacion='', estatus='activo')
+    error = _aplicar_evento(evento, data)
+    if error:
+        return jsonify({'error': error}), 400
+    db.session.add(evento)
+    db.session.commit()
+    return jsonify(serializers.evento(evento)), 201
+
+
+@admin_bp.route('/admin/eventos/<int:id>', methods=['PUT'])
+@role_required('Admin')
+def update_evento(id):
+    evento = EventoFeria.query.get_or_404(id)
+    error = _aplicar_evento(evento, request.get_json() or {})
+    if error:
+        db.session.rollback()
+        return jsonify({'error': error}), 400
+    db.session.commit()
+    return jsonify(serializers.evento(evento))
+
+
+@admin_bp.route('/admin/eventos/<int:id>', methods=['DELETE'])
+@role_required('Admin')
+def delete_evento(id):
+    evento = EventoFeria.query.get_or_404(id)
+    if db.session.query(AsistenciaFeria.id).filter_by(evento_feria_id=id).first():
+        return jsonify({'error': 'El evento tiene asistencias registradas; ciérralo en vez de borrarlo'}), 409
+    db.session.delete(evento)
+    db.session.commit()
+    return jsonify({'message': 'Evento eliminado'})
+
+
+@admin_bp.route('/admin/eventos/<int:id>/stats', methods=['GET'])
+@role_required('Admin')
+def get_evento_stats(id):
+    evento = EventoFeria.query.get_or_404(id)
+    return jsonify({'evento': serializers.evento(evento), **eventos.resumen(id)})
+
+
+# ═══════════════════════════════════════════
+#   AUDITORÍA
+# ═══════════════════════════════════════════
+
+@admin_bp.route('/admin/auditoria', methods=['GET'])
+@role_required('Admin')
+def get_auditoria():
+    """Eventos de auditoría, del más reciente al más antiguo.
+
+    Filtros: usuario_id, accion (endpoint, p. ej. admin.delete_estudiante),
+    recurso_id, desde/hasta (ISO 8601).
+    """
+    auditoria.vaciar()  # que la consulta incluya lo que sigue en el buffer de este proceso
+
+    t = EventoAuditoria
+    stmt = db.select(t.id, t.creado, t.usuario_id, Usuario.username, t.metodo, t.accion,
+                     t.recurso_id, t.status_code, t.ip, t.detalle)\
+        .outerjoin(Usuario, Usuario.id == t.usuario_id)
+    if request.args.get('usuario_id'):
+        stmt = stmt.where(t.usuario_id == request.args.get('usuario_id', type=int))
+    if request.args.get('accion'):
+        stmt = stmt.where(t.accion == request.args['accion'])
+    if request.args.get('recurso_id'):
+        stmt = stmt.where(t.recurso_id == request.args['recurso_id'])
+    try:
+        if request.args.get('desde'):
+            stmt = stmt.where(t.creado >= datetime.fromisoformat(request.args['desde']))
+        if request.args.get('hasta'):
+            stmt = stmt.where(t.creado < datetime.fromisoformat(request.args['hasta']))
+    except ValueError:
+        return jsonify({'error': 'desde y hasta deben ser fechas ISO 8601'}), 400
+
+    filas, pagination = catalogos.paginar_select(
+        stmt.order_by(t.creado.desc(), t.id.desc()),
+        request.args.get('page', 1, type=int),
+        request.args.get('per_page', 50, type=int),
+        max_per_page=200,
+    )
+    return jsonify({
+        'data': [{
+            'id': f.id,
+            'creado': serializers.iso(f.creado),
+            'usuario_id': f.usuario_id,
+            'username': f.username,
+            'metodo': f.metodo,
+            'accion': f.accion,
+            'recurso_id': f.recurso_id,
+            'status_code': f.status_code,
+            'ip': f.ip,
+            'detalle': auditoria.leer_detalle(f.detalle),
+        } for f in filas],
+        'pagination': pagination,
+        'buffer': auditoria.estadisticas(),
+    })
+
+
+# ═══════════════════════════════════════════
+#   MANTENIMIENTO
+# ═══════════════════════════════════════════
+
+@admin_bp.route('/admin/mantenimiento', methods=['GET'])
+@role_required('Admin')
+def get_mantenimiento():
+    """Tareas periódicas con su última ejecución, duración y conteo de fallos."""
+    fechas = ('proxima', 'bloqueado_hasta', 'ultimo_inicio')
+    return jsonify({'data': [
+        {k: serializers.iso(v) if k in fechas else v for k, v in t.items()}
+        for t in mantenimiento.estado()
+    ]})
+
+
+@admin_bp.route('/admin/carriles', methods=['GET'])
+@role_required('Admin')
+def get_carriles():
+    """Ocupación de los carriles de prioridad y peticiones rechazadas en este proceso."""
+    return jsonify(carriles.estadisticas())
+
+
+@admin_bp.route('/admin/mantenimiento/<nombre>/ejecutar', methods=['POST'])
+@role_required('Admin')
+def ejecutar_mantenimiento(nombre):
+    """Ejecuta una tarea ahora, sin esperar a su siguiente turno."""
+    if nombre not in mantenimiento.TAREAS:
+        return jsonify({'error': 'Tarea no encontrada'}), 404
+    resultado = mantenimiento.ejecutar(nombre, forzar=True)
+    if resultado is None:
+        return jsonify({'error': 'La tarea se está ejecutando en otro proceso o falta la migración'}), 409
+    return jsonify(resultado), 500 if resultado['error'] else 200
+
+
+# ═══════════════════════════════════════════
+#   FEED DE CAMBIOS
+# ═══════════════════════════════════════════
+
+@admin_bp.route('/admin/cambios/<tabla>', methods=['GET'])
+@role_required('Admin')
+def get_cambios(tabla):
+    """Cambios de estudiantes, preregistros o asistencias_feria desde ``cursor``, en NDJSON.
+
+    Una línea por fila nueva o modificada (``op: upsert``) y por fila borrada
+    (``op: delete``; sin ``id`` y con ``periodo`` si se vació el periodo
+    completo), en el orden de sus transacciones. La última línea trae el
+    cursor para la siguiente petición, también en el header X-Cursor.
+    """
+    if tabla not in cambios.TABLAS:
+        return jsonify({'error': 'Tabla no encontrada'}), 404
+    limite = min(max(request.args.get('limite', cambios.LIMITE, type=int), 1), cambios.LIMITE_MAX)
+    try:
+        pendientes, cursor, hay_mas = cambios.pagina(tabla, request.args.get('cursor'), limite)
+    except cambios.CursorVencido as e:
+        return jsonify({'error': str(e)}), 410
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 400
+
+    dumps = current_app.json.dumps
+
+    def generar():
+        for op, c in pendientes:
+            if op == 'upsert':
+                yield dumps({'op': 'upsert', 'id': c['id'], 'datos': c}) + '\n'
+            else:
+                yield dumps({'op': 'delete', 'id': c.registro_id, 'periodo': c.periodo,
+                             'eliminado': serializers.iso(c.eliminado)}) + '\n'
+        yield dumps({'cursor': cursor, 'mas': hay_mas}) + '\n'
+
+    return Response(stream_with_context(generar()), mimetype='application/x-ndjson',
+                    headers={'X-Cursor': cursor})
@@ -1,15 +1,56 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
-from app.models import Usuario, Estudiante, AsistenciaFeria
+from app.models import Usuario, Estudiante, AsistenciaFeria, EventoFeria, SIN_PERIODO
 from app.middleware import role_required
+from app.idempotencia import idempotente
+from app import particiones
+from app import serializers
+from app import horarios, eventos, cierre_feria
 from datetime import date, datetime
 
 asistencias_bp = Blueprint('asistencias', __name__)
 
 
+def _sugerencias(periodo, referencia=None):
+    return [horarios.a_dict(h) for h in horarios.sugerencias(periodo, referencia)]
+
+
+def _reservar_bloque(periodo, horario_id, etiqueta):
+    """Reserva lugar en el bloque pedido. Devuelve ``(bloque, None)`` o ``(None, respuesta_de_error)``."""
+    bloque = horarios.buscar(periodo, horario_id=horario_id, etiqueta=etiqueta)
+    if bloque is None:
+        return None, (jsonify({
+            'error': 'Horario no válido para el periodo',
+            'sugerencias': _sugerencias(periodo),
+        }), 400)
+    if not horarios.reservar(bloque.id):
+        db.session.rollback()
+        return None, (jsonify({
+            'error': f'El horario {bloque.etiqueta} ya no tiene lugares',
+            'sugerencias': _sugerencias(periodo, bloque.hora_inicio),
+        }), 409)
+    return bloque, None
+
+
+@asistencias_bp.route('/horarios', methods=['GET'])
+@jwt_required()
+def get_horarios():
+    """Bloques del periodo con su ocupación y el bloque sugerido (el de menor carga)."""
+    periodo = request.args.get('periodo', '').strip()
+    if not periodo:
+        return jsonify({'error': 'El periodo es requerido'}), 400
+    sugeridos = horarios.sugerencias(periodo, limite=1)
+    return jsonify({
+        'periodo': periodo,
+        'horarios': [horarios.a_dict(h) for h in horarios.disponibilidad(periodo)],
+        'sugerido': horarios.a_dict(sugeridos[0]) if sugeridos else None,
+    })
+
+
 @asistencias_bp.route('', methods=['POST'])
 @jwt_required()
+@idempotente
 def registrar_asistencia():
     user_id = get_jwt_identity()
     user = Usuario.query.get(user_id)
@@ -19,32 +60,51 @@ def registrar_asistencia():
 
     data = request.get_json()
 
+    periodo = data.get('periodo')
+    if data.get('evento_feria_id') is not None:
+        evento = db.session.get(EventoFeria, data['evento_feria_id'])
+        if not evento:
+            return jsonify({'error': 'Evento no encontrado'}), 404
+        if evento.estatus != 'activo':
+            return jsonify({'error': 'El evento ya está cerrado'}), 409
+    else:
+        evento = eventos.evento_activo(periodo)
+    # Con evento, "ya tiene registro" se revisa solo dentro del evento
+    mios = AsistenciaFeria.query.filter_by(estudiante_id=user.estudiante.id)
+    if evento:
+        mios = mios.filter_by(evento_feria_id=evento.id)
+
     # Modo check: ver si ya tiene registro
     if data.get('check'):
-        existente = AsistenciaFeria.query.filter_by(
-            estudiante_id=user.estudiante.id
-        ).order_by(AsistenciaFeria.id.desc()).first()
+        existente = mios.order_by(AsistenciaFeria.id.desc()).first()
         if existente:
-            return jsonify({'registro': {
-                'id': existente.id,
-                'horario_seleccionado': existente.horario_seleccionado,
-                'estatus_asistencia': existente.estatus_asistencia,
-                'fecha_asistencia': existente.fecha_asistencia.isoformat() if existente.fecha_asistencia else None,
-            }})
+            return jsonify({'registro': serializers.asistencia(existente)})
         return jsonify({'registro': None})
 
-    horario = data.get('horario_seleccionado', '').strip()
-    if not horario:
+    horario = (data.get('horario_seleccionado') or '').strip()
+    horario_id = data.get('horario_id')
+    if not horario and horario_id is None:
         return jsonify({'error': 'Horario requerido'}), 400
 
     # Verificar si ya tiene registro activo (primero, evita queries innecesarias)
-    existente = AsistenciaFeria.query.filter_by(
-        estudiante_id=user.estudiante.id
-    ).first()
+    existente = mios.first()
     if existente:
         return jsonify({'error': 'Ya tienes un registro de asistencia'}), 409
 
-    periodo = data.get('periodo')
+    if evento and not periodo:
+        periodo = evento.periodo
+    periodo = periodo or SIN_PERIODO
+    particiones.asegurar_particion(periodo)
+
+    # Periodos con bloques de horario: se reserva lugar en el bloque
+    bloque = None
+    if horarios.tiene_horarios(periodo):
+        bloque, error = _reservar_bloque(periodo, horario_id, horario)
+        if error:
+            return error
+        horario = bloque.etiqueta
+    elif not horario:
+        return jsonify({'error': 'Horario requerido'}), 400
 
     asistencia = AsistenciaFeria(
         estudiante_id=user.estudiante.id,
@@ -52,16 +112,14 @@ def registrar_asistencia():
         fecha_asistencia=date.today(),
         estatus_asistencia='pendiente',
         periodo=periodo,
+        horario_id=bloque.id if bloque else None,
+        evento_feria_id=evento.id if evento else None,
     )
     db.session.add(asistencia)
     db.session.commit()
 
     return jsonify({
-        'registro': {
-            'id': asistencia.id,
-            'horario_seleccionado': asistencia.horario_seleccionado,
-            'estatus_asistencia': asistencia.estatus_asistencia,
-        },
+        'registro': serializers.asistencia(asistencia),
         'message': 'Registro exitoso'
     }), 201
 
@@ -79,7 +137,19 @@ def actualizar_asistencia(id):
             return jsonify({'error': 'No tienes permisos'}), 403
 
     data = request.get_json()
-    if 'horario_seleccionado' in data:
+    if horarios.tiene_horarios(asistencia.periodo) and ('horario_id' in data or 'horario_seleccionado' in data):
+        actual = asistencia.horario_id
+        pedido = horarios.buscar(asistencia.periodo, horario_id=data.get('horario_id'),
+                                 etiqueta=data.get('horario_seleccionado'))
+        if pedido is None or pedido.id != actual:
+            bloque, error = _reservar_bloque(asistencia.periodo, data.get('horario_id'),
+                                             data.get('horario_seleccionado'))
+            if error:
+                return error
+            horarios.liberar(actual)
+            asistencia.horario_id = bloque.id
+            asistencia.horario_seleccionado = bloque.etiqueta
+    elif 'horario_seleccionado' in data:
         asistencia.horario_seleccionado = data['horario_seleccionado']
 
     db.session.commit()
@@ -102,6 +172,7 @@ def cancelar_asistencia(id):
     elif user.rol not in ('Becario', 'Admin'):
         return jsonify({'error': 'No tienes permisos'}), 403
 
+    horarios.liberar(asistencia.horario_id)
     db.session.delete(asistencia)
     db.session.commit()
     return jsonify({'message': 'Registro de asistencia cancelado'})
@@ -127,9 +198,50 @@ def validar_asistencia(id):
     return jsonify({'message': 'Estatus actualizado'})
 
 
+@asistencias_bp.route('/validar-lote', methods=['PUT'])
+@role_required('Becario', 'Admin')
+def validar_asistencias_lote():
+    """Aplica un estatus a muchas asistencias: ``{"ids": [...], "estatus": "asistió"}``."""
+    data = request.get_json() or {}
+    ids = data.get('ids')
+    if not isinstance(ids, list) or not ids:
+        return jsonify({'error': 'ids debe ser una lista no vacía'}), 400
+    try:
+        resultado = cierre_feria.validar_lote(ids, data.get('estatus'))
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(resultado)
+
+
+@asistencias_bp.route('/cerrar', methods=['POST'])
+@role_required('Admin')
+def cerrar_feria():
+    """Cierre de la feria: ``dentro`` pasa a ``asistió`` y ``pendiente`` a ``no_asistió``.
+
+    Body ``{"periodo": "2026-1"}`` o ``{"evento_id": 1}`` (también marca el evento como cerrado).
+    """
+    data = request.get_json() or {}
+    periodo = (data.get('periodo') or '').strip() or None
+    evento_id = data.get('evento_id')
+    if evento_id is not None:
+        EventoFeria.query.get_or_404(evento_id)
+    try:
+        resultado = cierre_feria.cerrar(periodo=periodo, evento_id=evento_id)
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 400
+    if evento_id is not None:
+        EventoFeria.query.filter_by(id=evento_id).update({EventoFeria.estatus: 'cerrado'})
+        db.session.commit()
+    return jsonify(resultado)
+
+
 @asistencias_bp.route('/dentro', methods=['GET'])
 @role_required('Becario', 'Admin')
 def asistentes_dentro():
+    evento_id = request.args.get('evento_id', type=int)
+    if evento_id:
+        return jsonify(eventos.resumen(evento_id))
+
     count = AsistenciaFeria.query.filter_by(estatus_asistencia='dentro').count()
     total_registrados = AsistenciaFeria.query.count()
     asistieron = AsistenciaFeria.query.filter(
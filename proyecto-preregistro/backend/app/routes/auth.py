@@ -2,7 +2,9 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 import bcrypt
 from app import db, limiter
-from app.models import Usuario, Estudiante, Carrera
+from app.models import Usuario, Estudiante
+from app.http_cache import etag_versionado
+from app import catalogos, consultas
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -17,13 +19,9 @@ def login():
     if not username or not password:
         return jsonify({'error': 'Usuario y contraseña requeridos'}), 400
 
-    user = Usuario.query.filter_by(username=username).first()
+    user = consultas.USUARIO_POR_USERNAME.ejecutar(username=username).first()
     if not user:
-        estudiante = Estudiante.query.filter(
-            db.func.lower(Estudiante.matricula) == username.lower()
-        ).first()
-        if estudiante:
-            user = estudiante.usuario
+        user = consultas.USUARIO_POR_MATRICULA.ejecutar(matricula=username.lower()).first()
     if not user or not bcrypt.checkpw(password.encode(), user.password_hash.encode()):
         return jsonify({'error': 'Credenciales incorrectas'}), 401
 
@@ -35,9 +33,9 @@ def login():
         'rol': user.rol,
     }
 
-    if user.estudiante:
-        user_data['nombre'] = user.estudiante.nombre_completo
-        user_data['estudiante_id'] = user.estudiante.id
+    if user.estudiante_id is not None:
+        user_data['nombre'] = user.nombre_completo
+        user_data['estudiante_id'] = user.estudiante_id
 
     return jsonify({'token': token, 'user': user_data})
 
@@ -205,7 +203,7 @@ def reset_password():
 
 
 @auth_bp.route('/carreras', methods=['GET'])
+@etag_versionado('carreras')
 def get_carreras():
     """Endpoint público para obtener carreras (usado en registro)."""
-    carreras = Carrera.query.order_by(Carrera.nombre).all()
-    return jsonify([{'id': c.id, 'nombre': c.nombre, 'abreviatura': c.abreviatura} for c in carreras])
+    return jsonify(catalogos.carreras())
@@ -4,37 +4,51 @@ import time
 import base64
 
 from flask import Blueprint, request, jsonify, current_app
-from app import db
-from app.models import Estudiante, AsistenciaFeria
+from app import db, consultas
+from app.models import EventoFeria
 from app.middleware import role_required
+from app.idempotencia import idempotente
 from datetime import datetime
 
 checkin_bp = Blueprint('checkin', __name__)
 
 
-def _generar_token(horas: int, secret_key: str):
+def _mensaje(expires_at: int, evento_id=None):
+    # Los QR sin evento conservan el formato original para seguir siendo válidos
+    if evento_id is None:
+        return f"feria-checkin:{expires_at}"
+    return f"feria-checkin:{evento_id}:{expires_at}"
+
+
+def _generar_token(horas: int, secret_key: str, evento_id=None):
     expires_at = int(time.time()) + (horas * 3600)
-    mensaje = f"feria-checkin:{expires_at}"
+    mensaje = _mensaje(expires_at, evento_id)
     firma = hmac.new(secret_key.encode(), mensaje.encode(), hashlib.sha256).hexdigest()
-    raw = f"{expires_at}.{firma}"
+    prefijo = f"{expires_at}" if evento_id is None else f"{evento_id}:{expires_at}"
+    raw = f"{prefijo}.{firma}"
     token = base64.urlsafe_b64encode(raw.encode()).decode()
     return token, expires_at
 
 
 def _verificar_token(token: str, secret_key: str):
+    """Devuelve ``(valido, error, evento_id)``; ``evento_id`` es None en QR sin evento."""
     try:
         raw = base64.urlsafe_b64decode(token.encode()).decode()
-        expires_at_str, firma_recibida = raw.split(".", 1)
-        expires_at = int(expires_at_str)
+        prefijo, firma_recibida = raw.split(".", 1)
+        evento_id = None
+        if ':' in prefijo:
+            evento_str, prefijo = prefijo.split(':', 1)
+            evento_id = int(evento_str)
+        expires_at = int(prefijo)
         if time.time() > expires_at:
-            return False, "El QR ha expirado"
-        mensaje = f"feria-checkin:{expires_at}"
+            return False, "El QR ha expirado", None
+        mensaje = _mensaje(expires_at, evento_id)
         firma_esperada = hmac.new(secret_key.encode(), mensaje.encode(), hashlib.sha256).hexdigest()
         if not hmac.compare_digest(firma_recibida, firma_esperada):
-            return False, "QR inválido"
-        return True, None
+            return False, "QR inválido", None
+        return True, None, evento_id
     except Exception:
-        return False, "QR inválido"
+        return False, "QR inválido", None
 
 
 @checkin_bp.route('/generar-token', methods=['POST'])
@@ -45,8 +59,15 @@ def generar_token():
     if horas < 1 or horas > 48:
         return jsonify({'error': 'horas_validez debe estar entre 1 y 48'}), 400
 
+    evento_id = data.get('evento_id')
+    if evento_id is not None:
+        evento = EventoFeria.query.get_or_404(evento_id)
+        if evento.estatus != 'activo':
+            return jsonify({'error': 'El evento ya está cerrado'}), 409
+        evento_id = evento.id
+
     secret_key = current_app.config['SECRET_KEY']
-    token, expires_at = _generar_token(horas, secret_key)
+    token, expires_at = _generar_token(horas, secret_key, evento_id)
 
     frontend_url = current_app.config.get('FRONTEND_URL', 'http://localhost:5173')
     qr_url = f"{frontend_url}/check-in?token={token}"
@@ -56,10 +77,12 @@ def generar_token():
         'expires_at': expires_at,
         'expires_at_readable': datetime.fromtimestamp(expires_at).strftime('%d/%m/%Y %H:%M'),
         'qr_url': qr_url,
+        'evento_id': evento_id,
     })
 
 
 @checkin_bp.route('/entrada', methods=['POST'])
+@idempotente
 def registrar_entrada():
     data = request.get_json() or {}
     matricula = data.get('matricula', '').strip().lower()
@@ -69,17 +92,23 @@ def registrar_entrada():
         return jsonify({'error': 'Matrícula y token son requeridos'}), 400
 
     secret_key = current_app.config['SECRET_KEY']
-    valido, error = _verificar_token(token, secret_key)
+    valido, error, evento_id = _verificar_token(token, secret_key)
     if not valido:
         return jsonify({'error': error}), 401
+    if evento_id is not None:
+        if consultas.ESTATUS_EVENTO.ejecutar(evento_id=evento_id).scalar() != 'activo':
+            return jsonify({'error': 'El evento de este QR ya está cerrado'}), 401
 
-    estudiante = Estudiante.query.filter_by(matricula=matricula).first()
+    estudiante = consultas.ESTUDIANTE_POR_MATRICULA.ejecutar(matricula=matricula).first()
     if not estudiante:
         return jsonify({'error': 'Matrícula no encontrada. Verifica que esté correcta'}), 404
 
-    asistencia = AsistenciaFeria.query.filter_by(
-        estudiante_id=estudiante.id
-    ).first()
+    # QR de evento: solo se buscan las asistencias de ese evento (índice evento, estudiante)
+    if evento_id is not None:
+        asistencia = consultas.ASISTENCIA_DE_ESTUDIANTE_EN_EVENTO.ejecutar(
+            evento_id=evento_id, estudiante_id=estudiante.id).first()
+    else:
+        asistencia = consultas.ASISTENCIA_DE_ESTUDIANTE.ejecutar(estudiante_id=estudiante.id).first()
 
     if not asistencia:
         return jsonify({'error': 'No tienes un registro activo en la feria. Regístrate primero desde el sistema'}), 400
@@ -90,9 +119,12 @@ def registrar_entrada():
     if asistencia.estatus_asistencia in ('asistió', 'no_asistió'):
         return jsonify({'error': 'Tu asistencia ya fue procesada'}), 409
 
-    asistencia.estatus_asistencia = 'dentro'
-    asistencia.hora_real_asistencia = datetime.now().time()
+    marcada = db.session.execute(consultas.MARCAR_DENTRO, {
+        'asistencia_id': asistencia.id, 'hora': datetime.now().time(),
+    }).rowcount
     db.session.commit()
+    if not marcada:  # otro escaneo del mismo QR ganó la carrera
+        return jsonify({'error': 'Ya registraste tu entrada a la feria'}), 409
 
     return jsonify({
         'nombre_completo': estudiante.nombre_completo,
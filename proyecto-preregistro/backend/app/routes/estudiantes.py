@@ -1,11 +1,95 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import Usuario, Estudiante, PreRegistro, Servicio, AsistenciaFeria, Carrera
+from app.models import (
+    Usuario, Estudiante, PreRegistro, Servicio, AsistenciaFeria, Carrera, PreferenciaServicio, VentanaAsignacion,
+)
 from app.middleware import role_required
+from app.http_cache import etag_versionado
+from app.serializers import iso
+from app import asignacion, catalogos, eventos, serializers
 
 estudiantes_bp = Blueprint('estudiantes', __name__)
 
 
+def _perfil(user_id):
+    """Usuario, estudiante y carrera en una sola query; None si no es estudiante."""
+    fila = db.session.execute(
+        db.select(Estudiante.id, Estudiante.nombre_completo, Estudiante.matricula, Estudiante.celular,
+                  Estudiante.correo_alterno, Carrera.nombre.label('carrera'), Usuario.username)
+        .join(Usuario, Usuario.id == Estudiante.usuario_id)
+        .outerjoin(Carrera, Carrera.id == Estudiante.carrera_id)
+        .where(Usuario.id == int(user_id))
+    ).first()
+    if fila is None:
+        return None
+    return {
+        'id': fila.id,
+        'nombre_completo': fila.nombre_completo,
+        'matricula': fila.matricula,
+        'carrera': fila.carrera or '',
+        'celular': fila.celular or '',
+        'correo_alterno': fila.correo_alterno or '',
+        'username': fila.username,
+    }
+
+
+def _mis_proyectos(estudiante_id, periodo=None):
+    stmt = db.select(
+        PreRegistro.id, PreRegistro.periodo, PreRegistro.fecha_registro,
+        Servicio.id.label('servicio_id'), Servicio.descripcion, Servicio.crn,
+    ).join(Servicio, Servicio.id == PreRegistro.servicio_id)\
+        .where(PreRegistro.estudiante_id == estudiante_id).order_by(PreRegistro.id)
+    if periodo:
+        stmt = stmt.where(PreRegistro.periodo == periodo)
+    return [{
+        'preregistro_id': r.id,
+        'servicio_id': r.servicio_id,
+        'servicio_descripcion': r.descripcion,
+        'crn': r.crn,
+        'periodo': r.periodo,
+        'fecha_registro': iso(r.fecha_registro),
+    } for r in db.session.execute(stmt)]
+
+
+def _asistencia(estudiante_id, periodo=None):
+    """El registro de feria que devuelve ``POST /asistencias-feria`` con ``check``."""
+    stmt = db.select(
+        AsistenciaFeria.id, AsistenciaFeria.horario_seleccionado, AsistenciaFeria.horario_id,
+        AsistenciaFeria.evento_feria_id, AsistenciaFeria.estatus_asistencia, AsistenciaFeria.fecha_asistencia,
+    ).where(AsistenciaFeria.estudiante_id == estudiante_id)
+    evento = eventos.evento_activo(periodo)
+    if evento:
+        stmt = stmt.where(AsistenciaFeria.evento_feria_id == evento.id)
+    fila = db.session.execute(stmt.order_by(AsistenciaFeria.id.desc()).limit(1)).first()
+    return serializers.asistencia(fila) if fila else None
+
+
+@estudiantes_bp.route('/bootstrap', methods=['GET'])
+@jwt_required()
+@etag_versionado('estudiantes', 'usuarios', 'carreras', 'preregistros', 'servicios', 'socios_formadores',
+                 'asistencias_feria', 'eventos_feria', por_usuario=True)
+def bootstrap():
+    """Todo lo que carga el portal del estudiante al abrir, en una sola petición.
+
+    Junta perfil, mis proyectos, el registro de feria, carreras y la primera
+    página de servicios, con un número fijo de queries (carreras sale de la
+    caché en proceso).
+    """
+    perfil = _perfil(get_jwt_identity())
+    if perfil is None:
+        return jsonify({'error': 'Estudiante no encontrado'}), 404
+
+    periodo = request.args.get('periodo', '').strip() or None
+    servicios, pagination = catalogos.pagina_servicios(1, request.args.get('per_page', 20, type=int))
+    return jsonify({
+        'perfil': perfil,
+        'mis_proyectos': _mis_proyectos(perfil['id'], periodo),
+        'asistencia': _asistencia(perfil['id'], periodo),
+        'carreras': catalogos.carreras(),
+        'servicios': {'data': servicios, 'pagination': pagination},
+    })
+
+
 @estudiantes_bp.route('/mis-proyectos', methods=['GET'])
 @jwt_required()
 def mis_proyectos():
@@ -14,42 +98,16 @@ def mis_proyectos():
     if not user or not user.estudiante:
         return jsonify({'error': 'Estudiante no encontrado'}), 404
 
-    periodo = request.args.get('periodo')
-    query = PreRegistro.query.filter_by(estudiante_id=user.estudiante.id)
-
-    if periodo:
-        query = query.join(Servicio).filter(Servicio.periodo == periodo)
-
-    registros = query.join(Servicio).all()
-
-    return jsonify([{
-        'preregistro_id': r.id,
-        'servicio_id': r.servicio.id,
-        'servicio_descripcion': r.servicio.descripcion,
-        'crn': r.servicio.crn,
-        'periodo': r.servicio.periodo,
-        'fecha_registro': r.fecha_registro.isoformat() if r.fecha_registro else None,
-    } for r in registros])
+    return jsonify(_mis_proyectos(user.estudiante.id, request.args.get('periodo')))
 
 
 @estudiantes_bp.route('/perfil', methods=['GET'])
 @jwt_required()
 def get_perfil():
-    user_id = get_jwt_identity()
-    user = Usuario.query.get(user_id)
-    if not user or not user.estudiante:
+    perfil = _perfil(get_jwt_identity())
+    if perfil is None:
         return jsonify({'error': 'Estudiante no encontrado'}), 404
-
-    est = user.estudiante
-    return jsonify({
-        'id': est.id,
-        'nombre_completo': est.nombre_completo,
-        'matricula': est.matricula,
-        'carrera': est.carrera.nombre if est.carrera else '',
-        'celular': est.celular or '',
-        'correo_alterno': est.correo_alterno or '',
-        'username': user.username,
-    })
+    return jsonify(perfil)
 
 
 @estudiantes_bp.route('/perfil', methods=['PUT'])
@@ -131,5 +189,75 @@ def buscar_estudiante():
     return jsonify(result)
 
 
+@estudiantes_bp.route('/preferencias', methods=['GET'])
+@jwt_required()
+def get_preferencias():
+    user_id = get_jwt_identity()
+    user = Usuario.query.get(user_id)
+    if not user or not user.estudiante:
+        return jsonify({'error': 'Estudiante no encontrado'}), 404
+
+    periodo = request.args.get('periodo', '').strip()
+    if not periodo:
+        return jsonify({'error': 'El periodo es requerido'}), 400
+
+    ventana = VentanaAsignacion.query.filter_by(periodo=periodo).first()
+    preferencias = db.session.execute(
+        db.select(PreferenciaServicio.rango, Servicio.crn, Servicio.descripcion)
+        .join(Servicio, Servicio.id == PreferenciaServicio.servicio_id)
+        .where(PreferenciaServicio.estudiante_id == user.estudiante.id, PreferenciaServicio.periodo == periodo)
+        .order_by(PreferenciaServicio.rango)
+    ).all()
+    return jsonify({
+        'periodo': periodo,
+        'ventana': {
+            'abre': ventana.abre.isoformat(),
+            'cierra': ventana.cierra.isoformat(),
+            'estado': ventana.estado,
+        } if ventana else None,
+        'preferencias': [{'rango': r, 'crn': crn, 'descripcion': d} for r, crn, d in preferencias],
+    })
+
+
+@estudiantes_bp.route('/preferencias', methods=['PUT'])
+@jwt_required()
+def set_preferencias():
+    """Reemplaza la lista ordenada de CRNs preferidos del estudiante para el periodo."""
+    user_id = get_jwt_identity()
+    user = Usuario.query.get(user_id)
+    if not user or not user.estudiante:
+        return jsonify({'error': 'Estudiante no encontrado'}), 404
+
+    data = request.get_json() or {}
+    periodo = (data.get('periodo') or '').strip()
+    crns = [str(c).strip() for c in data.get('crns') or []]
+    if not periodo:
+        return jsonify({'error': 'El periodo es requerido'}), 400
+    if not asignacion.ventana_abierta(periodo):
+        return jsonify({'error': 'No hay una ventana de preferencias abierta para este periodo'}), 409
+
+    maximo = current_app.config.get('ASIGNACION_MAX_PREFERENCIAS', 5)
+    if len(crns) > maximo:
+        return jsonify({'error': f'Máximo {maximo} preferencias'}), 400
+    if len(set(crns)) != len(crns):
+        return jsonify({'error': 'Hay CRNs repetidos'}), 400
+
+    servicios = dict(db.session.execute(
+        db.select(Servicio.crn, Servicio.id).where(Servicio.periodo == periodo, Servicio.crn.in_(crns))
+    ).all()) if crns else {}
+    faltantes = [c for c in crns if c not in servicios]
+    if faltantes:
+        return jsonify({'error': f'CRNs no encontrados en el periodo {periodo}: {", ".join(faltantes)}'}), 404
+
+    estudiante_id = user.estudiante.id
+    PreferenciaServicio.query.filter_by(estudiante_id=estudiante_id, periodo=periodo).delete()
+    for rango, crn in enumerate(crns, start=1):
+        db.session.add(PreferenciaServicio(
+            estudiante_id=estudiante_id, periodo=periodo, servicio_id=servicios[crn], rango=rango,
+        ))
+    db.session.commit()
+    return jsonify({'message': 'Preferencias guardadas', 'total': len(crns)})
+
+
 # Necesario importar db para el filtro or_
 from app import db
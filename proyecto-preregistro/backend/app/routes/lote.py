@@ -0,0 +1,21 @@
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app import lote
+
+lote_bp = Blueprint('lote', __name__)
+
+
+@lote_bp.route('', methods=['POST'])
+@jwt_required()
+def ejecutar_lote():
+    """Ejecuta varias peticiones a la API en una sola (ver app/lote.py).
+
+    Body: ``{"peticiones": [{"id": "stats", "metodo": "GET", "ruta": "/api/dashboard/stats"}, ...]}``.
+    Responde ``{"respuestas": [{"id", "status", "headers", "body"}, ...]}`` en el mismo orden.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        peticiones = lote.validar(data.get('peticiones'), current_app.config.get('BATCH_MAX_PETICIONES', 25))
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'respuestas': lote.ejecutar(peticiones, get_jwt_identity())})
@@ -1,30 +1,42 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, url_for
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models import Usuario, Estudiante, Servicio, PreRegistro, Carrera, AsistenciaFeria
 from app.middleware import role_required
+from app.idempotencia import idempotente
+from app.http_cache import etag_versionado
+from app import serializers
+from app import catalogos, carriles, cola_inscripciones
+from app.inscripciones import inscribir
 
 preregistros_bp = Blueprint('preregistros', __name__)
 
 
-def paginate_query(query, page=1, per_page=20):
-    page = max(1, int(page))
-    paginated = query.paginate(page=page, per_page=per_page, error_out=False)
-    return paginated.items, {
-        'page': paginated.page,
-        'per_page': paginated.per_page,
-        'total': paginated.total,
-        'pages': paginated.pages,
-    }
-
-
 @preregistros_bp.route('/periodos', methods=['GET'])
 @role_required('Becario', 'Admin')
+@etag_versionado('servicios', 'preregistros')
 def get_periodos():
-    periodos = [p[0] for p in db.session.query(Servicio.periodo).join(
-        PreRegistro, PreRegistro.servicio_id == Servicio.id
-    ).distinct().order_by(Servicio.periodo).all()]
-    return jsonify(periodos)
+    return jsonify(catalogos.periodos_con_preregistros())
+
+
+# Columnas de cada campo de ``?fields=`` y los joins que necesitan. Las llaves
+# foráneas de preregistros y estudiantes.carrera_id son NOT NULL, así que
+# omitir un join no cambia las filas del listado.
+_COLUMNAS = {
+    'id': (PreRegistro.id, ()),
+    'estudiante_nombre': (Estudiante.nombre_completo.label('estudiante_nombre'), ('estudiante',)),
+    'matricula': (Estudiante.matricula, ('estudiante',)),
+    'carrera': (Carrera.nombre.label('carrera'), ('estudiante', 'carrera')),
+    'crn': (Servicio.crn, ('servicio',)),
+    'servicio_descripcion': (Servicio.descripcion.label('servicio_descripcion'), ('servicio',)),
+    'periodo': (PreRegistro.periodo, ()),
+    'fecha_registro': (PreRegistro.fecha_registro, ()),
+}
+_JOINS = [
+    ('estudiante', Estudiante, Estudiante.id == PreRegistro.estudiante_id, False),
+    ('servicio', Servicio, Servicio.id == PreRegistro.servicio_id, False),
+    ('carrera', Carrera, Carrera.id == Estudiante.carrera_id, False),
+]
 
 
 @preregistros_bp.route('', methods=['GET'])
@@ -32,18 +44,27 @@ def get_periodos():
 def get_preregistros():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
-
-    query = PreRegistro.query.join(Estudiante).join(Servicio).join(Carrera)
+    try:
+        campos = catalogos.campos_pedidos(request.args.get('fields'), list(serializers.CAMPOS_PREREGISTRO))
+    except catalogos.CamposInvalidos as e:
+        return jsonify({'error': str(e)}), 400
 
     periodo = request.args.get('periodo')
     carrera = request.args.get('carrera')
     q = request.args.get('q', '').strip()
+    necesarios = set()
+    if carrera:
+        necesarios.update(('estudiante', 'carrera'))
+    if q:
+        necesarios.update(('estudiante', 'servicio'))
+    stmt = catalogos.seleccionar(PreRegistro, _COLUMNAS, campos or list(_COLUMNAS), _JOINS, necesarios)
+
     if periodo:
-        query = query.filter(Servicio.periodo == periodo)
+        stmt = stmt.where(PreRegistro.periodo == periodo)
     if carrera:
-        query = query.filter(Carrera.nombre.ilike(f'%{carrera}%'))
+        stmt = stmt.where(Carrera.nombre.ilike(f'%{carrera}%'))
     if q:
-        query = query.filter(
+        stmt = stmt.where(
             db.or_(
                 Estudiante.nombre_completo.ilike(f'%{q}%'),
                 Estudiante.matricula.ilike(f'%{q}%'),
@@ -52,26 +73,19 @@ def get_preregistros():
             )
         )
 
-    query = query.order_by(PreRegistro.fecha_registro.desc())
-    items, pagination = paginate_query(query, page, per_page)
+    stmt = stmt.order_by(PreRegistro.fecha_registro.desc())
+    filas, pagination = catalogos.paginar_select(stmt, page, per_page)
 
-    return jsonify({
-        'data': [{
-            'id': r.id,
-            'estudiante_nombre': r.estudiante.nombre_completo,
-            'matricula': r.estudiante.matricula,
-            'carrera': r.estudiante.carrera.nombre if r.estudiante.carrera else None,
-            'crn': r.servicio.crn,
-            'servicio_descripcion': r.servicio.descripcion,
-            'periodo': r.servicio.periodo,
-            'fecha_registro': r.fecha_registro.isoformat() if r.fecha_registro else None,
-        } for r in items],
-        'pagination': pagination,
-    })
+    if campos is None:
+        data = [serializers.preregistro(r) for r in filas]
+    else:
+        data = [serializers.proyectar(r, campos, serializers.CAMPOS_PREREGISTRO) for r in filas]
+    return jsonify({'data': data, 'pagination': pagination})
 
 
 @preregistros_bp.route('', methods=['POST'])
 @role_required('Becario', 'Admin')
+@idempotente
 def create_preregistro():
     data = request.get_json()
     estudiante_id = data.get('estudiante_id')
@@ -80,46 +94,59 @@ def create_preregistro():
     if not estudiante_id or not crn:
         return jsonify({'error': 'estudiante_id y CRN son requeridos'}), 400
 
-    estudiante = Estudiante.query.get(estudiante_id)
-    if not estudiante:
-        return jsonify({'error': 'Estudiante no encontrado'}), 404
+    if current_app.config.get('INSCRIPCION_MODO') == 'cola':
+        return _encolar_inscripcion(estudiante_id, crn)
+
+    cuerpo, status = inscribir(estudiante_id, crn)
+    if status == 201:
+        db.session.commit()
+    return jsonify(cuerpo), status
+
 
-    servicio = Servicio.query.filter_by(crn=crn).first()
-    if not servicio:
+def _segundos_espera():
+    maximo = current_app.config.get('INSCRIPCION_ESPERA_MAX', 25)
+    return min(max(request.args.get('esperar', 0, type=float), 0), maximo)
+
+
+def _respuesta_ticket(info):
+    # Ticket ya atendido: misma respuesta que el modo directo, más el ticket
+    if info['estado'] != cola_inscripciones.EN_COLA:
+        return jsonify({**info['resultado'], 'ticket': info['ticket']}), info['status_code']
+    response = jsonify(info)
+    response.status_code = 202
+    response.headers['Location'] = url_for('preregistros.get_ticket', codigo=info['ticket'])
+    response.headers['Retry-After'] = '1'
+    return response
+
+
+def _encolar_inscripcion(estudiante_id, crn):
+    # Solo se valida aquí lo que define la cola; el resto lo valida el worker
+    if not db.session.query(Servicio.id).filter_by(crn=crn).first():
         return jsonify({'error': 'Servicio con ese CRN no encontrado'}), 404
 
-    # Verificar que el estudiante tenga asistencia registrada a la feria
-    asistencia = AsistenciaFeria.query.filter_by(estudiante_id=estudiante_id).first()
-    if not asistencia:
-        return jsonify({'error': 'El estudiante debe tener asistencia registrada a la feria para inscribirse a un servicio'}), 400
-
-    # Verificar cupo
-    inscritos = PreRegistro.query.filter_by(servicio_id=servicio.id).count()
-    if inscritos >= servicio.cupo_maximo:
-        return jsonify({'error': 'El servicio ha alcanzado su cupo máximo'}), 409
-
-    # Verificar duplicado
-    existente = PreRegistro.query.filter_by(
-        estudiante_id=estudiante_id, servicio_id=servicio.id
-    ).first()
-    if existente:
-        return jsonify({'error': 'El estudiante ya está inscrito en este servicio'}), 409
-
-    # Verificar límite de 1 servicio por periodo
-    ya_inscrito_periodo = PreRegistro.query.join(Servicio).filter(
-        PreRegistro.estudiante_id == estudiante_id,
-        Servicio.periodo == servicio.periodo,
-    ).first()
-    if ya_inscrito_periodo:
-        return jsonify({
-            'error': f'El estudiante ya tiene un servicio inscrito en el periodo {servicio.periodo}'
-        }), 409
-
-    preregistro = PreRegistro(estudiante_id=estudiante_id, servicio_id=servicio.id)
-    db.session.add(preregistro)
-    db.session.commit()
+    app = current_app._get_current_object()
+    codigo = cola_inscripciones.encolar(app, estudiante_id, crn)
+    segundos = _segundos_espera()
+    if segundos:
+        carriles.liberar()  # la espera no debe ocupar un lugar del carril normal
+    info = cola_inscripciones.esperar(app, codigo, segundos)
+    return _respuesta_ticket(info)
+
 
-    return jsonify({'id': preregistro.id, 'message': 'Inscripción exitosa'}), 201
+@preregistros_bp.route('/tickets/<codigo>', methods=['GET'])
+@role_required('Becario', 'Admin')
+def get_ticket(codigo):
+    """Estado de un ticket de la cola. Con ``?esperar=N`` espera hasta N segundos
+    a que sea atendido (long-poll) antes de responder."""
+    segundos = _segundos_espera()
+    if segundos:
+        carriles.liberar()
+    info = cola_inscripciones.esperar(current_app._get_current_object(), codigo, segundos)
+    if info is None:
+        return jsonify({'error': 'Ticket no encontrado'}), 404
+    if info['estado'] == cola_inscripciones.EN_COLA:
+        return jsonify(info), 202
+    return jsonify(info)
 
 
 @preregistros_bp.route('/<int:id>', methods=['DELETE'])
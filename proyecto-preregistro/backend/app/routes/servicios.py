@@ -1,54 +1,30 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
 from app import db
-from app.models import Servicio, PreRegistro, Estudiante, Carrera, AsistenciaFeria
+from app.models import Servicio, PreRegistro, Estudiante, Carrera, AsistenciaFeria, PreferenciaServicio
 from app.middleware import role_required
+from app.http_cache import etag_versionado
+from app.serializers import iso
+from app import serializers, catalogos
+from app import particiones, horarios
 
 servicios_bp = Blueprint('servicios', __name__)
 
 
-def paginate_query(query, page=1, per_page=20):
-    page = max(1, int(page))
-    paginated = query.paginate(page=page, per_page=per_page, error_out=False)
-    return paginated.items, {
-        'page': paginated.page,
-        'per_page': paginated.per_page,
-        'total': paginated.total,
-        'pages': paginated.pages,
-    }
-
-
 @servicios_bp.route('', methods=['GET'])
 @jwt_required()
+@etag_versionado('servicios', 'preregistros', 'socios_formadores')
 def get_servicios():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     q = request.args.get('q', '').strip()
+    try:
+        campos = catalogos.campos_pedidos(request.args.get('fields'), list(serializers.CAMPOS_SERVICIO))
+    except catalogos.CamposInvalidos as e:
+        return jsonify({'error': str(e)}), 400
 
-    query = Servicio.query.order_by(Servicio.periodo.desc(), Servicio.descripcion)
-    if q:
-        query = query.filter(
-            db.or_(
-                Servicio.descripcion.ilike(f'%{q}%'),
-                Servicio.crn.ilike(f'%{q}%'),
-                Servicio.periodo.ilike(f'%{q}%'),
-            )
-        )
-
-    items, pagination = paginate_query(query, page, per_page)
-    return jsonify({
-        'data': [{
-            'id': s.id,
-            'descripcion': s.descripcion,
-            'crn': s.crn,
-            'periodo': s.periodo,
-            'cupo_maximo': s.cupo_maximo,
-            'inscritos': PreRegistro.query.filter_by(servicio_id=s.id).count(),
-            'socio_formador_id': s.socio_formador_id,
-            'socio_formador_nombre': s.socio_formador.nombre if s.socio_formador else None,
-        } for s in items],
-        'pagination': pagination,
-    })
+    data, pagination = catalogos.pagina_servicios(page, per_page, q, campos)
+    return jsonify({'data': data, 'pagination': pagination})
 
 
 @servicios_bp.route('', methods=['POST'])
@@ -61,6 +37,7 @@ def create_servicio():
     if Servicio.query.filter_by(crn=data['crn']).first():
         return jsonify({'error': 'El CRN ya existe'}), 409
 
+    particiones.asegurar_particion(data['periodo'])
     servicio = Servicio(
         descripcion=data['descripcion'],
         crn=data['crn'],
@@ -87,8 +64,12 @@ def update_servicio(id):
         if existing:
             return jsonify({'error': 'El CRN ya existe'}), 409
         servicio.crn = data['crn']
-    if 'periodo' in data:
+    if 'periodo' in data and data['periodo'] != servicio.periodo:
+        particiones.asegurar_particion(data['periodo'])
         servicio.periodo = data['periodo']
+        PreRegistro.query.filter_by(servicio_id=id).update(
+            {'periodo': data['periodo']}, synchronize_session=False
+        )
     if 'cupo_maximo' in data:
         nuevo_cupo = int(data['cupo_maximo'])
         inscritos = PreRegistro.query.filter_by(servicio_id=id).count()
@@ -106,8 +87,10 @@ def update_servicio(id):
 @role_required('Admin')
 def delete_servicio(id):
     servicio = Servicio.query.get_or_404(id)
+    horarios.liberar_asistencias(AsistenciaFeria.servicio_id == id)
     AsistenciaFeria.query.filter_by(servicio_id=id).delete()
     PreRegistro.query.filter_by(servicio_id=id).delete()
+    PreferenciaServicio.query.filter_by(servicio_id=id).delete()
     db.session.delete(servicio)
     db.session.commit()
     return jsonify({'message': 'Servicio eliminado'})
@@ -150,5 +133,5 @@ def get_inscritos(id):
         'nombre_completo': i.nombre_completo,
         'matricula': i.matricula,
         'carrera': i.carrera,
-        'fecha_registro': i.fecha_registro.isoformat() if i.fecha_registro else None,
+        'fecha_registro': iso(i.fecha_registro),
     } for i in inscritos])
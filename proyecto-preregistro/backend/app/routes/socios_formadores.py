@@ -2,21 +2,13 @@ from flask import Blueprint, request, jsonify
 from app import db
 from app.models import SocioFormador, Servicio, PreRegistro, Estudiante, Carrera
 from app.middleware import role_required
+from app.http_cache import etag_versionado
+from app.replica import lectura_replica
+from app import catalogos
 
 socios_bp = Blueprint('socios_formadores', __name__)
 
 
-def paginate_query(query, page=1, per_page=20):
-    page = max(1, int(page))
-    paginated = query.paginate(page=page, per_page=per_page, error_out=False)
-    return paginated.items, {
-        'page': paginated.page,
-        'per_page': paginated.per_page,
-        'total': paginated.total,
-        'pages': paginated.pages,
-    }
-
-
 @socios_bp.route('', methods=['GET'])
 @role_required('Admin')
 def get_socios():
@@ -24,13 +16,13 @@ def get_socios():
     per_page = request.args.get('per_page', 20, type=int)
     q = request.args.get('q', '').strip()
 
-    query = SocioFormador.query
+    socios = catalogos.socios()
     if q:
-        query = query.filter(SocioFormador.nombre.ilike(f'%{q}%'))
-    query = query.order_by(SocioFormador.nombre)
-    items, pagination = paginate_query(query, page, per_page)
+        q = q.lower()
+        socios = [s for s in socios if q in s['nombre'].lower()]
+    items, pagination = catalogos.paginar_lista(socios, page, per_page)
     return jsonify({
-        'data': [{'id': s.id, 'nombre': s.nombre} for s in items],
+        'data': items,
         'pagination': pagination,
     })
 
@@ -81,6 +73,7 @@ def delete_socio(id):
 
 @socios_bp.route('/<int:id>/detalle', methods=['GET'])
 @role_required('Admin')
+@lectura_replica
 def detalle_socio(id):
     socio = SocioFormador.query.get_or_404(id)
     servicios = Servicio.query.filter_by(socio_formador_id=id).all()
@@ -113,6 +106,8 @@ def detalle_socio(id):
 
 @socios_bp.route('/stats', methods=['GET'])
 @role_required('Admin')
+@lectura_replica
+@etag_versionado('socios_formadores', 'servicios', 'preregistros')
 def stats_socios():
     results = db.session.query(
         SocioFormador.id,
@@ -0,0 +1,216 @@
+"""Generador de datos sintéticos para benchmarks y pruebas de carga.
+
+Todos los registros generados usan el prefijo ``bench`` (usernames, matrículas
+``b0000001``...) para poder identificarlos y limpiarlos sin tocar datos reales.
+La generación es reproducible: la misma semilla produce los mismos datos.
+"""
+import random
+from datetime import datetime, date, timedelta
+
+import bcrypt
+
+from app import db, particiones
+from app.models import (
+    Usuario, Estudiante, Carrera, SocioFormador, Servicio, PreRegistro, AsistenciaFeria, PreferenciaServicio,
+    EventoFeria,
+)
+
+PREFIJO = 'bench'
+PASSWORD = 'bench123'
+CHUNK = 5000
+
+HORARIOS = ['09:00 - 10:00', '10:00 - 11:00', '11:00 - 12:00', '12:00 - 13:00', '13:00 - 14:00']
+ESTATUS = ['pendiente', 'dentro', 'asistió', 'no_asistió']
+
+_NOMBRES = ['Ana', 'Luis', 'María', 'José', 'Sofía', 'Diego', 'Valeria', 'Carlos', 'Fernanda', 'Jorge',
+            'Daniela', 'Miguel', 'Paola', 'Ricardo', 'Andrea', 'Emilio', 'Regina', 'Santiago']
+_APELLIDOS = ['García', 'Hernández', 'López', 'Martínez', 'González', 'Pérez', 'Rodríguez', 'Sánchez',
+              'Ramírez', 'Cruz', 'Flores', 'Gómez', 'Morales', 'Vázquez', 'Reyes', 'Jiménez']
+_AREAS = ['Educación', 'Salud comunitaria', 'Medio ambiente', 'Tecnología social', 'Desarrollo rural',
+          'Cultura', 'Emprendimiento', 'Inclusión']
+
+
+def matricula_bench(i):
+    return f'b{i:07d}'
+
+
+def periodos_bench(n):
+    anio = date.today().year - (n // 2)
+    return [f'{anio + i // 2}-{i % 2 + 1}' for i in range(n)]
+
+
+def _insertar(modelo, filas):
+    for i in range(0, len(filas), CHUNK):
+        db.session.execute(db.insert(modelo), filas[i:i + CHUNK])
+
+
+def _usuarios_bench():
+    return Usuario.username.startswith(f'{PREFIJO}_', autoescape=True)
+
+
+def _estudiantes_bench():
+    return db.select(Estudiante.id).join(Usuario, Usuario.id == Estudiante.usuario_id).where(_usuarios_bench())
+
+
+def hay_datos_bench():
+    return db.session.query(Usuario.id).filter(_usuarios_bench()).first() is not None
+
+
+def limpiar():
+    """Elimina todos los registros generados por el seeder."""
+    est_ids = _estudiantes_bench()
+    serv_ids = db.select(Servicio.id).where(Servicio.crn.startswith(f'{PREFIJO}-'))
+
+    for modelo, columna, ids in (
+        (AsistenciaFeria, AsistenciaFeria.servicio_id, serv_ids),
+        (AsistenciaFeria, AsistenciaFeria.estudiante_id, est_ids),
+        (PreRegistro, PreRegistro.servicio_id, serv_ids),
+        (PreRegistro, PreRegistro.estudiante_id, est_ids),
+        (PreferenciaServicio, PreferenciaServicio.servicio_id, serv_ids),
+        (PreferenciaServicio, PreferenciaServicio.estudiante_id, est_ids),
+    ):
+        modelo.query.filter(columna.in_(ids)).delete(synchronize_session=False)
+
+    EventoFeria.query.filter(EventoFeria.nombre.startswith(f'{PREFIJO} ')).delete(synchronize_session=False)
+    Estudiante.query.filter(Estudiante.id.in_(est_ids)).delete(synchronize_session=False)
+    Servicio.query.filter(Servicio.crn.startswith(f'{PREFIJO}-')).delete(synchronize_session=False)
+    Usuario.query.filter(_usuarios_bench()).delete(synchronize_session=False)
+    SocioFormador.query.filter(SocioFormador.nombre.startswith(f'{PREFIJO} ')).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def sembrar(estudiantes=20000, servicios=1000, periodos=6, preregistros=100000,
+            asistencias=100000, socios=50, semilla=42, log=print):
+    """Inserta un volumen realista de datos. Devuelve un resumen con los conteos."""
+    rng = random.Random(semilla)
+    lista_periodos = periodos_bench(periodos)
+
+    # ── Catálogos ────────────────────────────────────────
+    carreras = [c.id for c in Carrera.query.all()]
+    if not carreras:
+        _insertar(Carrera, [{'nombre': f'Carrera {PREFIJO} {i}', 'abreviatura': f'CB{i}'} for i in range(12)])
+        carreras = [c.id for c in Carrera.query.all()]
+
+    _insertar(SocioFormador, [{'nombre': f'{PREFIJO} Socio {i:03d}'} for i in range(socios)])
+    socio_ids = [s.id for s in SocioFormador.query.filter(SocioFormador.nombre.startswith(f'{PREFIJO} '))]
+    log(f'{len(socio_ids)} socios formadores')
+
+    # ── Servicios (repartidos entre periodos) ────────────
+    for periodo in lista_periodos:
+        particiones.asegurar_particion(periodo)
+    filas = []
+    for i in range(servicios):
+        filas.append({
+            'descripcion': f'{rng.choice(_AREAS)} — proyecto {i}',
+            'crn': f'{PREFIJO}-{i:05d}',
+            'periodo': lista_periodos[i % periodos],
+            'cupo_maximo': rng.randint(80, 160),
+            'socio_formador_id': rng.choice(socio_ids),
+        })
+    _insertar(Servicio, filas)
+    servicios_por_periodo = {p: [] for p in lista_periodos}
+    for s in db.session.query(Servicio.id, Servicio.periodo, Servicio.cupo_maximo)\
+            .filter(Servicio.crn.startswith(f'{PREFIJO}-')).order_by(Servicio.id):
+        servicios_por_periodo[s.periodo].append([s.id, s.cupo_maximo])
+    log(f'{servicios} servicios en {periodos} periodos')
+
+    # ── Usuarios y estudiantes ───────────────────────────
+    password_hash = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt()).decode()
+    _insertar(Usuario, [
+        {'username': f'{PREFIJO}_admin', 'password_hash': password_hash, 'rol': 'Admin'},
+        {'username': f'{PREFIJO}_becario', 'password_hash': password_hash, 'rol': 'Becario'},
+    ] + [
+        {'username': f'{PREFIJO}_{i:07d}', 'password_hash': password_hash, 'rol': 'Estudiante'}
+        for i in range(estudiantes)
+    ])
+    usuario_ids = dict(db.session.query(Usuario.username, Usuario.id).filter(_usuarios_bench()))
+    filas = []
+    for i in range(estudiantes):
+        nombre = f'{rng.choice(_NOMBRES)} {rng.choice(_APELLIDOS)} {rng.choice(_APELLIDOS)}'
+        filas.append({
+            'usuario_id': usuario_ids[f'{PREFIJO}_{i:07d}'],
+            'nombre_completo': nombre,
+            'matricula': matricula_bench(i),
+            'carrera_id': rng.choice(carreras),
+            'celular': f'55{rng.randint(10000000, 99999999)}',
+            'correo_alterno': f'{matricula_bench(i)}@bench.example.com',
+        })
+    _insertar(Estudiante, filas)
+    est_ids = list(db.session.scalars(_estudiantes_bench().order_by(Estudiante.matricula)))
+    log(f'{len(est_ids)} estudiantes')
+
+    # ── Pre-registros: 1 servicio por periodo, respetando cupo ──
+    # Los pesos decrecientes simulan unos cuantos CRNs muy solicitados.
+    por_periodo = preregistros // periodos
+    inscritos_periodo = {}
+    filas = []
+    inicio = datetime.utcnow() - timedelta(days=30 * periodos)
+    for n, periodo in enumerate(lista_periodos):
+        cupos = servicios_por_periodo[periodo]
+        pesos = [1.0 / (k + 1) ** 0.6 for k in range(len(cupos))]
+        elegidos = rng.sample(est_ids, min(por_periodo, len(est_ids)))
+        inscritos_periodo[periodo] = elegidos
+        for est_id in elegidos:
+            for _ in range(10):
+                k = rng.choices(range(len(cupos)), weights=pesos)[0]
+                if cupos[k][1] > 0:
+                    break
+            else:
+                k = next((j for j, c in enumerate(cupos) if c[1] > 0), None)
+                if k is None:
+                    break
+            cupos[k][1] -= 1
+            filas.append({
+                'estudiante_id': est_id,
+                'servicio_id': cupos[k][0],
+                'periodo': periodo,
+                'fecha_registro': inicio + timedelta(days=30 * n, minutes=rng.randint(0, 60 * 24 * 14)),
+            })
+    _insertar(PreRegistro, filas)
+    total_preregistros = len(filas)
+    log(f'{total_preregistros} pre-registros')
+
+    # ── Eventos: una feria por periodo, solo la última activa ──
+    _insertar(EventoFeria, [{
+        'nombre': f'{PREFIJO} Feria {periodo}',
+        'descripcion': 'Evento sintético',
+        'fecha_evento': (inicio + timedelta(days=30 * n)).date(),
+        'hora_inicio': datetime.strptime(HORARIOS[0][:5], '%H:%M').time(),
+        'hora_fin': datetime.strptime(HORARIOS[-1][-5:], '%H:%M').time(),
+        'ubicacion': 'Campus',
+        'estatus': 'activo' if n == periodos - 1 else 'cerrado',
+        'periodo': periodo,
+    } for n, periodo in enumerate(lista_periodos)])
+    evento_ids = dict(db.session.query(EventoFeria.periodo, EventoFeria.id)
+                      .filter(EventoFeria.nombre.startswith(f'{PREFIJO} ')))
+
+    # ── Asistencias a feria: todo inscrito tiene asistencia ──
+    filas = []
+    por_periodo = max(asistencias // periodos, 0)
+    for n, periodo in enumerate(lista_periodos):
+        asistentes = set(inscritos_periodo[periodo])
+        extra = [e for e in rng.sample(est_ids, min(len(est_ids), por_periodo)) if e not in asistentes]
+        asistentes.update(extra[:max(0, por_periodo - len(asistentes))])
+        actual = n == periodos - 1
+        for est_id in sorted(asistentes):
+            estatus = 'pendiente' if actual and rng.random() < 0.5 else rng.choice(ESTATUS)
+            filas.append({
+                'estudiante_id': est_id,
+                'fecha_asistencia': (inicio + timedelta(days=30 * n)).date(),
+                'horario_seleccionado': rng.choice(HORARIOS),
+                'estatus_asistencia': estatus,
+                'periodo': periodo,
+                'evento_feria_id': evento_ids[periodo],
+            })
+    _insertar(AsistenciaFeria, filas)
+    log(f'{len(filas)} asistencias')
+
+    db.session.commit()
+    return {
+        'periodos': lista_periodos,
+        'socios': len(socio_ids),
+        'servicios': servicios,
+        'estudiantes': len(est_ids),
+        'preregistros': total_preregistros,
+        'asistencias': len(filas),
+    }
@@ -0,0 +1,109 @@
+"""Serializadores de salida por recurso.
+
+Reciben filas de un ``select()`` de columnas (ver ``catalogos.paginar_select``)
+o cualquier objeto con los mismos atributos. Una función por recurso arma el
+dict de respuesta, para que las conversiones de fechas y valores vacíos vivan
+en un solo lugar y todos los endpoints devuelvan la misma forma. Se devuelven dicts y no dataclasses: tanto
+orjson como el proveedor estándar de Flask serializan un dict varias veces más
+rápido que una dataclass con ``__slots__`` (ver ``flask benchmark-json``).
+"""
+
+
+def iso(valor):
+    return valor.isoformat() if valor else None
+
+
+def _texto(valor):
+    return valor or ''
+
+
+# Campos que acepta ``?fields=`` en los listados: campo -> conversión del valor
+# de la fila (None = tal cual). Deben coincidir con la función del recurso,
+# que sigue siendo la ruta rápida cuando se piden todos los campos.
+CAMPOS_ESTUDIANTE = {
+    'id': None, 'nombre_completo': None, 'matricula': None, 'carrera': _texto, 'carrera_id': None,
+    'celular': _texto, 'correo_alterno': _texto, 'username': _texto, 'usuario_id': None,
+}
+CAMPOS_SERVICIO = {
+    'id': None, 'descripcion': None, 'crn': None, 'periodo': None, 'cupo_maximo': None,
+    'inscritos': None, 'socio_formador_id': None, 'socio_formador_nombre': None,
+}
+CAMPOS_PREREGISTRO = {
+    'id': None, 'estudiante_nombre': None, 'matricula': None, 'carrera': None, 'crn': None,
+    'servicio_descripcion': None, 'periodo': None, 'fecha_registro': iso,
+}
+
+
+def proyectar(fila, campos, conversiones):
+    """Dict con solo ``campos`` de la fila, con las conversiones del recurso."""
+    salida = {}
+    for campo in campos:
+        valor = getattr(fila, campo)
+        conversion = conversiones[campo]
+        salida[campo] = conversion(valor) if conversion else valor
+    return salida
+
+
+def estudiante(e):
+    return {
+        'id': e.id,
+        'nombre_completo': e.nombre_completo,
+        'matricula': e.matricula,
+        'carrera': e.carrera or '',
+        'carrera_id': e.carrera_id,
+        'celular': e.celular or '',
+        'correo_alterno': e.correo_alterno or '',
+        'username': e.username or '',
+        'usuario_id': e.usuario_id,
+    }
+
+
+def servicio(s, inscritos):
+    return {
+        'id': s.id,
+        'descripcion': s.descripcion,
+        'crn': s.crn,
+        'periodo': s.periodo,
+        'cupo_maximo': s.cupo_maximo,
+        'inscritos': inscritos,
+        'socio_formador_id': s.socio_formador_id,
+        'socio_formador_nombre': s.socio_formador_nombre,
+    }
+
+
+def preregistro(r):
+    return {
+        'id': r.id,
+        'estudiante_nombre': r.estudiante_nombre,
+        'matricula': r.matricula,
+        'carrera': r.carrera,
+        'crn': r.crn,
+        'servicio_descripcion': r.servicio_descripcion,
+        'periodo': r.periodo,
+        'fecha_registro': iso(r.fecha_registro),
+    }
+
+
+def asistencia(a):
+    return {
+        'id': a.id,
+        'horario_seleccionado': a.horario_seleccionado,
+        'horario_id': a.horario_id,
+        'evento_feria_id': a.evento_feria_id,
+        'estatus_asistencia': a.estatus_asistencia,
+        'fecha_asistencia': iso(a.fecha_asistencia),
+    }
+
+
+def evento(e):
+    return {
+        'id': e.id,
+        'nombre': e.nombre,
+        'descripcion': e.descripcion,
+        'fecha_evento': iso(e.fecha_evento),
+        'hora_inicio': e.hora_inicio.strftime('%H:%M'),
+        'hora_fin': e.hora_fin.strftime('%H:%M'),
+        'ubicacion': e.ubicacion,
+        'estatus': e.estatus,
+        'periodo': e.periodo,
+    }
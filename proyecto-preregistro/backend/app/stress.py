@@ -0,0 +1,235 @@
+"""Arnés de estrés para la apertura de inscripciones.
+
+Lanza cientos de ``POST /api/preregistros`` concurrentes contra unos cuantos
+CRNs "calientes" sobre PostgreSQL y al terminar verifica las invariantes de
+``create_preregistro``: cupo máximo, un servicio por periodo y sin duplicados.
+Requiere datos generados con ``flask seed-data``.
+"""
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from flask_jwt_extended import create_access_token
+
+from app import create_app, db, limiter
+from app.benchmark import percentil
+from app.models import Usuario, Estudiante, Servicio, PreRegistro, AsistenciaFeria, TicketInscripcion
+from app.seeder import PREFIJO
+
+
+class MonitorLocks(threading.Thread):
+    """Muestrea pg_stat_activity para contar sesiones esperando un lock."""
+
+    SQL = db.text(
+        "SELECT count(*) FROM pg_stat_activity "
+        "WHERE wait_event_type = 'Lock' AND datname = current_database()"
+    )
+
+    def __init__(self, app, intervalo=0.02):
+        super().__init__(daemon=True)
+        self.app = app
+        self.intervalo = intervalo
+        self.muestras = []
+        self._detener = threading.Event()
+
+    def run(self):
+        with self.app.app_context():
+            with db.engine.connect() as conn:
+                while not self._detener.is_set():
+                    self.muestras.append(conn.execute(self.SQL).scalar())
+                    conn.rollback()
+                    time.sleep(self.intervalo)
+
+    def detener(self):
+        self._detener.set()
+        self.join()
+
+    def resumen(self):
+        con_espera = [m for m in self.muestras if m]
+        return {
+            'muestras': len(self.muestras),
+            'max_sesiones_esperando': max(self.muestras, default=0),
+            'promedio_sesiones_esperando': round(sum(self.muestras) / len(self.muestras), 2) if self.muestras else 0,
+            'pct_tiempo_con_esperas': round(100 * len(con_espera) / len(self.muestras), 1) if self.muestras else 0,
+        }
+
+
+def _deadlocks():
+    return db.session.execute(db.text(
+        'SELECT deadlocks FROM pg_stat_database WHERE datname = current_database()'
+    )).scalar() or 0
+
+
+def preparar(periodo=None, num_crns=3, lugares=25, num_estudiantes=400):
+    """Elige los CRNs calientes, fija su cupo libre y arma el grupo de estudiantes."""
+    if periodo is None:
+        periodo = db.session.query(db.func.max(Servicio.periodo))\
+            .filter(Servicio.crn.startswith(f'{PREFIJO}-')).scalar()
+    servicios = Servicio.query.filter(Servicio.crn.startswith(f'{PREFIJO}-'), Servicio.periodo == periodo)\
+        .order_by(Servicio.id).limit(num_crns).all()
+    if not servicios:
+        raise RuntimeError('No hay servicios de benchmark; ejecuta primero `flask seed-data`')
+
+    # Cupo = inscritos actuales + lugares libres, para forzar contención por los últimos lugares.
+    cupos_originales = {}
+    for s in servicios:
+        inscritos = PreRegistro.query.filter_by(servicio_id=s.id).count()
+        cupos_originales[s.id] = s.cupo_maximo
+        s.cupo_maximo = inscritos + lugares
+
+    # Estudiantes con asistencia a la feria y sin servicio en el periodo.
+    con_servicio = db.session.query(PreRegistro.estudiante_id).join(Servicio)\
+        .filter(Servicio.periodo == periodo)
+    candidatos = [e for (e,) in db.session.query(Estudiante.id)
+                  .join(AsistenciaFeria, AsistenciaFeria.estudiante_id == Estudiante.id)
+                  .filter(Estudiante.matricula.startswith('b'), ~Estudiante.id.in_(con_servicio))
+                  .distinct().order_by(Estudiante.id).limit(num_estudiantes)]
+
+    becario = Usuario.query.filter_by(username=f'{PREFIJO}_becario').first()
+    max_id = db.session.query(db.func.max(PreRegistro.id)).scalar() or 0
+    db.session.commit()
+    return {
+        'periodo': periodo,
+        'servicios': [(s.id, s.crn) for s in servicios],
+        'cupos_originales': cupos_originales,
+        'estudiantes': candidatos,
+        'headers': {'Authorization': f'Bearer {create_access_token(identity=becario.id)}'},
+        'max_id_previo': max_id,
+    }
+
+
+def generar_intentos(ctx, intentos, pct_repetidos=0.2, semilla=7):
+    """Lista de (estudiante_id, crn). Una fracción reusa estudiantes para
+    provocar duplicados y dobles inscripciones en el mismo periodo."""
+    rng = random.Random(semilla)
+    crns = [crn for _, crn in ctx['servicios']]
+    usados = []
+    lista = []
+    for _ in range(intentos):
+        if usados and rng.random() < pct_repetidos:
+            est = rng.choice(usados)
+        else:
+            est = rng.choice(ctx['estudiantes'])
+            usados.append(est)
+        lista.append((est, rng.choice(crns)))
+    return lista
+
+
+def verificar_invariantes(ctx):
+    servicio_ids = [sid for sid, _ in ctx['servicios']]
+    violaciones = []
+
+    sobrecupo = db.session.query(Servicio.crn, Servicio.cupo_maximo, db.func.count(PreRegistro.id))\
+        .join(PreRegistro, PreRegistro.servicio_id == Servicio.id)\
+        .filter(Servicio.id.in_(servicio_ids))\
+        .group_by(Servicio.id, Servicio.crn, Servicio.cupo_maximo)\
+        .having(db.func.count(PreRegistro.id) > Servicio.cupo_maximo).all()
+    violaciones += [f'cupo excedido en {crn}: {n} > {cupo}' for crn, cupo, n in sobrecupo]
+
+    dobles = db.session.query(PreRegistro.estudiante_id, db.func.count(PreRegistro.id))\
+        .join(Servicio).filter(Servicio.periodo == ctx['periodo'],
+                               PreRegistro.estudiante_id.in_(ctx['estudiantes']))\
+        .group_by(PreRegistro.estudiante_id).having(db.func.count(PreRegistro.id) > 1).all()
+    violaciones += [f'estudiante {e} con {n} servicios en {ctx["periodo"]}' for e, n in dobles]
+
+    duplicados = db.session.query(PreRegistro.estudiante_id, PreRegistro.servicio_id, db.func.count())\
+        .filter(PreRegistro.servicio_id.in_(servicio_ids))\
+        .group_by(PreRegistro.estudiante_id, PreRegistro.servicio_id)\
+        .having(db.func.count() > 1).all()
+    violaciones += [f'duplicado estudiante {e} servicio {s} ({n})' for e, s, n in duplicados]
+    return violaciones
+
+
+def restaurar(ctx):
+    PreRegistro.query.filter(
+        PreRegistro.id > ctx['max_id_previo'],
+        PreRegistro.servicio_id.in_([sid for sid, _ in ctx['servicios']]),
+    ).delete(synchronize_session=False)
+    for sid, cupo in ctx['cupos_originales'].items():
+        Servicio.query.filter_by(id=sid).update({'cupo_maximo': cupo})
+    if 'max_ticket_previo' in ctx:
+        TicketInscripcion.query.filter(
+            TicketInscripcion.id > ctx['max_ticket_previo'],
+            TicketInscripcion.crn.in_([crn for _, crn in ctx['servicios']]),
+        ).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def ejecutar(intentos=500, hilos=50, num_crns=3, lugares=25, periodo=None, semilla=7,
+             conservar=False, modo='directo', log=print):
+    """Corre la prueba y devuelve un reporte con throughput, latencia, locks y violaciones.
+
+    Con ``modo='cola'`` cada petición espera el resultado de su ticket (long-poll),
+    así que la latencia incluye el tiempo en cola.
+    """
+    # App dedicada con un pool del tamaño de la concurrencia, para que las esperas
+    # medidas sean de la base y no del pool de conexiones. Los workers de la cola
+    # (uno por CRN) usan conexiones adicionales. Sin carriles (con 50 hilos el
+    # carril normal rechazaría con 503 y se mediría el descarte, no la base) ni
+    # tareas de mantenimiento que compitan por locks durante la medición.
+    app = create_app({
+        'SQLALCHEMY_ENGINE_OPTIONS': {'pool_size': hilos + num_crns, 'max_overflow': 0},
+        'INSCRIPCION_MODO': modo,
+        'CARRILES_HABILITADOS': False,
+        'MANTENIMIENTO_HABILITADO': False,
+    })
+    url = '/api/preregistros?esperar=60' if modo == 'cola' else '/api/preregistros'
+
+    with app.app_context():
+        if db.engine.dialect.name != 'postgresql':
+            raise RuntimeError('El arnés de estrés requiere PostgreSQL')
+        limiter.enabled = False
+        ctx = preparar(periodo, num_crns, lugares)
+        if modo == 'cola':
+            ctx['max_ticket_previo'] = db.session.query(db.func.max(TicketInscripcion.id)).scalar() or 0
+        lista = generar_intentos(ctx, intentos, semilla=semilla)
+        deadlocks_antes = _deadlocks()
+        db.session.remove()
+    log(f"Periodo {ctx['periodo']}, CRNs {[c for _, c in ctx['servicios']]}, "
+        f"{lugares} lugares libres c/u, {len(lista)} intentos con {hilos} hilos (modo {modo})")
+
+    client = app.test_client()
+    barrera = threading.Barrier(hilos)
+    resultados = []
+
+    def worker(indices):
+        barrera.wait()
+        for i in indices:
+            est, crn = lista[i]
+            inicio = time.perf_counter()
+            resp = client.post(url, json={'estudiante_id': est, 'crn': crn},
+                               headers=ctx['headers'])
+            resultados.append(((time.perf_counter() - inicio) * 1000, resp.status_code))
+
+    monitor = MonitorLocks(app)
+    monitor.start()
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        futuros = [pool.submit(worker, range(h, len(lista), hilos)) for h in range(hilos)]
+        for f in futuros:
+            f.result()
+    duracion = time.perf_counter() - inicio
+    monitor.detener()
+
+    with app.app_context():
+        violaciones = verificar_invariantes(ctx)
+        deadlocks = _deadlocks() - deadlocks_antes
+        if not conservar:
+            restaurar(ctx)
+    limiter.enabled = True
+
+    latencias = [l for l, _ in resultados]
+    return {
+        'intentos': len(resultados),
+        'duracion_s': round(duracion, 2),
+        'throughput_rps': round(len(resultados) / duracion, 1) if duracion else 0,
+        'p50_ms': round(percentil(latencias, 50), 2),
+        'p95_ms': round(percentil(latencias, 95), 2),
+        'p99_ms': round(percentil(latencias, 99), 2),
+        'status': dict(sorted(Counter(s for _, s in resultados).items())),
+        'locks': monitor.resumen(),
+        'deadlocks': deadlocks,
+        'violaciones': violaciones,
+    }
@@ -0,0 +1,117 @@
+"""Sellos de versión por tabla, compartidos entre workers vía la tabla ``versiones_datos``.
+
+Cada commit que inserta, modifica o borra filas de una tabla registrada
+incrementa su contador. Se detecta tanto por el flush del ORM como por
+``Query.update()/delete()`` y ``session.execute(insert/update/delete)``.
+El incremento es la última sentencia de la misma transacción
+(``before_commit``): confirma o se revierte junto con los datos, así que un
+ETag o una caché nunca se quedan con la versión vieja de datos ya escritos.
+El lock de la fila del contador solo se tiene entre esa sentencia y el commit.
+"""
+import logging
+
+from sqlalchemy import event
+
+from app import db
+from app.models import VersionDatos
+
+logger = logging.getLogger(__name__)
+
+RECURSOS = frozenset({
+    'carreras', 'socios_formadores', 'servicios', 'preregistros',
+    'estudiantes', 'asistencias_feria', 'usuarios', 'eventos_feria',
+})
+
+_INFO_KEY = 'recursos_modificados'
+_INFO_INCREMENTADOS = 'recursos_incrementados'
+_listeners = []
+_disponible = {}
+
+
+def al_cambiar(fn):
+    """Registra ``fn(recursos)``, llamada en este proceso después de cada incremento."""
+    _listeners.append(fn)
+    return fn
+
+
+def _marcar(session, tabla):
+    if tabla in RECURSOS:
+        session.info.setdefault(_INFO_KEY, set()).add(tabla)
+
+
+def _after_flush(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        _marcar(session, getattr(obj, '__tablename__', None))
+
+
+def _do_orm_execute(state):
+    if (state.is_insert or state.is_update or state.is_delete) and state.bind_mapper is not None:
+        _marcar(state.session, state.bind_mapper.persist_selectable.name)
+
+
+def _before_commit(session):
+    # El flush final del commit corre después de este hook: se adelanta para marcar sus tablas
+    session.flush()
+    recursos = sorted(session.info.pop(_INFO_KEY, set()) & RECURSOS)
+    if not recursos or not tabla_disponible():
+        return
+    tabla = VersionDatos.__table__
+    actualizados = session.execute(
+        tabla.update().where(tabla.c.recurso.in_(recursos)).values(version=tabla.c.version + 1)
+    ).rowcount
+    if actualizados < len(recursos):
+        # La migración siembra todas las filas; faltan solo en bases creadas con create_all()
+        existentes = set(session.scalars(db.select(tabla.c.recurso).where(tabla.c.recurso.in_(recursos))))
+        faltantes = [{'recurso': r, 'version': 1} for r in recursos if r not in existentes]
+        if faltantes:
+            session.execute(tabla.insert(), faltantes)
+    session.info.setdefault(_INFO_INCREMENTADOS, set()).update(recursos)
+
+
+def _after_commit(session):
+    recursos = session.info.pop(_INFO_INCREMENTADOS, None)
+    if recursos:
+        for fn in _listeners:
+            fn(set(recursos))
+
+
+def _after_rollback(session):
+    session.info.pop(_INFO_KEY, None)
+    session.info.pop(_INFO_INCREMENTADOS, None)
+
+
+def tabla_disponible():
+    """La tabla puede no existir si no se ha corrido la migración; en ese caso
+    ETags y caché quedan deshabilitados en vez de romper las peticiones."""
+    engine = db.engine
+    if engine not in _disponible:
+        _disponible[engine] = db.inspect(engine).has_table(VersionDatos.__tablename__)
+        if not _disponible[engine]:
+            logger.warning('Tabla versiones_datos no encontrada: ejecuta migracion_versiones_datos.sql')
+    return _disponible[engine]
+
+
+def incrementar(recursos):
+    """Marca ``recursos`` como modificados en la transacción actual de ``db.session``,
+    para escrituras que no pasan por el ORM (TRUNCATE). Se incrementan en su commit."""
+    db.session.info.setdefault(_INFO_KEY, set()).update(set(recursos) & RECURSOS)
+
+
+def versiones(recursos):
+    """``{recurso: version}`` para los recursos pedidos, o None si no hay tabla."""
+    if not tabla_disponible():
+        return None
+    filas = db.session.execute(
+        db.select(VersionDatos.recurso, VersionDatos.version).where(VersionDatos.recurso.in_(recursos))
+    ).all()
+    actuales = dict.fromkeys(recursos, 0)
+    actuales.update(filas)
+    return actuales
+
+
+def init_versiones(app):
+    for nombre, fn in (('after_flush', _after_flush), ('do_orm_execute', _do_orm_execute),
+                       ('before_commit', _before_commit), ('after_commit', _after_commit),
+                       ('after_rollback', _after_rollback)):
+        if not event.contains(db.session, nombre, fn):
+            event.listen(db.session, nombre, fn)
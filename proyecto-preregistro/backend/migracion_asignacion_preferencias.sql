@@ -0,0 +1,25 @@
+-- Migración: asignación de servicios por preferencias
+-- Ejecutar en la base de datos Feria_Servicios
+
+CREATE TABLE IF NOT EXISTS ventanas_asignacion (
+  id           SERIAL PRIMARY KEY,
+  periodo      VARCHAR(30) NOT NULL UNIQUE,
+  abre         TIMESTAMP NOT NULL,
+  cierra       TIMESTAMP NOT NULL,
+  estado       VARCHAR(20) NOT NULL DEFAULT 'abierta',
+  semilla      INTEGER,
+  ejecutada_en TIMESTAMP,
+  resumen      TEXT
+);
+
+CREATE TABLE IF NOT EXISTS preferencias_servicio (
+  id            SERIAL PRIMARY KEY,
+  estudiante_id INTEGER NOT NULL REFERENCES estudiantes(id),
+  periodo       VARCHAR(30) NOT NULL,
+  servicio_id   INTEGER NOT NULL REFERENCES servicios(id),
+  rango         INTEGER NOT NULL,
+  CONSTRAINT uq_preferencia_rango UNIQUE (estudiante_id, periodo, rango),
+  CONSTRAINT uq_preferencia_servicio UNIQUE (estudiante_id, servicio_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_preferencias_servicio_periodo ON preferencias_servicio (periodo);
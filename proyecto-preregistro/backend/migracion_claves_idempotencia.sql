@@ -0,0 +1,17 @@
+-- Migración: respuestas guardadas para el header Idempotency-Key
+-- Ejecutar en la base de datos Feria_Servicios
+
+CREATE TABLE IF NOT EXISTS claves_idempotencia (
+  alcance     VARCHAR(120) NOT NULL,
+  clave       VARCHAR(128) NOT NULL,
+  huella      VARCHAR(64) NOT NULL,
+  estado      VARCHAR(20) NOT NULL DEFAULT 'en_proceso',
+  status_code INTEGER,
+  cuerpo      BYTEA,
+  headers     TEXT,
+  creado      TIMESTAMP NOT NULL DEFAULT now(),
+  expira      TIMESTAMP NOT NULL,
+  PRIMARY KEY (alcance, clave)
+);
+
+CREATE INDEX IF NOT EXISTS ix_claves_idempotencia_expira ON claves_idempotencia (expira);
@@ -0,0 +1,18 @@
+-- Migración: bitácora de auditoría de operaciones administrativas
+-- Ejecutar en la base de datos Feria_Servicios
+
+CREATE TABLE IF NOT EXISTS eventos_auditoria (
+  id          BIGSERIAL PRIMARY KEY,
+  creado      TIMESTAMP NOT NULL,
+  usuario_id  INTEGER,
+  metodo      VARCHAR(10) NOT NULL,
+  accion      VARCHAR(80) NOT NULL,
+  recurso_id  VARCHAR(40),
+  status_code INTEGER NOT NULL,
+  ip          VARCHAR(45),
+  detalle     TEXT
+);
+
+CREATE INDEX IF NOT EXISTS ix_eventos_auditoria_creado ON eventos_auditoria (creado);
+CREATE INDEX IF NOT EXISTS ix_eventos_auditoria_usuario_creado ON eventos_auditoria (usuario_id, creado);
+CREATE INDEX IF NOT EXISTS ix_eventos_auditoria_accion_creado ON eventos_auditoria (accion, creado);
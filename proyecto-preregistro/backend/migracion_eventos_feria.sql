@@ -0,0 +1,25 @@
+-- Migración: eventos de feria y asistencias acotadas por evento
+-- Ejecutar en la base de datos Feria_Servicios
+
+-- La tabla ya existe en las bases creadas con BASE.sql; se crea solo si falta.
+CREATE TABLE IF NOT EXISTS eventos_feria (
+  id           INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+  nombre       VARCHAR(150) NOT NULL,
+  descripcion  TEXT NOT NULL,
+  fecha_evento DATE NOT NULL,
+  hora_inicio  TIME NOT NULL,
+  hora_fin     TIME NOT NULL,
+  ubicacion    VARCHAR(200) NOT NULL,
+  estatus      VARCHAR(20) NOT NULL
+);
+
+ALTER TABLE eventos_feria ADD COLUMN IF NOT EXISTS periodo VARCHAR(30);
+CREATE INDEX IF NOT EXISTS ix_eventos_feria_periodo ON eventos_feria (periodo);
+
+-- Índices compuestos por evento (en la tabla particionada se crean en cada partición)
+CREATE INDEX IF NOT EXISTS ix_asistencias_feria_evento_estatus
+  ON asistencias_feria (evento_feria_id, estatus_asistencia);
+CREATE INDEX IF NOT EXISTS ix_asistencias_feria_evento_estudiante
+  ON asistencias_feria (evento_feria_id, estudiante_id);
+
+ANALYZE asistencias_feria;
@@ -0,0 +1,35 @@
+-- Migración: feed de cambios incremental (marca de transacción + lápidas de filas borradas)
+-- Ejecutar en la base de datos Feria_Servicios
+-- Las filas existentes toman la marca de la migración: la primera sincronización las trae todas.
+-- transaccion es el xid de la transacción que escribió la fila (txid_current()). El feed
+-- solo publica marcas menores que la transacción abierta más antigua, así que el orden
+-- sigue al commit y no al reloj de la aplicación.
+
+ALTER TABLE estudiantes       ADD COLUMN IF NOT EXISTS actualizado TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc');
+ALTER TABLE preregistros      ADD COLUMN IF NOT EXISTS actualizado TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc');
+ALTER TABLE asistencias_feria ADD COLUMN IF NOT EXISTS actualizado TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc');
+
+ALTER TABLE estudiantes       ADD COLUMN IF NOT EXISTS transaccion BIGINT NOT NULL DEFAULT txid_current();
+ALTER TABLE preregistros      ADD COLUMN IF NOT EXISTS transaccion BIGINT NOT NULL DEFAULT txid_current();
+ALTER TABLE asistencias_feria ADD COLUMN IF NOT EXISTS transaccion BIGINT NOT NULL DEFAULT txid_current();
+
+DROP INDEX IF EXISTS ix_estudiantes_actualizado;
+DROP INDEX IF EXISTS ix_preregistros_actualizado;
+DROP INDEX IF EXISTS ix_asistencias_feria_actualizado;
+CREATE INDEX IF NOT EXISTS ix_estudiantes_transaccion       ON estudiantes (transaccion, id);
+CREATE INDEX IF NOT EXISTS ix_preregistros_transaccion      ON preregistros (transaccion, id);
+CREATE INDEX IF NOT EXISTS ix_asistencias_feria_transaccion ON asistencias_feria (transaccion, id);
+
+CREATE TABLE IF NOT EXISTS registros_eliminados (
+  id          BIGSERIAL PRIMARY KEY,
+  tabla       VARCHAR(40) NOT NULL,
+  registro_id INTEGER,
+  periodo     VARCHAR(30),
+  eliminado   TIMESTAMP NOT NULL,
+  transaccion BIGINT NOT NULL DEFAULT txid_current()
+);
+ALTER TABLE registros_eliminados ADD COLUMN IF NOT EXISTS transaccion BIGINT NOT NULL DEFAULT txid_current();
+
+CREATE INDEX IF NOT EXISTS ix_registros_eliminados_eliminado ON registros_eliminados (eliminado);
+DROP INDEX IF EXISTS ix_registros_eliminados_tabla_id;
+CREATE INDEX IF NOT EXISTS ix_registros_eliminados_tabla_transaccion ON registros_eliminados (tabla, transaccion, id);
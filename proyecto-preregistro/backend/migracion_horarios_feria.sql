@@ -0,0 +1,22 @@
+-- Migración: bloques de horario de la feria con cupo y contador de ocupación
+-- Ejecutar en la base de datos Feria_Servicios
+
+CREATE TABLE IF NOT EXISTS horarios_feria (
+  id          SERIAL PRIMARY KEY,
+  periodo     VARCHAR(30) NOT NULL,
+  etiqueta    VARCHAR(50) NOT NULL,
+  hora_inicio TIME NOT NULL,
+  hora_fin    TIME NOT NULL,
+  capacidad   INTEGER NOT NULL,
+  ocupados    INTEGER NOT NULL DEFAULT 0,
+  CONSTRAINT uq_horario_periodo_etiqueta UNIQUE (periodo, etiqueta),
+  CONSTRAINT ck_horario_ocupados CHECK (ocupados >= 0)
+);
+
+ALTER TABLE asistencias_feria
+  ADD COLUMN IF NOT EXISTS horario_id INTEGER REFERENCES horarios_feria(id);
+
+CREATE INDEX IF NOT EXISTS ix_asistencias_feria_horario_id ON asistencias_feria (horario_id);
+
+-- Los registros existentes (texto libre) se ligan a su bloque por etiqueta al
+-- crear los horarios del periodo desde el panel, o con: flask recalcular-horarios <periodo>
@@ -0,0 +1,5 @@
+-- Migración: índice para contar inscritos por servicio (listado de servicios)
+-- Ejecutar en la base de datos Feria_Servicios
+-- (migracion_particiones_periodo.sql ya lo crea; aquí es no-op en ese caso)
+
+CREATE INDEX IF NOT EXISTS ix_preregistros_servicio_id ON preregistros (servicio_id);
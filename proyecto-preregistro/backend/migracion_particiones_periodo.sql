@@ -0,0 +1,121 @@
+-- Migración: particionar preregistros y asistencias_feria por periodo (LIST)
+-- Ejecutar en la base de datos Feria_Servicios (PostgreSQL 12+), en una ventana
+-- sin tráfico de escritura. Todo corre en una sola transacción.
+--
+-- 1. Desnormaliza periodo en preregistros (copiado de servicios.periodo) y
+--    completa el de las asistencias (del servicio, del evento o '' si no
+--    tienen ninguno: models.SIN_PERIODO).
+-- 2. Recrea ambas tablas como particionadas, con PK (id, periodo), una
+--    partición por periodo existente más una DEFAULT. El nombre de cada
+--    partición lo calcula app/particiones.py::nombre_particion; las funciones
+--    deben coincidir.
+-- 3. Copia los datos conservando ids y ajusta las secuencias.
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION pg_temp.nombre_particion(tabla TEXT, periodo TEXT) RETURNS TEXT AS $$
+  SELECT tabla || '_p_' || trim(BOTH '_' FROM regexp_replace(lower(periodo), '[^a-z0-9]+', '_', 'g'))
+         || '_' || left(md5(periodo), 6)
+$$ LANGUAGE SQL IMMUTABLE;
+
+-- ── 1. periodo en preregistros ───────────────────────────
+ALTER TABLE preregistros ADD COLUMN IF NOT EXISTS periodo VARCHAR(30);
+UPDATE preregistros p SET periodo = s.periodo
+  FROM servicios s WHERE s.id = p.servicio_id AND p.periodo IS NULL;
+ALTER TABLE preregistros ALTER COLUMN periodo SET NOT NULL;
+
+-- ── 1b. periodo en asistencias_feria ─────────────────────
+-- La PK de una tabla particionada incluye la llave de partición, que no puede ser NULL
+UPDATE asistencias_feria a SET periodo = s.periodo
+  FROM servicios s WHERE s.id = a.servicio_id AND a.periodo IS NULL;
+UPDATE asistencias_feria a SET periodo = e.periodo
+  FROM eventos_feria e WHERE e.id = a.evento_feria_id AND a.periodo IS NULL AND e.periodo IS NOT NULL;
+UPDATE asistencias_feria SET periodo = '' WHERE periodo IS NULL;
+
+-- ── 2. preregistros particionada ─────────────────────────
+ALTER TABLE preregistros RENAME TO preregistros_old;
+ALTER TABLE preregistros_old DROP CONSTRAINT IF EXISTS uq_estudiante_servicio;
+ALTER TABLE preregistros_old DROP CONSTRAINT IF EXISTS pk_preregistros;
+ALTER TABLE preregistros_old DROP CONSTRAINT IF EXISTS fk_preregistros_estudiante_id;
+ALTER TABLE preregistros_old DROP CONSTRAINT IF EXISTS fk_preregistros_servicio_id;
+
+CREATE TABLE preregistros (
+  id INTEGER GENERATED BY DEFAULT AS IDENTITY,
+  estudiante_id INTEGER NOT NULL,
+  servicio_id INTEGER NOT NULL,
+  fecha_registro TIMESTAMP NOT NULL DEFAULT now(),
+  periodo VARCHAR(30) NOT NULL,
+  CONSTRAINT pk_preregistros PRIMARY KEY (id, periodo),
+  -- servicio_id determina el periodo: equivale al UNIQUE (estudiante_id, servicio_id) original
+  CONSTRAINT uq_estudiante_servicio UNIQUE (estudiante_id, servicio_id, periodo),
+  CONSTRAINT fk_preregistros_estudiante_id FOREIGN KEY (estudiante_id) REFERENCES estudiantes(id),
+  CONSTRAINT fk_preregistros_servicio_id FOREIGN KEY (servicio_id) REFERENCES servicios(id)
+) PARTITION BY LIST (periodo);
+
+CREATE TABLE preregistros_default PARTITION OF preregistros DEFAULT;
+CREATE INDEX ix_preregistros_servicio_id ON preregistros (servicio_id);
+CREATE INDEX ix_preregistros_estudiante_periodo ON preregistros (estudiante_id, periodo);
+
+-- ── 3. asistencias_feria particionada ────────────────────
+ALTER TABLE asistencias_feria RENAME TO asistencias_feria_old;
+ALTER TABLE asistencias_feria_old DROP CONSTRAINT IF EXISTS pk_asistencias_feria;
+ALTER TABLE asistencias_feria_old DROP CONSTRAINT IF EXISTS asistencias_feria_servicio_id_fkey;
+ALTER TABLE asistencias_feria_old DROP CONSTRAINT IF EXISTS fk_asistencias_feria_estudiante_id;
+ALTER TABLE asistencias_feria_old DROP CONSTRAINT IF EXISTS fk_asistencias_feria_evento_feria_id;
+
+CREATE TABLE asistencias_feria (
+  id INTEGER GENERATED BY DEFAULT AS IDENTITY,
+  estudiante_id INTEGER NOT NULL,
+  evento_feria_id INTEGER,
+  fecha_asistencia DATE NOT NULL,
+  estatus_asistencia VARCHAR(20) NOT NULL,
+  horario_seleccionado VARCHAR(50) NOT NULL DEFAULT 'Sin definir',
+  hora_real_asistencia TIME,
+  periodo VARCHAR(30) NOT NULL DEFAULT '',
+  hora_salida TIMESTAMP,
+  servicio_id INTEGER,
+  CONSTRAINT pk_asistencias_feria PRIMARY KEY (id, periodo),
+  CONSTRAINT asistencias_feria_servicio_id_fkey FOREIGN KEY (servicio_id) REFERENCES servicios(id) ON DELETE SET NULL,
+  CONSTRAINT fk_asistencias_feria_estudiante_id FOREIGN KEY (estudiante_id) REFERENCES estudiantes(id),
+  CONSTRAINT fk_asistencias_feria_evento_feria_id FOREIGN KEY (evento_feria_id) REFERENCES eventos_feria(id)
+) PARTITION BY LIST (periodo);
+-- Las asistencias sin periodo ('') caen en la DEFAULT
+CREATE TABLE asistencias_feria_default PARTITION OF asistencias_feria DEFAULT;
+CREATE INDEX ix_asistencias_feria_estudiante_id ON asistencias_feria (estudiante_id);
+CREATE INDEX ix_asistencias_feria_periodo_estatus ON asistencias_feria (periodo, estatus_asistencia);
+
+-- ── 4. Una partición por periodo conocido ────────────────
+DO $$
+DECLARE
+  p TEXT;
+BEGIN
+  FOR p IN
+    SELECT periodo FROM servicios
+    UNION SELECT periodo FROM asistencias_feria_old WHERE periodo <> ''
+  LOOP
+    EXECUTE format('CREATE TABLE %I PARTITION OF preregistros FOR VALUES IN (%L)',
+                   pg_temp.nombre_particion('preregistros', p), p);
+    EXECUTE format('CREATE TABLE %I PARTITION OF asistencias_feria FOR VALUES IN (%L)',
+                   pg_temp.nombre_particion('asistencias_feria', p), p);
+  END LOOP;
+END $$;
+
+-- ── 5. Copiar datos y ajustar secuencias ─────────────────
+INSERT INTO preregistros (id, estudiante_id, servicio_id, fecha_registro, periodo)
+  SELECT id, estudiante_id, servicio_id, fecha_registro, periodo FROM preregistros_old;
+INSERT INTO asistencias_feria (id, estudiante_id, evento_feria_id, fecha_asistencia, estatus_asistencia,
+                               horario_seleccionado, hora_real_asistencia, periodo, hora_salida, servicio_id)
+  SELECT id, estudiante_id, evento_feria_id, fecha_asistencia, estatus_asistencia,
+         horario_seleccionado, hora_real_asistencia, periodo, hora_salida, servicio_id
+  FROM asistencias_feria_old;
+
+SELECT setval(pg_get_serial_sequence('preregistros', 'id'), COALESCE((SELECT max(id) FROM preregistros), 0) + 1, false);
+SELECT setval(pg_get_serial_sequence('asistencias_feria', 'id'), COALESCE((SELECT max(id) FROM asistencias_feria), 0) + 1, false);
+
+DROP TABLE preregistros_old;
+DROP TABLE asistencias_feria_old;
+
+ANALYZE preregistros;
+ANALYZE asistencias_feria;
+
+COMMIT;
@@ -0,0 +1,18 @@
+-- Migración: tareas de mantenimiento periódicas (lease por tarea) y purga de tokens de recuperación
+-- Ejecutar en la base de datos Feria_Servicios
+
+CREATE TABLE IF NOT EXISTS tareas_mantenimiento (
+  nombre           VARCHAR(60) PRIMARY KEY,
+  proxima          TIMESTAMP NOT NULL,
+  bloqueado_hasta  TIMESTAMP,
+  dueno            VARCHAR(80),
+  ultimo_inicio    TIMESTAMP,
+  ultima_duracion  DOUBLE PRECISION,
+  ultimo_estado    VARCHAR(10),
+  ultimo_resultado TEXT,
+  ultimo_error     TEXT,
+  ejecuciones      INTEGER NOT NULL DEFAULT 0,
+  fallos           INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS ix_password_reset_tokens_expires_at ON password_reset_tokens (expires_at);
@@ -0,0 +1,17 @@
+-- Migración: tickets de la cola de inscripciones (INSCRIPCION_MODO=cola)
+-- Ejecutar en la base de datos Feria_Servicios
+
+CREATE TABLE IF NOT EXISTS tickets_inscripcion (
+  id            SERIAL PRIMARY KEY,
+  codigo        VARCHAR(32) NOT NULL UNIQUE,
+  estudiante_id INTEGER NOT NULL,
+  crn           VARCHAR(30) NOT NULL,
+  estado        VARCHAR(20) NOT NULL DEFAULT 'en_cola',
+  status_code   INTEGER,
+  resultado     TEXT,
+  creado        TIMESTAMP NOT NULL DEFAULT now(),
+  atendido      TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_tickets_inscripcion_crn_estado
+  ON tickets_inscripcion (crn, estado, id);
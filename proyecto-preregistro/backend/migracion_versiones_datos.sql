@@ -0,0 +1,18 @@
+-- Migración: contadores de versión por tabla (ETags / invalidación de caché)
+-- Ejecutar en la base de datos Feria_Servicios
+
+CREATE TABLE IF NOT EXISTS versiones_datos (
+  recurso VARCHAR(50) PRIMARY KEY,
+  version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO versiones_datos (recurso, version) VALUES
+  ('carreras', 0),
+  ('socios_formadores', 0),
+  ('servicios', 0),
+  ('preregistros', 0),
+  ('estudiantes', 0),
+  ('asistencias_feria', 0),
+  ('usuarios', 0),
+  ('eventos_feria', 0)
+ON CONFLICT (recurso) DO NOTHING;
@@ -43,6 +43,7 @@ export const authAPI = {
 export const estudiantesAPI = {
   getMisProyectos: (periodo) => api.get('/estudiantes/mis-proyectos', { params: { periodo } }),
   buscar: (params) => api.get('/estudiantes/buscar', { params }),
+  getBootstrap: (params) => api.get('/estudiantes/bootstrap', { params }),
   getPerfil: () => api.get('/estudiantes/perfil'),
   updatePerfil: (data) => api.put('/estudiantes/perfil', data),
 }
@@ -122,4 +123,10 @@ export const adminAPI = {
   rebootFeria: (periodo) => api.delete('/admin/reboot-feria', { data: { periodo } }),
 }
 
+// ── Lote: varias peticiones en un solo round trip ──
+// peticiones: [{ id, metodo, ruta: '/api/...', body }] → { respuestas: [{ id, status, headers, body }] }
+export const batchAPI = {
+  ejecutar: (peticiones) => api.post('/batch', { peticiones }),
+}
+
 export default api